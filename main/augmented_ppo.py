@@ -0,0 +1,142 @@
+import numpy as np
+import torch
+from sb3_contrib import MaskablePPO
+from sb3_contrib.common.maskable.buffers import MaskableRolloutBuffer, MaskableRolloutBufferSamples
+
+from symmetry import (
+    NUM_SYMMETRIES, ACTION_PERMUTATIONS, spatial_axes, transform_board, transform_masks, transform_actions, all_symmetries,
+)
+
+# MaskablePPO trained on symmetric copies of every rollout. The snake MDP is invariant under the 8 board
+# symmetries, so a transformed transition (with its action and mask remapped) is as valid as a collected one
+# and keeps the advantage and return of the original.
+
+class SymmetricRolloutBuffer(MaskableRolloutBuffer):
+    # Yields minibatches drawn from the collected samples and their symmetric copies. The copies are never
+    # stored: every minibatch is transformed on the fly, one vectorized transform per symmetry it contains.
+    # Only the old log-probabilities of the copies are kept, (num_copies, buffer_size * n_envs) floats.
+    def reset(self):
+        super().reset()
+        self.symmetries = [0]
+        self.symmetry_log_probs = None
+
+    def flatten(self):
+        if not self.generator_ready:
+            for tensor in ["observations", "actions", "values", "log_probs", "advantages", "returns", "action_masks"]:
+                self.__dict__[tensor] = self.swap_and_flatten(self.__dict__[tensor])
+            self.generator_ready = True
+
+    def get(self, batch_size=None):
+        assert self.full, ""
+        num_samples = self.buffer_size * self.n_envs
+        self.flatten()
+        if self.symmetry_log_probs is None:
+            self.symmetry_log_probs = self.log_probs.reshape(1, -1)
+
+        indices = np.random.permutation(len(self.symmetries) * num_samples)
+        if batch_size is None:
+            batch_size = len(indices)
+        for start_idx in range(0, len(indices), batch_size):
+            yield self._get_symmetric_samples(indices[start_idx:start_idx + batch_size], num_samples)
+
+    def _get_symmetric_samples(self, indices, num_samples):
+        copies, batch_inds = np.divmod(indices, num_samples)
+        observations = self.observations[batch_inds]
+        actions = self.actions[batch_inds]
+        action_masks = self.action_masks[batch_inds].reshape(-1, self.mask_dims)
+        axes = spatial_axes(self.obs_shape)
+        for copy in np.unique(copies):
+            symmetry = self.symmetries[copy]
+            if symmetry == 0:
+                continue
+            rows = copies == copy
+            observations[rows] = transform_board(observations[rows], symmetry, axes)
+            actions[rows] = transform_actions(actions[rows], symmetry)
+            action_masks[rows] = transform_masks(action_masks[rows], symmetry)
+        data = (
+            observations,
+            actions,
+            self.values[batch_inds].flatten(),
+            self.symmetry_log_probs[copies, batch_inds],
+            self.advantages[batch_inds].flatten(),
+            self.returns[batch_inds].flatten(),
+            action_masks,
+        )
+        return MaskableRolloutBufferSamples(*map(self.to_torch, data))
+
+class AugmentedMaskablePPO(MaskablePPO):
+    # num_augment: symmetric copies added per rollout, drawn at random from the 7 non-identity symmetries.
+    # Each epoch then makes (1 + num_augment) times as many gradient steps of batch_size samples.
+    def __init__(self, *args, num_augment=1, **kwargs):
+        self.num_augment = num_augment
+        super().__init__(*args, **kwargs)
+
+    def _setup_model(self):
+        super()._setup_model()
+        spatial_axes(self.observation_space.shape) # Fails early for observations without board symmetries.
+        self.rollout_buffer = SymmetricRolloutBuffer(
+            self.n_steps,
+            self.observation_space,
+            self.action_space,
+            self.device,
+            gamma=self.gamma,
+            gae_lambda=self.gae_lambda,
+            n_envs=self.n_envs,
+        )
+
+    def train(self):
+        self._prepare_symmetries()
+        super().train()
+
+    def _prepare_symmetries(self, chunk_size=4096):
+        # Old log-probabilities of the copies under the policy that collected the rollout (it has not been
+        # updated yet), so the PPO ratio of every copy starts at 1 like that of a collected sample.
+        buffer = self.rollout_buffer
+        symmetries = [0] + [int(s) for s in np.random.choice(np.arange(1, NUM_SYMMETRIES), self.num_augment, replace=False)]
+        buffer.symmetries = symmetries
+        buffer.flatten()
+        num_samples = buffer.buffer_size * buffer.n_envs
+        log_probs = np.empty((len(symmetries), num_samples), dtype=np.float32)
+        log_probs[0] = buffer.log_probs.flatten()
+        axes = spatial_axes(buffer.obs_shape)
+        self.policy.set_training_mode(False)
+        with torch.no_grad():
+            for copy, symmetry in enumerate(symmetries[1:], start=1):
+                for start in range(0, num_samples, chunk_size):
+                    end = min(start + chunk_size, num_samples)
+                    obs = np.ascontiguousarray(transform_board(buffer.observations[start:end], symmetry, axes))
+                    actions = transform_actions(buffer.actions[start:end].flatten(), symmetry)
+                    masks = transform_masks(buffer.action_masks[start:end], symmetry)
+                    _, log_prob, _ = self.policy.evaluate_actions(
+                        buffer.to_torch(obs), buffer.to_torch(actions).long(), action_masks=masks,
+                    )
+                    log_probs[copy, start:end] = log_prob.cpu().numpy()
+        buffer.symmetry_log_probs = log_probs
+
+class SymmetricPredictor:
+    # Symmetry-averaged inference for evaluation: the action probabilities of the 8 transformed boards are mapped
+    # back to the original actions and averaged. Same predict(obs, action_masks, deterministic) interface as
+    # MaskablePPO.predict, for a single observation.
+    def __init__(self, model):
+        self.model = model
+        self.policy = model.policy
+
+    def action_probs(self, obs, action_masks):
+        action_masks = np.asarray(action_masks, dtype=bool).reshape(-1)
+        obs = np.asarray(obs)
+        obs_batch = all_symmetries(obs, spatial_axes(obs.shape))
+        mask_batch = np.stack([transform_masks(action_masks, symmetry) for symmetry in range(NUM_SYMMETRIES)])
+        obs_tensor, _ = self.policy.obs_to_tensor(obs_batch)
+        with torch.no_grad():
+            probs = self.policy.get_distribution(obs_tensor, action_masks=mask_batch).distribution.probs.cpu().numpy()
+        # Row s, column a: probability of original action a, played as ACTION_PERMUTATIONS[s, a] on board s.
+        original = np.take_along_axis(probs, ACTION_PERMUTATIONS, axis=1)
+        return original.mean(axis=0) * action_masks
+
+    def predict(self, obs, action_masks=None, deterministic=False):
+        if action_masks is None:
+            action_masks = np.ones(self.model.action_space.n, dtype=bool)
+        probs = self.action_probs(obs, action_masks)
+        if deterministic:
+            return np.int64(np.argmax(probs)), None
+        return np.int64(np.random.choice(len(probs), p=probs / probs.sum())), None
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import argparse
+import itertools
+
+# Throughput autotuner for NUM_ENV, n_steps and batch_size on the current host.
+# Two short calibration phases, then a model of one PPO iteration (rollout + update) for every combination:
+#   rollout: env steps per second of model.learn()'s collection phase, for each env-worker count,
+#            measured with the policy in the loop, plus the resident memory of the main and worker processes;
+#   update:  model.train() time on a random buffer at two buffer sizes, fitted as a + b * samples per batch size.
+# Samples per second of a configuration = samples / (samples / rollout_rate + a + b * samples).
+
+CANDIDATE_NUM_ENVS = [8, 16, 32, 64]
+CANDIDATE_N_STEPS = [512, 1024, 2048, 4096]
+CANDIDATE_BATCH_SIZES = [256, 512, 1024, 2048, 4096]
+
+def tuned_config_path(env_type):
+    return f"autotune_{env_type}.json"
+
+def load_tuned_config(path, device):
+    # The configuration written by `autotune.py --apply`, or {} to keep the training script defaults. A configuration
+    # calibrated on another device type than the training one is ignored: the update costs it was chosen for differ.
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path) as config_file:
+        config = json.load(config_file)
+    tuned_device = config.get("device", "cpu")
+    if tuned_device.split(":")[0] != str(device).split(":")[0]:
+        print(f"Ignoring {path}: calibrated on {tuned_device}, training on {device}. "
+              f"Rerun autotune.py --device {device} --apply to tune for it.")
+        return {}
+    tuned = {key: config[key] for key in ["num_envs", "n_steps", "batch_size"]}
+    print(f"Using {path} (calibrated on {tuned_device}): " + ", ".join(f"{key}={value}" for key, value in tuned.items()))
+    return tuned
+
+def _rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status_file: # Linux only.
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def _make_model(env_type, env, device, n_steps, batch_size, n_epochs):
+    from sb3_contrib import MaskablePPO
+
+    return MaskablePPO(
+        "CnnPolicy" if env_type == "cnn" else "MlpPolicy", env, device=device,
+        n_steps=n_steps, batch_size=batch_size, n_epochs=n_epochs, gamma=0.94,
+    )
+
+def _training_make_env(env_type):
+    # make_env of the training script, so every phase sees its env settings, such as train_mlp.OBS_MODE.
+    if env_type == "mlp":
+        from train_mlp import make_env
+    else:
+        from train_cnn import make_env
+    return make_env
+
+def calibrate_rollout(env_type, num_envs, device, n_steps, rollouts):
+    # Env steps per second of the collection phase and resident memory, for one env-worker count.
+    from stable_baselines3.common.callbacks import BaseCallback
+
+    from lean_vec_env import LeanSubprocVecEnv
+
+    make_env = _training_make_env(env_type)
+
+    class RolloutTimer(BaseCallback):
+        def __init__(self):
+            super().__init__()
+            self.durations = []
+
+        def _on_rollout_start(self):
+            self.start_time = time.perf_counter()
+
+        def _on_rollout_end(self):
+            self.durations.append(time.perf_counter() - self.start_time)
+
+        def _on_step(self):
+            return True
+
+    env = LeanSubprocVecEnv([make_env(seed=i) for i in range(num_envs)])
+    # A single epoch over one minibatch keeps the update short: only the rollouts are timed.
+    model = _make_model(env_type, env, device, n_steps, n_steps * num_envs, 1)
+    timer = RolloutTimer()
+    model.learn(total_timesteps=(rollouts + 1) * n_steps * num_envs, callback=timer)
+    worker_rss = sum(_rss_mb(process.pid) for process in env.processes)
+    env.close()
+    rollout_time = sum(timer.durations[1:]) # The first rollout includes env and policy warm-up.
+    return {
+        "num_envs": num_envs,
+        "steps_per_second": rollouts * n_steps * num_envs / rollout_time,
+        "worker_rss_mb": worker_rss,
+    }
+
+def calibrate_update(env_type, batch_size, device, n_epochs, sizes, num_envs):
+    # Update seconds at each buffer size in sizes, after one warm-up update.
+    import numpy as np
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from distributed_ppo import _fill_random_rollout
+
+    make_env = _training_make_env(env_type)
+    times = []
+    for size in sizes:
+        env = DummyVecEnv([make_env(seed=0)] * num_envs) # Never stepped.
+        model = _make_model(env_type, env, device, size // num_envs, batch_size, n_epochs)
+        model._setup_learn(0) # Logger and progress, as model.learn() would set them up.
+        model.rollout_buffer.reset() # Allocates the arrays, as collect_rollouts() would.
+        _fill_random_rollout(model.rollout_buffer, np.random.default_rng(0))
+        model.train()
+        start_time = time.perf_counter()
+        model.train()
+        times.append(time.perf_counter() - start_time)
+        env.close()
+    # Least-squares line through the measurements: fixed cost per update plus cost per sample.
+    slope, intercept = np.polyfit(sizes, times, 1) if len(sizes) > 1 else (times[0] / sizes[0], 0.0)
+    return {"batch_size": batch_size, "fixed_s": max(float(intercept), 0.0), "per_sample_s": max(float(slope), 1e-12)}
+
+def buffer_mb(observation_shape, num_samples):
+    # MaskableRolloutBuffer: float32 observations, 4 action masks and 7 scalars per sample.
+    obs_size = 1
+    for dim in observation_shape:
+        obs_size *= dim
+    return num_samples * (obs_size + 4 + 7) * 4 / 2 ** 20
+
+def predict(rollouts, updates, observation_shape, main_rss_mb, n_steps_values):
+    rows = []
+    for rollout, update, n_steps in itertools.product(rollouts, updates, n_steps_values):
+        num_samples = n_steps * rollout["num_envs"]
+        if update["batch_size"] > num_samples:
+            continue
+        rollout_time = num_samples / rollout["steps_per_second"]
+        update_time = update["fixed_s"] + update["per_sample_s"] * num_samples
+        rows.append({
+            "num_envs": rollout["num_envs"],
+            "n_steps": n_steps,
+            "batch_size": update["batch_size"],
+            "samples_per_second": num_samples / (rollout_time + update_time),
+            "rollout_s": rollout_time,
+            "update_s": update_time,
+            "ram_mb": main_rss_mb + rollout["worker_rss_mb"] + buffer_mb(observation_shape, num_samples),
+        })
+    return rows
+
+def choose(rows, target, max_ram_mb, tolerance):
+    # throughput: most samples per second within the RAM limit.
+    # memory: least RAM among the configurations within tolerance of the best throughput.
+    feasible = [row for row in rows if max_ram_mb is None or row["ram_mb"] <= max_ram_mb]
+    if not feasible:
+        return None
+    best = max(feasible, key=lambda row: row["samples_per_second"])
+    if target == "throughput":
+        return best
+    close = [row for row in feasible if row["samples_per_second"] >= (1 - tolerance) * best["samples_per_second"]]
+    return min(close, key=lambda row: (row["ram_mb"], -row["samples_per_second"]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate and choose NUM_ENV, n_steps and batch_size for this host.")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default="cnn")
+    parser.add_argument("--device", default="cpu", help="Torch device of the model, e.g. cuda, as used by the training script.")
+    parser.add_argument("--num-envs", type=int, nargs="+", default=CANDIDATE_NUM_ENVS)
+    parser.add_argument("--n-steps", type=int, nargs="+", default=CANDIDATE_N_STEPS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=CANDIDATE_BATCH_SIZES)
+    parser.add_argument("--n-epochs", type=int, default=4)
+    parser.add_argument("--calibration-steps", type=int, default=256, help="n_steps of the timed rollouts.")
+    parser.add_argument("--calibration-rollouts", type=int, default=2, help="Timed rollouts per env-worker count, after one warm-up.")
+    parser.add_argument("--calibration-sizes", type=int, nargs="+", default=[8192, 32768], help="Buffer sizes of the timed updates.")
+    parser.add_argument("--target", choices=["throughput", "memory"], default="throughput")
+    parser.add_argument("--max-ram-gb", type=float, default=None, help="RAM limit of the main process plus env workers.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="memory target: accepted throughput loss.")
+    parser.add_argument("--apply", action="store_true", help="Write the choice to autotune_<env>.json, read by train_<env>.py.")
+    parser.add_argument("--out", default=None, help="Also write every predicted configuration as JSON.")
+    args = parser.parse_args()
+
+    import torch
+
+    print(f"{args.env} on {args.device}, {os.cpu_count()} cores, {torch.get_num_threads()} torch threads.")
+    print(f"{'num_envs':>8} {'steps/s':>9} {'worker_rss_mb':>14}")
+    rollouts = []
+    for num_envs in args.num_envs:
+        rollouts.append(calibrate_rollout(args.env, num_envs, args.device, args.calibration_steps, args.calibration_rollouts))
+        print(f"{num_envs:>8} {rollouts[-1]['steps_per_second']:>9.0f} {rollouts[-1]['worker_rss_mb']:>14.1f}")
+
+    print(f"{'batch_size':>10} {'fixed_s':>8} {'us/sample':>10}")
+    updates = []
+    for batch_size in args.batch_sizes:
+        sizes = [size for size in args.calibration_sizes if size >= batch_size]
+        if not sizes:
+            continue
+        updates.append(calibrate_update(args.env, batch_size, args.device, args.n_epochs, sizes, min(args.num_envs)))
+        print(f"{batch_size:>10} {updates[-1]['fixed_s']:>8.3f} {updates[-1]['per_sample_s'] * 1e6:>10.1f}")
+
+    env = _training_make_env(args.env)(seed=0)()
+    observation_shape = env.observation_space.shape
+    env.close()
+    rows = predict(rollouts, updates, observation_shape, _rss_mb(os.getpid()), args.n_steps)
+    rows.sort(key=lambda row: row["samples_per_second"], reverse=True)
+    max_ram_mb = args.max_ram_gb * 1024 if args.max_ram_gb is not None else None
+
+    print(f"{'num_envs':>8} {'n_steps':>7} {'batch':>6} {'samples/s':>10} {'rollout_s':>9} {'update_s':>8} {'ram_mb':>8}")
+    for row in rows[:10]:
+        over = " over RAM limit" if max_ram_mb is not None and row["ram_mb"] > max_ram_mb else ""
+        print(f"{row['num_envs']:>8} {row['n_steps']:>7} {row['batch_size']:>6} {row['samples_per_second']:>10.0f} "
+              f"{row['rollout_s']:>9.2f} {row['update_s']:>8.2f} {row['ram_mb']:>8.0f}{over}")
+    if args.out:
+        with open(args.out, "w") as out_file:
+            json.dump({"rollouts": rollouts, "updates": updates, "predictions": rows}, out_file, indent=2)
+
+    choice = choose(rows, args.target, max_ram_mb, args.tolerance)
+    if choice is None:
+        print(f"No configuration fits in {args.max_ram_gb} GB.")
+        return
+    print(f"Recommended for {args.target}: NUM_ENV={choice['num_envs']}, n_steps={choice['n_steps']}, "
+          f"batch_size={choice['batch_size']} ({choice['samples_per_second']:.0f} samples/s, {choice['ram_mb']:.0f} MB).")
+    if args.apply:
+        path = tuned_config_path(args.env)
+        with open(path, "w") as config_file:
+            json.dump({**choice, "target": args.target, "device": args.device}, config_file, indent=2)
+        print(f"Written to {path}; train_{args.env}.py uses it on its next run.")
+
+if __name__ == "__main__":
+    main()
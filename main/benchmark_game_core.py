@@ -0,0 +1,76 @@
+import time
+import argparse
+
+import numpy as np
+
+from evaluation import get_env_class
+from snake_core import make_game, numba_available
+from hamiltonian_agent import HamiltonianAgent
+
+# Pure-Python game core versus the Numba core of snake_core.py, on the bare game and on the full env step
+# (action mask + step + observation). Both cores play the same seeded episodes.
+
+def record_actions(board_size, seed):
+    # A whole game won by the shortcut Hamiltonian agent, so snakes of every length are covered.
+    game = make_game("python", seed=seed, board_size=board_size)
+    agent = HamiltonianAgent(board_size, shortcuts=True)
+    actions = []
+    done = False
+    while not done:
+        actions.append(agent.act(game))
+        done, _ = game.step(actions[-1])
+    return actions, game.score
+
+def time_game(backend, board_size, actions, seed):
+    # Replays the recorded actions; identical seeds must give the identical game on both cores.
+    game = make_game(backend, seed=seed, board_size=board_size)
+    start_time = time.perf_counter()
+    for action in actions:
+        game.step(action)
+    return (time.perf_counter() - start_time) / len(actions), game.score
+
+def time_env(env_type, backend, board_size, num_steps, seed):
+    env = get_env_class(env_type)(seed=seed, board_size=board_size, backend=backend)
+    env.reset()
+    rng = np.random.default_rng(seed)
+    start_time = time.perf_counter()
+    for _ in range(num_steps):
+        mask = env.get_action_mask()[0]
+        valid = np.flatnonzero(mask)
+        action = valid[rng.integers(len(valid))] if len(valid) else 0
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    return (time.perf_counter() - start_time) / num_steps
+
+def main():
+    parser = argparse.ArgumentParser(description="Step cost of the pure-Python and Numba game cores.")
+    parser.add_argument("--board-sizes", type=int, nargs="+", default=[12, 20])
+    parser.add_argument("--steps", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not numba_available():
+        print("Numba is not installed: both backends run the pure-Python core.")
+    else:
+        start_time = time.perf_counter()
+        time_env("cnn", "numba", 12, 10, args.seed) # Compiles the kernels, or loads them from the on-disk cache.
+        time_env("mlp", "numba", 12, 10, args.seed)
+        print(f"Numba kernels ready in {time.perf_counter() - start_time:.2f}s.")
+
+    print(f"{'board':>5} {'workload':>9} {'python_us':>10} {'numba_us':>9} {'speedup':>8}")
+    for board_size in args.board_sizes:
+        actions, score = record_actions(board_size, args.seed)
+        python_time, python_score = time_game("python", board_size, actions, args.seed)
+        numba_time, numba_score = time_game("numba", board_size, actions, args.seed)
+        assert python_score == numba_score == score, "The game cores diverged."
+        print(f"{board_size:>5} {'game':>9} {python_time * 1e6:>10.2f} {numba_time * 1e6:>9.2f} {python_time / numba_time:>7.2f}x"
+              f"  ({len(actions)} steps of a won game)")
+        for env_type in ["cnn", "mlp"]:
+            python_time = time_env(env_type, "python", board_size, args.steps, args.seed)
+            numba_time = time_env(env_type, "numba", board_size, args.steps, args.seed)
+            print(f"{board_size:>5} {env_type + '_env':>9} {python_time * 1e6:>10.2f} {numba_time * 1e6:>9.2f} {python_time / numba_time:>7.2f}x"
+                  f"  (random masked actions)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import time
+import random
+
+import numpy as np
+
+from snake_game_custom_wrapper_cnn import SnakeEnv
+
+BOARD_SIZES = [6, 8, 12, 16, 20, 24, 30, 42]
+NUM_STEPS = 5000 # Observations generated per board size.
+SEED = 0
+
+def benchmark_board_size(board_size):
+    env = SnakeEnv(seed=SEED, board_size=board_size)
+    env.reset()
+    rng = random.Random(SEED)
+
+    elapsed = 0.0
+    for _ in range(NUM_STEPS):
+        # Only valid actions keep the snake alive long enough to grow on bigger boards.
+        valid_actions = np.flatnonzero(env.get_action_mask()[0])
+        action = rng.choice(valid_actions) if len(valid_actions) > 0 else 0
+        done, _ = env.game.step(action)
+        if done:
+            env.game.reset()
+
+        start_time = time.perf_counter()
+        env._generate_observation()
+        elapsed += time.perf_counter() - start_time
+
+    return elapsed / NUM_STEPS
+
+def main():
+    print(f"{'board_size':>10} {'obs_shape':>12} {'us/obs':>10}")
+    for board_size in BOARD_SIZES:
+        obs_shape = SnakeEnv(seed=SEED, board_size=board_size).observation_space.shape
+        cost = benchmark_board_size(board_size)
+        print(f"{board_size:>10} {str(obs_shape):>12} {cost * 1e6:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+# Each backend runs in a fresh interpreter so that startup time and peak memory include every import.
+BENCHMARK_SNIPPET = r"""
+import sys
+import time
+start_time = time.perf_counter()
+
+import json
+import resource
+import numpy as np
+
+backend, path, states_path, num_decisions = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+if backend == "sb3":
+    import torch
+    torch.set_num_threads(1)
+    from sb3_contrib import MaskablePPO
+    model = MaskablePPO.load(path, device="cpu")
+else:
+    from policy_runtime import PolicyRuntime
+    model = PolicyRuntime(path)
+
+states = np.load(states_path)
+observations, masks = states["observations"], states["masks"]
+
+model.predict(observations[0], action_masks=masks[0], deterministic=True)
+startup = time.perf_counter() - start_time
+
+latencies = []
+for i in range(num_decisions):
+    obs, mask = observations[i % len(observations)], masks[i % len(masks)]
+    decision_start = time.perf_counter()
+    model.predict(obs, action_masks=mask, deterministic=True)
+    latencies.append(time.perf_counter() - decision_start)
+
+print(json.dumps({
+    "startup_s": startup,
+    "latency_us_mean": float(np.mean(latencies) * 1e6),
+    "latency_us_p99": float(np.percentile(latencies, 99) * 1e6),
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+def record_benchmark_states(model_path, num_states=256):
+    # Env observations (channel-last images for the CNN) and action masks from games of the model, as every backend
+    # receives them in the test scripts. The benchmark cycles through them.
+    from export_policy import load_actor
+    from evaluation import record_states
+
+    model, _, env_type, env_kwargs, _ = load_actor(model_path)
+    return record_states(model.predict, env_type, [3 * 10 ** 6 + i for i in range(100)], env_kwargs, num_states)
+
+def run_backend(backend, path, observations, masks, num_decisions):
+    handle, states_path = tempfile.mkstemp(suffix=".npz")
+    os.close(handle)
+    try:
+        np.savez(states_path, observations=observations, masks=masks)
+        output = subprocess.run(
+            [sys.executable, "-c", BENCHMARK_SNIPPET, backend, path, states_path, str(num_decisions)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    finally:
+        os.remove(states_path)
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MaskablePPO.predict with exported TorchScript/ONNX policies.")
+    parser.add_argument("model", help="MaskablePPO zip the exports were made from.")
+    parser.add_argument("exports", nargs="+", help="Exported .pt and/or .onnx files.")
+    parser.add_argument("--decisions", type=int, default=2000)
+    args = parser.parse_args()
+
+    observations, masks = record_benchmark_states(args.model)
+    print(f"{'backend':<40} {'startup_s':>10} {'mean_us':>10} {'p99_us':>10} {'max_rss_mb':>11}")
+    for backend, path in [("sb3", args.model)] + [("runtime", path) for path in args.exports]:
+        result = run_backend(backend, path, observations, masks, args.decisions)
+        name = f"{backend}:{path}"
+        print(f"{name:<40} {result['startup_s']:>10.2f} {result['latency_us_mean']:>10.1f} {result['latency_us_p99']:>10.1f} {result['max_rss_mb']:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import time
+
+from snake_game import SnakeGame
+from snake_game_custom_wrapper_cnn import SnakeEnv as CnnSnakeEnv
+from snake_game_custom_wrapper_mlp import SnakeEnv as MlpSnakeEnv
+
+BOARD_SIZES = [6, 12, 20, 30, 42]
+NUM_RESETS = 5000
+
+def time_resets(reset):
+    start_time = time.perf_counter()
+    for _ in range(NUM_RESETS):
+        reset()
+    return (time.perf_counter() - start_time) / NUM_RESETS
+
+def main():
+    print(f"{'board_size':>10} {'game_us':>9} {'cnn_env_us':>11} {'mlp_env_us':>11}")
+    for board_size in BOARD_SIZES:
+        game_cost = time_resets(SnakeGame(board_size=board_size).reset)
+        cnn_cost = time_resets(CnnSnakeEnv(board_size=board_size).reset)
+        mlp_cost = time_resets(MlpSnakeEnv(board_size=board_size).reset)
+        print(f"{board_size:>10} {game_cost * 1e6:>9.2f} {cnn_cost * 1e6:>11.2f} {mlp_cost * 1e6:>11.2f}")
+
+if __name__ == "__main__":
+    main()
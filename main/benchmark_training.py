@@ -0,0 +1,191 @@
+import os
+import csv
+import glob
+import time
+import argparse
+
+import numpy as np
+
+# Training-efficiency benchmark: score versus env steps and versus wall-clock seconds.
+# Every curve is a CSV with the columns below, whether it comes from a fresh run or from old tfevents logs.
+CURVE_FIELDS = ["env_steps", "seconds", "mean_score", "win_rate", "ep_rew_mean", "ep_len_mean"]
+
+def write_curve(path, rows):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as curve_file:
+        writer = csv.DictWriter(curve_file, fieldnames=CURVE_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def read_curve(path):
+    with open(path, newline="") as curve_file:
+        return [{key: float(value) if value != "" else None for key, value in row.items()} for row in csv.DictReader(curve_file)]
+
+def run_benchmark(env_type, total_timesteps, eval_interval, eval_seeds, num_envs, seed, num_threads):
+    import torch
+    from sb3_contrib import MaskablePPO
+    from stable_baselines3.common.callbacks import BaseCallback
+
+    from evaluation import evaluate_seeds, summarize
+    from lean_vec_env import LeanSubprocVecEnv
+    if env_type == "mlp":
+        from train_mlp import make_env, linear_schedule
+    else:
+        from train_cnn import make_env, linear_schedule
+
+    class EvalCurveCallback(BaseCallback):
+        # Evaluates at fixed env-step intervals. Evaluation time is excluded from the training clock.
+        def __init__(self):
+            super().__init__()
+            self.rows = []
+            self.next_eval = eval_interval
+            self.start_time = None
+            self.eval_time = 0.0
+
+        def _on_training_start(self):
+            self.start_time = time.perf_counter()
+            self.evaluate() # Untrained baseline at 0 steps.
+
+        def _on_step(self):
+            if self.num_timesteps >= self.next_eval:
+                self.evaluate()
+                self.next_eval += eval_interval
+            return True
+
+        def _on_training_end(self):
+            if not self.rows or self.rows[-1]["env_steps"] < self.num_timesteps:
+                self.evaluate()
+
+        def evaluate(self):
+            eval_start = time.perf_counter()
+            summary = summarize(evaluate_seeds(self.model.predict, env_type, eval_seeds))
+            episodes = self.model.ep_info_buffer
+            self.rows.append({
+                "env_steps": self.num_timesteps,
+                "seconds": eval_start - self.start_time - self.eval_time,
+                "mean_score": summary["mean_score"],
+                "win_rate": summary["win_rate"],
+                "ep_rew_mean": np.mean([e["r"] for e in episodes]) if episodes else "",
+                "ep_len_mean": np.mean([e["l"] for e in episodes]) if episodes else "",
+            })
+            self.eval_time += time.perf_counter() - eval_start
+            print(f"{env_type}: {self.num_timesteps} steps, {self.rows[-1]['seconds']:.1f}s, mean score {summary['mean_score']:.1f}", flush=True)
+
+    torch.set_num_threads(num_threads)
+    env = LeanSubprocVecEnv([make_env(seed=seed * 1000 + i) for i in range(num_envs)])
+    # Same CPU hyperparameters as train_cnn.py / train_mlp.py, with schedules over the benchmark budget.
+    model = MaskablePPO(
+        "CnnPolicy" if env_type == "cnn" else "MlpPolicy",
+        env,
+        device="cpu",
+        n_steps=2048,
+        batch_size=512,
+        n_epochs=4,
+        gamma=0.94,
+        learning_rate=linear_schedule(2.5e-4, 2.5e-6),
+        clip_range=linear_schedule(0.150, 0.025),
+        seed=seed,
+    )
+    callback = EvalCurveCallback()
+    model.learn(total_timesteps=total_timesteps, callback=callback)
+    env.close()
+    return callback.rows
+
+def import_tfevents(log_dir):
+    from tensorboard.backend.event_processing.event_accumulator import EventAccumulator
+
+    accumulator = EventAccumulator(log_dir, size_guidance={"scalars": 0})
+    accumulator.Reload()
+    rewards = accumulator.Scalars("rollout/ep_rew_mean")
+    lengths = {event.step: event.value for event in accumulator.Scalars("rollout/ep_len_mean")}
+    start_time = rewards[0].wall_time
+    return [{
+        "env_steps": event.step,
+        "seconds": event.wall_time - start_time, # Relative to the first logged rollout.
+        "mean_score": "",
+        "win_rate": "",
+        "ep_rew_mean": event.value,
+        "ep_len_mean": lengths.get(event.step, ""),
+    } for event in rewards]
+
+def first_crossing(rows, key, target):
+    # Linearly interpolated (env_steps, seconds) at which the curve first reaches the target.
+    previous = None
+    for row in rows:
+        value = row[key]
+        if value is None:
+            continue
+        if value >= target:
+            if previous is None or previous[key] == value:
+                return row["env_steps"], row["seconds"]
+            fraction = (target - previous[key]) / (value - previous[key])
+            return (
+                previous["env_steps"] + fraction * (row["env_steps"] - previous["env_steps"]),
+                previous["seconds"] + fraction * (row["seconds"] - previous["seconds"]),
+            )
+        previous = row
+    return None, None
+
+def print_summary(paths, target_score, target_reward):
+    print(f"{'curve':<28} {'env_steps':>11} {'seconds':>9} {'steps/s':>8} {'score':>7} {'ep_rew':>7} "
+          f"{'steps@score':>12} {'sec@score':>10} {'steps@rew':>11} {'sec@rew':>9}")
+    for path in paths:
+        rows = read_curve(path)
+        last = rows[-1]
+        steps_score, seconds_score = first_crossing(rows, "mean_score", target_score)
+        steps_reward, seconds_reward = first_crossing(rows, "ep_rew_mean", target_reward)
+        fmt = lambda value, spec: format(value, spec) if value is not None else "-"
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(
+            f"{name:<28} {last['env_steps']:>11.0f} {last['seconds']:>9.0f} {last['env_steps'] / max(last['seconds'], 1e-9):>8.0f} "
+            f"{fmt(last['mean_score'], '.1f'):>7} {fmt(last['ep_rew_mean'], '.2f'):>7} "
+            f"{fmt(steps_score, '.0f'):>12} {fmt(seconds_score, '.0f'):>10} {fmt(steps_reward, '.0f'):>11} {fmt(seconds_reward, '.0f'):>9}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Score versus env steps and wall clock for snake training setups.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Fixed-budget CPU training with periodic seeded evaluation.")
+    run_parser.add_argument("--env", nargs="+", choices=["cnn", "mlp"], default=["cnn", "mlp"])
+    run_parser.add_argument("--timesteps", type=int, default=1000000)
+    run_parser.add_argument("--eval-interval", type=int, default=100000)
+    run_parser.add_argument("--eval-episodes", type=int, default=20)
+    run_parser.add_argument("--num-envs", type=int, default=8)
+    run_parser.add_argument("--threads", type=int, default=1)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--tag", default="", help="Suffix of the curve names, e.g. the engine change under test.")
+    run_parser.add_argument("--out", default="benchmarks")
+
+    import_parser = subparsers.add_parser("import-tfevents", help="Convert TensorBoard logs, e.g. logs/PPO_CNN, into curves.")
+    import_parser.add_argument("log_dirs", nargs="+")
+    import_parser.add_argument("--out", default="benchmarks")
+
+    summary_parser = subparsers.add_parser("summary", help="Summary table of curve CSVs.")
+    summary_parser.add_argument("curves", nargs="+")
+
+    for subparser in [run_parser, import_parser, summary_parser]: # Every command ends with the summary table.
+        subparser.add_argument("--target-score", type=float, default=100.0)
+        subparser.add_argument("--target-reward", type=float, default=0.0)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        eval_seeds = [10 ** 6 + i for i in range(args.eval_episodes)] # Fixed seed set shared by every run.
+        paths = []
+        for env_type in args.env:
+            rows = run_benchmark(env_type, args.timesteps, args.eval_interval, eval_seeds, args.num_envs, args.seed, args.threads)
+            paths.append(os.path.join(args.out, f"{env_type}_seed{args.seed}{args.tag}.csv"))
+            write_curve(paths[-1], rows)
+        print_summary(paths, args.target_score, args.target_reward)
+    elif args.command == "import-tfevents":
+        paths = []
+        for pattern in args.log_dirs:
+            for log_dir in sorted(glob.glob(pattern)):
+                paths.append(os.path.join(args.out, f"tfevents_{os.path.basename(os.path.normpath(log_dir))}.csv"))
+                write_curve(paths[-1], import_tfevents(log_dir))
+        print_summary(paths, args.target_score, args.target_reward)
+    else:
+        print_summary(args.curves, args.target_score, args.target_reward)
+
+if __name__ == "__main__":
+    main()
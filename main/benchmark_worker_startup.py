@@ -0,0 +1,70 @@
+import sys
+import time
+import argparse
+
+from env_worker import ActionMaskWrapper, EpisodeMonitor
+from snake_game_custom_wrapper_cnn import SnakeEnv
+
+# This module is re-imported by every forkserver/spawn worker, so it must stay as lean as env_worker.
+
+def make_lean_env(seed=0):
+    def _init():
+        env = SnakeEnv(seed=seed)
+        env = ActionMaskWrapper(env)
+        env = EpisodeMonitor(env)
+        env.seed(seed)
+        return env
+    return _init
+
+def make_sb3_env(seed=0):
+    # The original training setup: Stable-Baselines3 wrappers, so every worker imports torch.
+    def _init():
+        from stable_baselines3.common.monitor import Monitor
+        from sb3_contrib.common.wrappers import ActionMasker
+        env = SnakeEnv(seed=seed)
+        env = ActionMasker(env, SnakeEnv.get_action_mask)
+        env = Monitor(env)
+        env.seed(seed)
+        return env
+    return _init
+
+def _worker_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status_file: # Linux only.
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def measure(setup, num_envs):
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    from lean_vec_env import LeanSubprocVecEnv
+
+    start_time = time.perf_counter()
+    if setup == "lean":
+        env = LeanSubprocVecEnv([make_lean_env(seed=s) for s in range(num_envs)])
+    else:
+        env = SubprocVecEnv([make_sb3_env(seed=s) for s in range(num_envs)])
+    env.reset()
+    env.env_method("action_masks") # Workers have finished building their envs once this returns.
+    startup = time.perf_counter() - start_time
+
+    worker_rss = [_worker_rss_mb(process.pid) for process in env.processes]
+    env.close()
+    return startup, sum(worker_rss) / len(worker_rss), sum(worker_rss)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure SubprocVecEnv worker startup time and memory.")
+    parser.add_argument("--envs", type=int, nargs="+", default=[8, 32])
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        print("Worker RSS is read from /proc and is only reported on Linux.")
+
+    print(f"{'setup':>6} {'num_envs':>9} {'startup_s':>10} {'rss_mb/worker':>14} {'rss_mb_total':>13}")
+    for num_envs in args.envs:
+        for setup in ["sb3", "lean"]:
+            startup, mean_rss, total_rss = measure(setup, num_envs)
+            print(f"{setup:>6} {num_envs:>9} {startup:>10.2f} {mean_rss:>14.1f} {total_rss:>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import re
+import csv
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import importlib.util
+import multiprocessing as mp
+
+from evaluation import load_predict, evaluate_seeds, summarize
+
+# Checkpoint tournament: every ppo_snake_<steps>_steps.zip in a directory plays the same seeded episodes, and the
+# checkpoints are ranked by mean score. Results are cached in an index file next to the checkpoints, keyed by the
+# content hash of the checkpoint and the hash of the evaluation config, so a rerun only evaluates new checkpoints
+# (or everything again when the config changes). Renaming or moving a checkpoint does not invalidate its results.
+
+INDEX_NAME = "tournament_index.json"
+CHECKPOINT_PATTERN = re.compile(r"ppo_snake_(\d+)_steps\.zip$")
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as checkpoint_file:
+        for block in iter(lambda: checkpoint_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def checkpoint_steps(path):
+    # Timesteps from the file name, or from the saved model data for other names such as ppo_snake_final.zip.
+    match = CHECKPOINT_PATTERN.search(os.path.basename(path))
+    if match:
+        return int(match.group(1))
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return int(json.loads(archive.read("data"))["num_timesteps"])
+    except (KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+def scan_checkpoints(directory, include_all=False):
+    names = sorted(os.listdir(directory))
+    if not include_all:
+        names = [name for name in names if CHECKPOINT_PATTERN.search(name)]
+    paths = [os.path.join(directory, name) for name in names if name.endswith(".zip")]
+    return sorted(paths, key=lambda path: (checkpoint_steps(path) is None, checkpoint_steps(path) or 0, path))
+
+def load_index(path):
+    if os.path.exists(path):
+        with open(path) as index_file:
+            return json.load(index_file)
+    return {}
+
+def save_index(index, path):
+    # Written to a temporary file and renamed, so an interrupted run never leaves a truncated index.
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as index_file:
+        json.dump(index, index_file, indent=2)
+    os.replace(temp_path, path)
+
+def evaluate_checkpoint(job):
+    path, config = job
+    start_time = time.perf_counter()
+    predict = load_predict(path)
+    env_kwargs = {"obs_mode": config["obs_mode"]} if config["env"] == "mlp" else {}
+    results = evaluate_seeds(
+        predict, config["env"], config["seeds"], board_size=config["board_size"],
+        deterministic=config["deterministic"], env_kwargs=env_kwargs,
+    )
+    summary = summarize(results)
+    summary["scores"] = [r["score"] for r in results]
+    summary["eval_time"] = time.perf_counter() - start_time
+    return path, summary
+
+def write_curves(rows, out_prefix):
+    # Score versus training steps as CSV, and as a PNG when matplotlib is installed.
+    rows = sorted((row for row in rows if row["steps"] is not None), key=lambda row: row["steps"])
+    csv_path = out_prefix + ".csv"
+    with open(csv_path, "w", newline="") as curve_file:
+        writer = csv.writer(curve_file)
+        writer.writerow(["steps", "mean_score", "std_score", "win_rate", "mean_steps", "checkpoint"])
+        for row in rows:
+            writer.writerow([row["steps"], row["mean_score"], row["std_score"], row["win_rate"], row["mean_steps"], row["path"]])
+    print(f"Curves written to {csv_path}")
+
+    if not rows or importlib.util.find_spec("matplotlib") is None:
+        return
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+    steps = [row["steps"] for row in rows]
+    means = [row["mean_score"] for row in rows]
+    stds = [row["std_score"] for row in rows]
+    figure, (score_axis, win_axis) = plt.subplots(2, 1, sharex=True, figsize=(8, 6))
+    score_axis.plot(steps, means, marker=".")
+    score_axis.fill_between(steps, [m - s for m, s in zip(means, stds)], [m + s for m, s in zip(means, stds)], alpha=0.2)
+    score_axis.set_ylabel("mean score (+/- std)")
+    win_axis.plot(steps, [row["win_rate"] for row in rows], marker=".")
+    win_axis.set_ylabel("win rate")
+    win_axis.set_xlabel("training steps")
+    figure.tight_layout()
+    figure.savefig(out_prefix + ".png")
+    print(f"Plot written to {out_prefix}.png")
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate and rank every checkpoint of a training run on a shared seed set.")
+    parser.add_argument("directory", help="Checkpoint directory, e.g. trained_models_cnn.")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default=None, help="Defaults to the directory name, e.g. trained_models_mlp.")
+    parser.add_argument("--obs-mode", choices=["board", "features"], default=None,
+                        help="MLP observation mode. Defaults to the directory name, e.g. trained_models_mlp_features.")
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--board-size", type=int, default=12)
+    parser.add_argument("--stochastic", action="store_true", help="Sample actions instead of taking the most likely one.")
+    parser.add_argument("--all", action="store_true", help="Also include other .zip models, such as ppo_snake_final.zip.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--top", type=int, default=20, help="Rows of the ranked table.")
+    args = parser.parse_args()
+
+    # train_mlp.py saves to trained_models_mlp or trained_models_mlp_features, train_cnn.py to trained_models_cnn.
+    name = os.path.basename(os.path.normpath(args.directory))
+    env_type = args.env or ("mlp" if "mlp" in name else "cnn")
+    obs_mode = args.obs_mode or ("features" if name.endswith("_features") else "board")
+    config = {
+        "env": env_type,
+        "obs_mode": obs_mode if env_type == "mlp" else None,
+        "board_size": args.board_size,
+        "deterministic": not args.stochastic,
+        "seeds": [10 ** 6 + args.seed * 1000 + i for i in range(args.episodes)], # Shared by every checkpoint.
+    }
+    config_key = config_hash(config)
+
+    index_path = os.path.join(args.directory, INDEX_NAME)
+    index = load_index(index_path)
+    checkpoints = scan_checkpoints(args.directory, args.all)
+    keys = {path: f"{file_hash(path)}:{config_key}" for path in checkpoints}
+    pending = [path for path in checkpoints if keys[path] not in index]
+    print(f"{len(checkpoints)} checkpoints, {len(checkpoints) - len(pending)} cached, {len(pending)} to evaluate "
+          f"on {args.episodes} episodes.")
+
+    start_time = time.perf_counter()
+    if pending:
+        with mp.Pool(min(args.workers, len(pending))) as pool:
+            for done, (path, summary) in enumerate(pool.imap_unordered(evaluate_checkpoint, [(p, config) for p in pending]), 1):
+                index[keys[path]] = summary
+                save_index(index, index_path) # After every checkpoint, so an interrupted run keeps its progress.
+                print(f"[{done}/{len(pending)}] {os.path.basename(path)}: mean score {summary['mean_score']:.1f}")
+        print(f"Evaluated {len(pending)} checkpoints in {time.perf_counter() - start_time:.1f}s.")
+
+    rows = [
+        {**index[keys[path]], "path": path, "steps": checkpoint_steps(path), "cached": path not in pending}
+        for path in checkpoints
+    ]
+    ranked = sorted(rows, key=lambda row: (row["mean_score"], row["win_rate"]), reverse=True)
+    print(f"{'rank':>4} {'steps':>10} {'mean_score':>10} {'std':>7} {'win_rate':>8} {'mean_steps':>10}  checkpoint")
+    for rank, row in enumerate(ranked[:args.top], 1):
+        steps = row["steps"] if row["steps"] is not None else "-"
+        print(f"{rank:>4} {steps:>10} {row['mean_score']:>10.1f} {row['std_score']:>7.1f} {row['win_rate']:>8.3f} "
+              f"{row['mean_steps']:>10.0f}  {os.path.basename(row['path'])}{'' if row['cached'] else ' *'}")
+    if ranked:
+        print(f"{'(* evaluated in this run) ' if pending else ''}Best checkpoint: {ranked[0]['path']}")
+        write_curves(rows, os.path.join(args.directory, "tournament_curves"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from collections import deque
+
+import numpy as np
+
+# Detection of exact repeated game states within an episode. A policy that brings the game back to a state it has
+# already been in since the last food is circling, and the envs can end or penalize the episode right away instead
+# of waiting for the step limit.
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+HASH_BASE = 0x9E3779B97F4A7C15 # Odd, so multiplication is invertible modulo 2^64.
+
+class CycleDetector:
+    # The body hash is a polynomial hash over the ordered body, H = sum(key[cell_i] * BASE^i) modulo 2^64 with i = 0 at
+    # the head, so a step only adds the new head and removes the old tail in O(1). The food key is XORed in.
+    # The ordered body, and therefore the direction, is part of the state. States with different snake lengths never
+    # coincide, so the set of recent states is cleared whenever food is eaten; it is further capped at max_states.
+    # Equal hashes are treated as equal states (64-bit hashes, collisions are negligible within an episode).
+    cell_keys = {} # board_size -> (body keys, food keys), shared by all detectors.
+
+    def __init__(self, board_size, max_states=4096):
+        self.board_size = board_size
+        self.max_states = max_states
+        self.body_keys, self.food_keys = self._get_cell_keys(board_size)
+        self.recent_states = set()
+        self.state_order = deque() # Oldest first, for eviction.
+
+    @classmethod
+    def _get_cell_keys(cls, board_size):
+        keys = cls.cell_keys.get(board_size)
+        if keys is None:
+            rng = np.random.default_rng(board_size)
+            random_keys = rng.integers(0, 2 ** 63, size=(2, board_size, board_size), dtype=np.int64)
+            keys = tuple(
+                {(row, col): int(table[row, col]) for row in range(board_size) for col in range(board_size)}
+                for table in random_keys
+            )
+            cls.cell_keys[board_size] = keys
+        return keys
+
+    def reset(self, snake, food):
+        body_hash = 0
+        power = 1
+        for i, cell in enumerate(snake):
+            if i > 0:
+                power = (power * HASH_BASE) & HASH_MASK
+            body_hash = (body_hash + self.body_keys[cell] * power) & HASH_MASK
+        self.body_hash = body_hash
+        self.tail_power = power # BASE^(len(snake) - 1)
+        self.recent_states.clear()
+        self.state_order.clear()
+        self._add_state(body_hash ^ self.food_keys[food])
+
+    def update(self, head, removed_tail, food_obtained, food):
+        # Call after a step that did not end the game. removed_tail is the tail cell before the step, which the game
+        # pops unless food was obtained. Returns True if the new state was already visited since the last food.
+        if food_obtained:
+            self.tail_power = (self.tail_power * HASH_BASE) & HASH_MASK
+            self.recent_states.clear()
+            self.state_order.clear()
+        else:
+            self.body_hash = (self.body_hash - self.body_keys[removed_tail] * self.tail_power) & HASH_MASK
+        self.body_hash = (self.body_keys[head] + self.body_hash * HASH_BASE) & HASH_MASK
+
+        state = self.body_hash ^ self.food_keys[food]
+        if state in self.recent_states:
+            return True
+        self._add_state(state)
+        return False
+
+    def _add_state(self, state):
+        self.recent_states.add(state)
+        self.state_order.append(state)
+        if len(self.state_order) > self.max_states:
+            self.recent_states.discard(self.state_order.popleft())
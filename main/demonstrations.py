@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+from evaluation import get_env_class
+from hamiltonian_agent import HamiltonianAgent
+
+# Demonstration datasets for behavior cloning. Scripted agents play seeded episodes in parallel worker processes;
+# every worker writes its transitions as fixed-size chunks of .npy files, and index.json lists the chunks.
+# Readers memory-map the chunks, so datasets larger than RAM can be streamed.
+#
+#   <dataset>/index.json
+#   <dataset>/w03_c00012_obs.npy      (n, *obs_shape) observations exactly as the env returns them
+#   <dataset>/w03_c00012_mask.npy     (n, 4) bool action masks
+#   <dataset>/w03_c00012_action.npy   (n,) uint8 actions of the agent
+#   <dataset>/w03_c00012_return.npy   (n,) float32 discounted returns, to warm start the value head as well
+
+CHUNK_FIELDS = ["obs", "mask", "action", "return"]
+
+def make_agent(agent_name, board_size):
+    if agent_name == "hamiltonian":
+        return HamiltonianAgent(board_size)
+    if agent_name == "shortcut":
+        return HamiltonianAgent(board_size, shortcuts=True)
+    raise ValueError(f"Unknown agent: {agent_name}")
+
+def discounted_returns(rewards, gamma):
+    returns = np.empty(len(rewards), dtype=np.float32)
+    running = 0.0
+    for i in range(len(rewards) - 1, -1, -1):
+        running = rewards[i] + gamma * running
+        returns[i] = running
+    return returns
+
+class ChunkWriter:
+    # Buffers transitions in preallocated arrays and saves them as one chunk whenever chunk_size are collected.
+    def __init__(self, out_dir, prefix, chunk_size, obs_shape, obs_dtype, num_actions):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.buffers = {
+            "obs": np.empty((chunk_size, *obs_shape), dtype=obs_dtype),
+            "mask": np.empty((chunk_size, num_actions), dtype=bool),
+            "action": np.empty(chunk_size, dtype=np.uint8),
+            "return": np.empty(chunk_size, dtype=np.float32),
+        }
+        self.size = 0
+        self.chunks = []
+
+    def add_episode(self, obs, masks, actions, returns):
+        start = 0
+        while start < len(actions):
+            count = min(len(actions) - start, self.chunk_size - self.size)
+            for name, values in zip(CHUNK_FIELDS, (obs, masks, actions, returns)):
+                self.buffers[name][self.size:self.size + count] = values[start:start + count]
+            self.size += count
+            start += count
+            if self.size == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        if self.size == 0:
+            return
+        name = f"{self.prefix}_c{len(self.chunks):05d}"
+        for field in CHUNK_FIELDS:
+            np.save(os.path.join(self.out_dir, f"{name}_{field}.npy"), self.buffers[field][:self.size])
+        self.chunks.append({"name": name, "size": self.size})
+        self.size = 0
+
+def generate_worker(job):
+    # One worker: play episodes with consecutive seeds until num_transitions are written.
+    SnakeEnv = get_env_class(job["env"])
+    agent = make_agent(job["agent"], job["board_size"])
+    writer = None
+
+    written, episodes, scores = 0, 0, []
+    while written < job["num_transitions"]:
+        env = SnakeEnv(seed=job["seed"] + episodes, board_size=job["board_size"], **job["env_kwargs"])
+        obs = env.reset()
+        if writer is None:
+            writer = ChunkWriter(job["out_dir"], f"w{job['worker']:02d}", job["chunk_size"], obs.shape, obs.dtype, env.action_space.n)
+        episode_obs, episode_masks, episode_actions, episode_rewards = [], [], [], []
+        done = False
+        while not done:
+            action = agent.act(env.game)
+            episode_obs.append(obs)
+            episode_masks.append(env.get_action_mask()[0])
+            episode_actions.append(action)
+            obs, reward, done, _ = env.step(action)
+            episode_rewards.append(reward)
+        count = min(len(episode_actions), job["num_transitions"] - written)
+        writer.add_episode(
+            np.stack(episode_obs[:count]), np.stack(episode_masks[:count]), np.array(episode_actions[:count]),
+            discounted_returns(episode_rewards, job["gamma"])[:count],
+        )
+        written += count
+        episodes += 1
+        scores.append(env.game.score)
+        env.close()
+    writer.flush()
+    return {"chunks": writer.chunks, "episodes": episodes, "scores": scores}
+
+def generate(out_dir, env_type, agent_name, num_transitions, num_workers, chunk_size=16384, board_size=12, gamma=0.94, seed=0, env_kwargs=None):
+    if num_transitions <= 0:
+        raise ValueError(f"num_transitions must be positive, got {num_transitions}.")
+    os.makedirs(out_dir, exist_ok=True)
+    per_worker = [num_transitions // num_workers + (i < num_transitions % num_workers) for i in range(num_workers)]
+    # Workers without transitions are skipped: every job writes at least one chunk.
+    jobs = [{
+        "worker": i, "env": env_type, "agent": agent_name, "num_transitions": per_worker[i], "chunk_size": chunk_size,
+        "board_size": board_size, "gamma": gamma, "seed": seed * 10 ** 6 + i * 10 ** 4, "out_dir": out_dir,
+        "env_kwargs": env_kwargs or {},
+    } for i in range(num_workers) if per_worker[i] > 0]
+
+    with mp.Pool(len(jobs)) as pool:
+        results = pool.map(generate_worker, jobs)
+
+    sample_obs = np.load(os.path.join(out_dir, f"{results[0]['chunks'][0]['name']}_obs.npy"), mmap_mode="r")
+    index = {
+        "env": env_type, "agent": agent_name, "board_size": board_size, "gamma": gamma, "env_kwargs": env_kwargs or {},
+        "obs_shape": list(sample_obs.shape[1:]), "obs_dtype": str(sample_obs.dtype),
+        "size": sum(chunk["size"] for result in results for chunk in result["chunks"]),
+        "episodes": sum(result["episodes"] for result in results),
+        "mean_score": float(np.mean([score for result in results for score in result["scores"]])),
+        "chunks": [chunk for result in results for chunk in result["chunks"]],
+    }
+    with open(os.path.join(out_dir, "index.json"), "w") as index_file:
+        json.dump(index, index_file, indent=2)
+    return index
+
+class DemonstrationDataset:
+    # Read-only view of a dataset written by generate(). Chunks are memory-mapped on first use, so only the
+    # pages of the sampled rows are read from disk.
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "index.json")) as index_file:
+            self.index = json.load(index_file)
+        self.chunks = self.index["chunks"]
+        self.chunk_sizes = np.array([chunk["size"] for chunk in self.chunks], dtype=np.int64)
+        self._arrays = {}
+
+    def __len__(self):
+        return int(self.chunk_sizes.sum())
+
+    def chunk(self, chunk_id):
+        arrays = self._arrays.get(chunk_id)
+        if arrays is None:
+            name = self.chunks[chunk_id]["name"]
+            arrays = {field: np.load(os.path.join(self.path, f"{name}_{field}.npy"), mmap_mode="r") for field in CHUNK_FIELDS}
+            self._arrays[chunk_id] = arrays
+        return arrays
+
+    def iterate_minibatches(self, batch_size, rng, window_chunks=4):
+        # Shuffled minibatches for one epoch. Rows are shuffled across a window of window_chunks random chunks at a
+        # time, which bounds the pages touched per window while still mixing workers and episodes.
+        order = rng.permutation(len(self.chunks))
+        for window_start in range(0, len(order), window_chunks):
+            window = order[window_start:window_start + window_chunks]
+            offsets = np.concatenate([[0], np.cumsum(self.chunk_sizes[window])])
+            rows = rng.permutation(offsets[-1])
+            for batch_start in range(0, len(rows), batch_size):
+                batch_rows = rows[batch_start:batch_start + batch_size]
+                positions = np.searchsorted(offsets, batch_rows, side="right") - 1
+                parts = {field: [] for field in CHUNK_FIELDS}
+                for position in np.unique(positions):
+                    local_rows = np.sort(batch_rows[positions == position] - offsets[position])
+                    arrays = self.chunk(window[position])
+                    for field in CHUNK_FIELDS:
+                        parts[field].append(arrays[field][local_rows])
+                yield {field: np.concatenate(values) for field, values in parts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate scripted-agent demonstrations for behavior cloning.")
+    parser.add_argument("out")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default="cnn")
+    parser.add_argument("--agent", choices=["hamiltonian", "shortcut"], default="shortcut")
+    parser.add_argument("--transitions", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=16384)
+    parser.add_argument("--board-size", type=int, default=12)
+    parser.add_argument("--gamma", type=float, default=0.94, help="Discount of the stored returns, as in training.")
+    parser.add_argument("--obs-mode", choices=["board", "features"], default="board", help="MLP observation mode.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    env_kwargs = {"obs_mode": args.obs_mode} if args.env == "mlp" else {}
+    start_time = time.perf_counter()
+    index = generate(
+        args.out, args.env, args.agent, args.transitions, args.workers, args.chunk_size, args.board_size,
+        args.gamma, args.seed, env_kwargs,
+    )
+    elapsed = time.perf_counter() - start_time
+    print(f"{index['size']} transitions from {index['episodes']} episodes (mean score {index['mean_score']:.1f}) "
+          f"in {len(index['chunks'])} chunks, {elapsed:.1f}s, {index['size'] / elapsed:.0f} transitions/s.")
+
+if __name__ == "__main__":
+    main()
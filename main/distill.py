@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+from evaluation import get_env_class, evaluate_seeds, summarize
+
+# Policy distillation of a MaskablePPO CNN checkpoint (the teacher) into a small student network.
+# Worker processes play episodes with the teacher, taking a random valid action with probability epsilon to visit
+# states off the teacher's own path, and record the teacher's masked action distribution for every state. The
+# student sees the same state through the MLP env: "board" trains a compact CNN on the native board grid, "features"
+# a small MLP on the engineered feature vector. It is fitted by cross-entropy to the teacher distribution and saved
+# as TorchScript with the export_policy.py interface, so PolicyRuntime, test_mlp.py and the evaluation tools load it.
+
+STUDENT_MODES = ["board", "features"]
+
+def collect_worker(job):
+    # Teacher-labelled states of num_states steps, played on envs_per_worker envs in lockstep with batched inference.
+    import torch
+    from sb3_contrib import MaskablePPO
+
+    torch.set_num_threads(1)
+    teacher = MaskablePPO.load(job["teacher"], device="cpu")
+    TeacherEnv, StudentEnv = get_env_class("cnn"), get_env_class("mlp")
+    rng = np.random.default_rng(job["seed"])
+
+    envs, student_envs, observations = [], [], []
+    next_seed = job["seed"]
+    for _ in range(job["envs_per_worker"]):
+        envs.append(TeacherEnv(seed=next_seed, board_size=job["board_size"]))
+        # The student env only builds observations: it shares the game of the teacher env.
+        student_envs.append(StudentEnv(seed=next_seed, board_size=job["board_size"], obs_mode=job["mode"]))
+        student_envs[-1].game = envs[-1].game
+        observations.append(envs[-1].reset())
+        next_seed += 1
+
+    student_obs, masks, probs = [], [], []
+    scores = []
+    while len(probs) < job["num_states"]:
+        batch_masks = np.concatenate([env.get_action_mask() for env in envs])
+        with torch.no_grad():
+            obs_tensor, _ = teacher.policy.obs_to_tensor(np.stack(observations))
+            batch_probs = teacher.policy.get_distribution(obs_tensor, action_masks=batch_masks).distribution.probs.numpy()
+        for i, env in enumerate(envs):
+            student_obs.append(student_envs[i]._generate_observation())
+            masks.append(batch_masks[i])
+            probs.append(batch_probs[i])
+            valid = np.flatnonzero(batch_masks[i])
+            if len(valid) and rng.random() < job["epsilon"]:
+                action = rng.choice(valid)
+            else:
+                action = int(batch_probs[i].argmax())
+            observations[i], _, done, _ = env.step(action)
+            if done:
+                scores.append(env.game.score)
+                env.close()
+                envs[i] = TeacherEnv(seed=next_seed, board_size=job["board_size"])
+                student_envs[i].game = envs[i].game
+                observations[i] = envs[i].reset()
+                next_seed += 1
+    count = job["num_states"]
+    return {
+        "obs": np.stack(student_obs[:count]),
+        "mask": np.stack(masks[:count]),
+        "probs": np.stack(probs[:count]).astype(np.float32),
+        "scores": scores,
+    }
+
+def collect(teacher_path, mode, num_states, num_workers, envs_per_worker=16, epsilon=0.1, board_size=12, seed=0):
+    per_worker = [num_states // num_workers + (i < num_states % num_workers) for i in range(num_workers)]
+    jobs = [{
+        "teacher": teacher_path, "mode": mode, "num_states": per_worker[i], "envs_per_worker": envs_per_worker,
+        "epsilon": epsilon, "board_size": board_size, "seed": seed * 10 ** 6 + i * 10 ** 4,
+    } for i in range(num_workers) if per_worker[i] > 0]
+    with mp.get_context("spawn").Pool(len(jobs)) as pool: # Spawn: torch is not fork-safe once it has started threads.
+        results = pool.map(collect_worker, jobs)
+    data = {field: np.concatenate([result[field] for result in results]) for field in ["obs", "mask", "probs"]}
+    data["scores"] = [score for result in results for score in result["scores"]]
+    return data
+
+def make_student(mode, obs_shape, num_actions=4):
+    import torch
+    from torch import nn
+
+    class StudentPolicy(nn.Module):
+        # forward(obs, action_mask) -> (action, masked logits), the interface of export_policy.MaskedPolicy.
+        def __init__(self):
+            super().__init__()
+            if mode == "board":
+                board_size = obs_shape[0]
+                self.net = nn.Sequential(
+                    nn.Unflatten(1, (1, board_size)), # (N, B, B) -> (N, 1, B, B)
+                    nn.Conv2d(1, 16, 3, padding=1), nn.ReLU(),
+                    nn.Conv2d(16, 16, 3, padding=1), nn.ReLU(),
+                    nn.Flatten(),
+                    nn.Linear(16 * board_size * board_size, 64), nn.ReLU(),
+                    nn.Linear(64, num_actions),
+                )
+            else:
+                self.net = nn.Sequential(
+                    nn.Linear(obs_shape[0], 64), nn.ReLU(),
+                    nn.Linear(64, 64), nn.ReLU(),
+                    nn.Linear(64, num_actions),
+                )
+
+        def forward(self, obs, action_mask):
+            logits = self.net(obs)
+            logits = torch.where(action_mask, logits, torch.full_like(logits, -1e8)) # Same masking value as MaskableCategorical.
+            return torch.argmax(logits, dim=1), logits
+
+    return StudentPolicy()
+
+def train_student(student, data, train_rows, epochs, batch_size, learning_rate, seed=0):
+    import torch
+
+    optimizer = torch.optim.Adam(student.parameters(), lr=learning_rate)
+    obs = torch.as_tensor(data["obs"])
+    masks = torch.as_tensor(data["mask"])
+    probs = torch.as_tensor(data["probs"])
+    rng = np.random.default_rng(seed)
+    student.train()
+    for epoch in range(epochs):
+        start_time = time.perf_counter()
+        total_loss = 0.0
+        order = rng.permutation(train_rows)
+        for batch_start in range(0, len(order), batch_size):
+            rows = torch.as_tensor(order[batch_start:batch_start + batch_size])
+            _, logits = student(obs[rows], masks[rows])
+            # Cross-entropy to the teacher distribution over the valid actions; masked actions have zero teacher mass.
+            log_probs = torch.log_softmax(logits, dim=1)
+            loss = -torch.where(masks[rows], probs[rows] * log_probs, torch.zeros_like(log_probs)).sum(dim=1).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += float(loss) * len(rows)
+        print(f"Epoch {epoch + 1}/{epochs}: loss {total_loss / len(order):.4f}, "
+              f"{len(order) / (time.perf_counter() - start_time):.0f} samples/s", flush=True)
+    student.eval()
+
+def agreement_rate(student, data, rows):
+    # Fraction of held-out states where the student picks the teacher's greedy action.
+    import torch
+
+    with torch.no_grad():
+        actions, _ = student(torch.as_tensor(data["obs"][rows]), torch.as_tensor(data["mask"][rows]))
+    return float(np.mean(actions.numpy() == data["probs"][rows].argmax(axis=1)))
+
+def save_student(student, output_path, mode, obs_shape):
+    import torch
+
+    example_obs = torch.zeros((2,) + tuple(obs_shape))
+    example_mask = torch.ones((2, 4), dtype=torch.bool)
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(student, (example_obs, example_mask)))
+    traced.save(output_path)
+    meta = {
+        "format": "torchscript",
+        "obs_shape": list(obs_shape),
+        "obs_dtype": "float32",
+        "num_actions": 4,
+        "env": "mlp",
+        "env_kwargs": {"obs_mode": mode},
+    }
+    with open(output_path + ".json", "w") as meta_file:
+        json.dump(meta, meta_file, indent=4)
+
+def decision_latency_us(predict, observations, masks):
+    # Mean single-decision latency, as the policy is called while playing.
+    predict(observations[0], action_masks=masks[0], deterministic=True)
+    start_time = time.perf_counter()
+    for obs, mask in zip(observations, masks):
+        predict(obs, action_masks=mask, deterministic=True)
+    return (time.perf_counter() - start_time) / len(observations) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill a MaskablePPO CNN policy into a small student network.")
+    parser.add_argument("--teacher", default="trained_models_cnn/ppo_snake_final.zip")
+    parser.add_argument("--mode", choices=STUDENT_MODES, default="board", help="board: compact CNN on the board grid, features: MLP.")
+    parser.add_argument("--states", type=int, default=500000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--envs-per-worker", type=int, default=16)
+    parser.add_argument("--epsilon", type=float, default=0.1, help="Probability of a random valid action while collecting.")
+    parser.add_argument("--holdout", type=float, default=0.1, help="Fraction of the states kept for the agreement rate.")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--eval-episodes", type=int, default=20)
+    parser.add_argument("--decisions", type=int, default=2000, help="Decisions timed for the inference speedup.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Default: distilled_<mode>.pt next to the teacher.")
+    args = parser.parse_args()
+
+    import torch
+    from sb3_contrib import MaskablePPO
+
+    from policy_runtime import PolicyRuntime
+
+    torch.manual_seed(args.seed)
+    start_time = time.perf_counter()
+    data = collect(args.teacher, args.mode, args.states, args.workers, args.envs_per_worker, args.epsilon, seed=args.seed)
+    print(f"{len(data['obs'])} teacher-labelled states in {time.perf_counter() - start_time:.1f}s "
+          f"(teacher mean score {np.mean(data['scores']) if data['scores'] else float('nan'):.1f} with epsilon {args.epsilon}).")
+
+    rows = np.random.default_rng(args.seed).permutation(len(data["obs"]))
+    num_holdout = int(len(rows) * args.holdout)
+    holdout_rows, train_rows = rows[:num_holdout], rows[num_holdout:]
+
+    obs_shape = data["obs"].shape[1:]
+    student = make_student(args.mode, obs_shape)
+    print(f"Student: {sum(p.numel() for p in student.parameters())} parameters.")
+    train_student(student, data, train_rows, args.epochs, args.batch_size, args.lr, args.seed)
+
+    output_path = args.out or os.path.join(os.path.dirname(args.teacher), f"distilled_{args.mode}.pt")
+    save_student(student, output_path, args.mode, obs_shape)
+    print(f"Saved {output_path}")
+
+    torch.set_num_threads(1)
+    teacher = MaskablePPO.load(args.teacher, device="cpu")
+    runtime = PolicyRuntime(output_path)
+    report = {"agreement_rate": agreement_rate(student, data, holdout_rows) if num_holdout else float("nan")}
+
+    if args.eval_episodes:
+        seeds = [10 ** 6 + i for i in range(args.eval_episodes)] # Same seeds, so both play the same food sequences.
+        teacher_summary = summarize(evaluate_seeds(teacher.predict, "cnn", seeds))
+        student_summary = summarize(evaluate_seeds(runtime.predict, "mlp", seeds, env_kwargs={"obs_mode": args.mode}))
+        report.update({
+            "teacher_score": teacher_summary["mean_score"],
+            "student_score": student_summary["mean_score"],
+            "score_retention": student_summary["mean_score"] / max(teacher_summary["mean_score"], 1e-9),
+        })
+
+    # Latency on the states each policy sees: the 84x84 image for the teacher, the student observation otherwise.
+    timing_rows = holdout_rows[:args.decisions] if num_holdout else rows[:args.decisions]
+    teacher_env = get_env_class("cnn")(seed=0)
+    teacher_obs = [teacher_env.observation_space.sample() for _ in timing_rows]
+    masks = [data["mask"][row][None] for row in timing_rows]
+    report["teacher_latency_us"] = decision_latency_us(teacher.predict, teacher_obs, masks)
+    report["student_latency_us"] = decision_latency_us(runtime.predict, [data["obs"][row] for row in timing_rows], masks)
+    report["speedup"] = report["teacher_latency_us"] / report["student_latency_us"]
+
+    print(f"Agreement with the teacher's greedy action: {report['agreement_rate']:.3f} on {num_holdout} held-out states.")
+    if "score_retention" in report:
+        print(f"Mean score over {args.eval_episodes} episodes: teacher {report['teacher_score']:.1f}, "
+              f"student {report['student_score']:.1f}, retention {report['score_retention']:.1%}.")
+    print(f"Decision latency: teacher {report['teacher_latency_us']:.0f} us, student {report['student_latency_us']:.0f} us, "
+          f"speedup {report['speedup']:.1f}x.")
+    with open(output_path + ".report.json", "w") as report_file:
+        json.dump(report, report_file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import os
+import time
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.nn.functional as F
+import cloudpickle
+from sb3_contrib import MaskablePPO
+from sb3_contrib.common.maskable.buffers import MaskableRolloutBuffer
+from stable_baselines3.common.utils import explained_variance
+
+# MaskablePPO with a data-parallel gradient phase. Rollout collection is unchanged; train() runs on num_learners
+# processes joined in a gloo process group: the main process is rank 0 and the others are started on the first
+# update. The rollout buffer arrays the update reads live in shared memory, so the helpers read their shards without
+# copies. Every minibatch of batch_size samples is split into num_learners shards, the shard losses are weighted by
+# their share of the minibatch and the gradients are summed with all_reduce, so all ranks take the same optimizer step
+# as single-process MaskablePPO would with the same minibatch (up to floating-point summation order).
+
+SHARED_FIELDS = ["observations", "actions", "values", "log_probs", "advantages", "action_masks"]
+
+class SharedRolloutBuffer(MaskableRolloutBuffer):
+    # The fields read by the update are allocated once in shared memory, and reused by every rollout. Observations
+    # are stored in the observation space dtype (uint8 for images) instead of float32: 4x less memory to share.
+    def reset(self):
+        super().reset()
+        if not hasattr(self, "shared_blocks"):
+            self.shared_blocks = {}
+            self.layout = {}
+            for name in SHARED_FIELDS:
+                dtype = self.observation_space.dtype if name == "observations" else np.float32
+                shape = self.__dict__[name].shape
+                block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1))
+                self.shared_blocks[name] = block
+                self.layout[name] = (block.name, shape, np.dtype(dtype).str)
+        for name, block in self.shared_blocks.items():
+            _, shape, dtype = self.layout[name]
+            self.__dict__[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        self.action_masks[:] = 1
+
+    def close(self):
+        for block in getattr(self, "shared_blocks", {}).values():
+            block.close()
+            block.unlink()
+        self.shared_blocks = {}
+
+def attach_buffers(layout):
+    blocks = {name: shared_memory.SharedMemory(name=block_name) for name, (block_name, _, _) in layout.items()}
+    arrays = {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf) for name, (_, shape, dtype) in layout.items()}
+    return blocks, arrays
+
+def train_shard(policy, arrays, config, rank, world_size):
+    # One update on this rank's shards. Runs in lockstep on all ranks: same permutation, same collective calls.
+    num_samples = arrays["values"].size
+    observations = arrays["observations"].reshape((num_samples,) + arrays["observations"].shape[2:])
+    actions = arrays["actions"].reshape(num_samples)
+    old_values = arrays["values"].reshape(num_samples)
+    old_log_probs = arrays["log_probs"].reshape(num_samples)
+    advantages = arrays["advantages"].reshape(num_samples)
+    returns = advantages + old_values
+    action_masks = arrays["action_masks"].reshape(num_samples, -1)
+
+    for group in policy.optimizer.param_groups:
+        group["lr"] = config["learning_rate"]
+    parameters = [p for p in policy.parameters() if p.requires_grad]
+    policy.set_training_mode(True)
+    rng = np.random.default_rng(config["seed"])
+    stats = []
+    for epoch in range(config["n_epochs"]):
+        indices = rng.permutation(num_samples)
+        stop = False
+        for start in range(0, num_samples, config["batch_size"]):
+            batch = indices[start:start + config["batch_size"]]
+            batch_advantages = advantages[batch]
+            if config["normalize_advantage"] and len(batch) > 1:
+                # Statistics of the whole minibatch, as in MaskablePPO.
+                batch_advantages = (batch_advantages - batch_advantages.mean()) / (batch_advantages.std(ddof=1) + 1e-8)
+            shard = slice(rank * len(batch) // world_size, (rank + 1) * len(batch) // world_size)
+            index = batch[shard]
+            weight = len(index) / len(batch)
+
+            # A minibatch smaller than world_size leaves some ranks without samples: they skip the loss but still join
+            # both all_reduce calls, with zero statistics and zero gradients.
+            loss = None
+            minibatch_stats = torch.zeros(5)
+            if len(index) > 0:
+                values, log_prob, entropy = policy.evaluate_actions(
+                    torch.as_tensor(observations[index]), torch.as_tensor(actions[index]).long(),
+                    action_masks=action_masks[index],
+                )
+                values = values.flatten()
+                shard_advantages = torch.as_tensor(batch_advantages[shard])
+                ratio = torch.exp(log_prob - torch.as_tensor(old_log_probs[index]))
+                clip_range = config["clip_range"]
+                policy_loss = -torch.min(shard_advantages * ratio, shard_advantages * torch.clamp(ratio, 1 - clip_range, 1 + clip_range)).mean()
+                values_pred = values
+                if config["clip_range_vf"] is not None:
+                    shard_old_values = torch.as_tensor(old_values[index])
+                    values_pred = shard_old_values + torch.clamp(values - shard_old_values, -config["clip_range_vf"], config["clip_range_vf"])
+                value_loss = F.mse_loss(torch.as_tensor(returns[index]), values_pred)
+                entropy_loss = -torch.mean(entropy)
+                loss = policy_loss + config["ent_coef"] * entropy_loss + config["vf_coef"] * value_loss
+
+                with torch.no_grad():
+                    log_ratio = log_prob - torch.as_tensor(old_log_probs[index])
+                    approx_kl = torch.mean((torch.exp(log_ratio) - 1) - log_ratio)
+                    clip_fraction = torch.mean((torch.abs(ratio - 1) > clip_range).float())
+                    minibatch_stats = torch.stack([policy_loss, value_loss, entropy_loss, approx_kl, clip_fraction]) * weight
+            dist.all_reduce(minibatch_stats)
+            stats.append(minibatch_stats.numpy())
+            if config["target_kl"] is not None and minibatch_stats[3] > 1.5 * config["target_kl"]:
+                stop = True # The same decision on every rank, made on the reduced KL.
+                break
+
+            policy.optimizer.zero_grad()
+            if loss is not None:
+                (loss * weight).backward()
+            gradients = torch.cat([p.grad.flatten() if p.grad is not None else torch.zeros(p.numel()) for p in parameters])
+            dist.all_reduce(gradients)
+            offset = 0
+            for p in parameters:
+                if p.grad is None:
+                    p.grad = torch.zeros_like(p)
+                p.grad.copy_(gradients[offset:offset + p.numel()].view_as(p))
+                offset += p.numel()
+            torch.nn.utils.clip_grad_norm_(parameters, config["max_grad_norm"])
+            policy.optimizer.step()
+        if stop:
+            break
+    return np.array(stats)
+
+def _learner_worker(rank, world_size, init_method, spec, num_threads):
+    torch.set_num_threads(num_threads)
+    dist.init_process_group("gloo", init_method=init_method, rank=rank, world_size=world_size)
+    spec = cloudpickle.loads(spec)
+    policy = spec["policy_class"](spec["observation_space"], spec["action_space"], lambda _: 0.0, **spec["policy_kwargs"])
+    policy.optimizer.load_state_dict(spec["optimizer_state"])
+    blocks, arrays = attach_buffers(spec["layout"])
+    try:
+        while True:
+            command = [None]
+            dist.broadcast_object_list(command, src=0)
+            if command[0] is None:
+                break
+            for tensor in policy.state_dict().values():
+                dist.broadcast(tensor, src=0)
+            train_shard(policy, arrays, command[0], rank, world_size)
+    finally:
+        for block in blocks.values():
+            block.close()
+        dist.destroy_process_group()
+
+class DistributedMaskablePPO(MaskablePPO):
+    # num_learners: processes sharing each update (1: plain MaskablePPO update on the shared buffer).
+    # learner_threads: torch threads per learner process, including the main process during updates.
+    def __init__(self, *args, num_learners=2, learner_threads=1, init_method="tcp://127.0.0.1:29501", **kwargs):
+        self.num_learners = num_learners
+        self.learner_threads = learner_threads
+        self.init_method = init_method
+        self.learner_processes = None
+        self.update_times = []
+        super().__init__(*args, **kwargs)
+
+    def _setup_model(self):
+        super()._setup_model()
+        assert self.device.type == "cpu", "Data-parallel updates use the gloo backend, which runs on CPU tensors."
+        self.rollout_buffer = SharedRolloutBuffer(
+            self.n_steps,
+            self.observation_space,
+            self.action_space,
+            self.device,
+            gamma=self.gamma,
+            gae_lambda=self.gae_lambda,
+            n_envs=self.n_envs,
+        )
+
+    def _excluded_save_params(self):
+        return super()._excluded_save_params() + ["learner_processes", "update_times"]
+
+    def _start_learners(self):
+        spec = cloudpickle.dumps({
+            "policy_class": self.policy_class,
+            "observation_space": self.observation_space,
+            "action_space": self.action_space,
+            "policy_kwargs": self.policy_kwargs,
+            "optimizer_state": self.policy.optimizer.state_dict(),
+            "layout": self.rollout_buffer.layout,
+        })
+        ctx = mp.get_context("spawn")
+        self.learner_processes = []
+        for rank in range(1, self.num_learners):
+            process = ctx.Process(target=_learner_worker, args=(rank, self.num_learners, self.init_method, spec, self.learner_threads), daemon=True)
+            process.start()
+            self.learner_processes.append(process)
+        dist.init_process_group("gloo", init_method=self.init_method, rank=0, world_size=self.num_learners)
+
+    def close_learners(self):
+        if self.learner_processes is not None:
+            dist.broadcast_object_list([None], src=0)
+            for process in self.learner_processes:
+                process.join()
+            dist.destroy_process_group()
+            self.learner_processes = None
+        self.rollout_buffer.close()
+
+    def train(self):
+        if self.learner_processes is None:
+            self._start_learners()
+        self._update_learning_rate(self.policy.optimizer)
+        config = {
+            "learning_rate": self.policy.optimizer.param_groups[0]["lr"],
+            "clip_range": self.clip_range(self._current_progress_remaining),
+            "clip_range_vf": self.clip_range_vf(self._current_progress_remaining) if self.clip_range_vf is not None else None,
+            "n_epochs": self.n_epochs,
+            "batch_size": self.batch_size,
+            "normalize_advantage": self.normalize_advantage,
+            "target_kl": self.target_kl,
+            "ent_coef": self.ent_coef,
+            "vf_coef": self.vf_coef,
+            "max_grad_norm": self.max_grad_norm,
+            "seed": int(np.random.randint(2 ** 31)),
+        }
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(self.learner_threads)
+        start_time = time.perf_counter()
+        dist.broadcast_object_list([config], src=0)
+        for tensor in self.policy.state_dict().values(): # Keeps the helpers in sync after set_parameters() too.
+            dist.broadcast(tensor, src=0)
+        stats = train_shard(self.policy, self.rollout_buffer.__dict__, config, 0, self.num_learners)
+        self.update_times.append(time.perf_counter() - start_time)
+        torch.set_num_threads(num_threads)
+
+        self._n_updates += self.n_epochs
+        values = self.rollout_buffer.values.flatten()
+        explained_var = explained_variance(values, self.rollout_buffer.advantages.flatten() + values)
+        self.logger.record("train/policy_gradient_loss", np.mean(stats[:, 0]))
+        self.logger.record("train/value_loss", np.mean(stats[:, 1]))
+        self.logger.record("train/entropy_loss", np.mean(stats[:, 2]))
+        self.logger.record("train/approx_kl", np.mean(stats[:, 3]))
+        self.logger.record("train/clip_fraction", np.mean(stats[:, 4]))
+        self.logger.record("train/explained_variance", explained_var)
+        self.logger.record("train/n_updates", self._n_updates, exclude="tensorboard")
+        self.logger.record("train/clip_range", config["clip_range"])
+        self.logger.record("train/update_time", self.update_times[-1])
+        self.logger.record("train/num_learners", self.num_learners)
+
+def _fill_random_rollout(buffer, rng):
+    # Update time does not depend on the data: random observations, valid masks and advantages are enough.
+    space = buffer.observation_space
+    if np.issubdtype(space.dtype, np.integer):
+        buffer.observations[:] = rng.integers(0, 256, buffer.observations.shape, dtype=space.dtype)
+    else:
+        buffer.observations[:] = rng.random(buffer.observations.shape, dtype=np.float32)
+    buffer.actions[:] = rng.integers(0, buffer.action_space.n, buffer.actions.shape)
+    buffer.action_masks[:] = 1
+    buffer.values[:] = rng.normal(size=buffer.values.shape)
+    buffer.log_probs[:] = np.log(1 / buffer.action_space.n)
+    buffer.advantages[:] = rng.normal(size=buffer.advantages.shape)
+    buffer.full = True
+
+def main():
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from env_worker import ActionMaskWrapper
+    from evaluation import get_env_class
+
+    parser = argparse.ArgumentParser(description="Update time of data-parallel MaskablePPO versus the number of learner processes.")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default="cnn")
+    parser.add_argument("--learners", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads per learner.")
+    parser.add_argument("--n-steps", type=int, default=2048)
+    parser.add_argument("--num-envs", type=int, default=32, help="Rollout buffer width; no envs are stepped.")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--n-epochs", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=2, help="Timed updates per learner count, after one warm-up update.")
+    args = parser.parse_args()
+
+    SnakeEnv = get_env_class(args.env)
+    print(f"{args.env}: {args.n_steps}x{args.num_envs} buffer, batch size {args.batch_size}, {args.n_epochs} epochs, "
+          f"{args.threads} thread(s) per learner, {os.cpu_count()} cores.")
+    print(f"{'learners':>8} {'update_s':>9} {'speedup':>8} {'efficiency':>10}")
+    baseline_time = None
+    for num_learners in args.learners:
+        env = DummyVecEnv([lambda: ActionMaskWrapper(SnakeEnv(seed=0))] * args.num_envs)
+        model = DistributedMaskablePPO(
+            "CnnPolicy" if args.env == "cnn" else "MlpPolicy", env, device="cpu", n_steps=args.n_steps,
+            batch_size=args.batch_size, n_epochs=args.n_epochs, num_learners=num_learners, learner_threads=args.threads,
+        )
+        model._setup_learn(0) # Logger and progress, as model.learn() would set them up.
+        model.rollout_buffer.reset()
+        _fill_random_rollout(model.rollout_buffer, np.random.default_rng(0))
+        for _ in range(args.repeats + 1):
+            model.train()
+        update_time = float(np.mean(model.update_times[1:]))
+        model.close_learners()
+        env.close()
+        baseline_time = baseline_time or update_time
+        speedup = baseline_time / update_time
+        print(f"{num_learners:>8} {update_time:>9.2f} {speedup:>7.2f}x {speedup * args.learners[0] / num_learners:>10.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import time
+
+import gym
+import cloudpickle
+
+# Minimal entry point for SubprocVecEnv workers. Everything a worker process imports goes through this
+# module, which only needs gym and NumPy: no torch, no Stable-Baselines3 and no pygame.
+
+class ActionMaskWrapper(gym.Wrapper):
+    # Lean replacement for sb3_contrib's ActionMasker: MaskablePPO looks for an `action_masks` method.
+    def action_masks(self):
+        return self.env.get_action_mask()
+
+class EpisodeMonitor(gym.Wrapper):
+    # Lean replacement for Stable-Baselines3's Monitor: reports episode reward, length and time in info["episode"].
+    def __init__(self, env):
+        super().__init__(env)
+        self.t_start = time.time()
+        self.episode_reward = 0.0
+        self.episode_length = 0
+
+    def reset(self, **kwargs):
+        self.episode_reward = 0.0
+        self.episode_length = 0
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        obs, reward, done, info = self.env.step(action)
+        self.episode_reward += reward
+        self.episode_length += 1
+        if done:
+            info["episode"] = {
+                "r": round(self.episode_reward, 6),
+                "l": self.episode_length,
+                "t": round(time.time() - self.t_start, 6),
+            }
+        return obs, reward, done, info
+
+class CloudpickleWrapper:
+    # Same as Stable-Baselines3's CloudpickleWrapper, which can't be used here as unpickling it would import torch.
+    def __init__(self, var):
+        self.var = var
+
+    def __getstate__(self):
+        return cloudpickle.dumps(self.var)
+
+    def __setstate__(self, var):
+        self.var = cloudpickle.loads(var)
+
+def _is_wrapped(env, wrapper_class):
+    while isinstance(env, gym.Wrapper):
+        if isinstance(env, wrapper_class):
+            return True
+        env = env.env
+    return False
+
+# Speaks the same pipe protocol as stable_baselines3.common.vec_env.subproc_vec_env._worker.
+def worker(remote, parent_remote, env_fn_wrapper):
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                observation, reward, done, info = env.step(data)
+                if done:
+                    # save final observation where user can get it, then reset
+                    info["terminal_observation"] = observation
+                    observation = env.reset()
+                remote.send((observation, reward, done, info))
+            elif cmd == "seed":
+                remote.send(env.seed(data))
+            elif cmd == "reset":
+                remote.send(env.reset())
+            elif cmd == "render":
+                remote.send(env.render(data))
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "env_method":
+                method = getattr(env, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(_is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except EOFError:
+            break
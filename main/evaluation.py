@@ -0,0 +1,82 @@
+import numpy as np
+
+# Shared evaluation helpers: play seeded episodes with any predict(obs, action_masks) callable, such as
+# MaskablePPO.predict, PolicyRuntime.predict or PolicyClient.predict.
+
+def get_env_class(env_type):
+    if env_type == "mlp":
+        from snake_game_custom_wrapper_mlp import SnakeEnv
+    else:
+        from snake_game_custom_wrapper_cnn import SnakeEnv
+    return SnakeEnv
+
+def load_predict(model_path, num_threads=1):
+    # predict(obs, action_masks, deterministic) of a saved model: exported .pt/.onnx policies run on PolicyRuntime,
+    # anything else is loaded as a MaskablePPO zip on the CPU.
+    if model_path.endswith((".pt", ".onnx")):
+        from policy_runtime import PolicyRuntime
+        runtime = PolicyRuntime(model_path, num_threads=num_threads)
+        # The CNN env returns channel-last images; older CNN exports took the channel-first model layout instead.
+        obs_shape = runtime.obs_shape
+        if len(obs_shape) == 3 and obs_shape[0] == 3 and obs_shape[-1] != 3:
+            raise ValueError(f"{model_path} takes channel-first {obs_shape} observations, re-export it with export_policy.py.")
+        return runtime.predict
+    import torch
+    from sb3_contrib import MaskablePPO
+    torch.set_num_threads(num_threads)
+    return MaskablePPO.load(model_path, device="cpu").predict
+
+def run_episode(predict, env, deterministic=True):
+    obs = env.reset()
+    done = False
+    num_step = 0
+    info = None
+    while not done:
+        action, _ = predict(obs, action_masks=env.get_action_mask(), deterministic=deterministic)
+        obs, _, done, info = env.step(action)
+        num_step += 1
+    return {
+        "score": env.game.score,
+        "steps": num_step,
+        "snake_size": info["snake_size"],
+        "win": info["snake_size"] == env.game.grid_size,
+    }
+
+def evaluate_seeds(predict, env_type, seeds, board_size=12, deterministic=True, limit_step=True, env_kwargs=None):
+    # One episode per seed, each on a freshly seeded env, so results are comparable between models.
+    SnakeEnv = get_env_class(env_type)
+    results = []
+    for seed in seeds:
+        env = SnakeEnv(seed=seed, board_size=board_size, limit_step=limit_step, **(env_kwargs or {}))
+        results.append(run_episode(predict, env, deterministic))
+        env.close()
+    return results
+
+def record_states(predict, env_type, seeds, env_kwargs=None, max_states=None):
+    # Observations and action masks of the games played by predict, one seeded episode per seed.
+    SnakeEnv = get_env_class(env_type)
+    observations, masks = [], []
+    for seed in seeds:
+        env = SnakeEnv(seed=seed, **(env_kwargs or {}))
+        obs = env.reset()
+        done = False
+        while not done:
+            mask = env.get_action_mask()
+            observations.append(obs)
+            masks.append(mask[0])
+            action, _ = predict(obs, action_masks=mask, deterministic=True)
+            obs, _, done, _ = env.step(action)
+        env.close()
+        if max_states is not None and len(observations) >= max_states:
+            break
+    return np.stack(observations[:max_states]), np.stack(masks[:max_states])
+
+def summarize(results):
+    scores = np.array([r["score"] for r in results], dtype=np.float64)
+    return {
+        "episodes": len(results),
+        "mean_score": float(scores.mean()) if len(scores) else 0.0,
+        "std_score": float(scores.std()) if len(scores) else 0.0,
+        "win_rate": float(np.mean([r["win"] for r in results])) if results else 0.0,
+        "mean_steps": float(np.mean([r["steps"] for r in results])) if results else 0.0,
+    }
@@ -0,0 +1,227 @@
+import os
+import glob
+import time
+import zlib
+import struct
+import random
+import argparse
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+from snake_game import SnakeGame
+
+# Tile ids of the encoded board. Body tiles follow BODY_TILE, one per shade level of the gradient.
+EMPTY_TILE = 0
+FOOD_TILE = 1
+HEAD_TILE = 2
+TAIL_TILE = 3
+BODY_TILE = 4
+
+CELL_SIZE = 20 # Pixel size of one board cell in the exported frames.
+FPS = 20
+
+def encode_state(game):
+    # Encode the current game state as a (board_size, board_size) grid of tile ids.
+    grid = np.zeros((game.board_size, game.board_size), dtype=np.uint8)
+
+    if len(game.snake) < game.grid_size: # If the snake occupies the entire board, don't draw food.
+        grid[game.food] = FOOD_TILE
+
+    snake = np.array(game.snake)
+    num_body = len(snake) - 1
+    levels = np.arange(1, num_body) * (SnakeGame.BODY_SHADES - 1) // num_body # Same shade levels as SnakeGame.render.
+    grid[snake[1:-1, 0], snake[1:-1, 1]] = BODY_TILE + levels
+    grid[tuple(snake[-1])] = TAIL_TILE
+    grid[tuple(snake[0])] = HEAD_TILE
+    return grid
+
+class FrameRasterizer:
+    def __init__(self, board_size, cell_size=CELL_SIZE):
+        self.board_size = board_size
+        self.cell_size = cell_size
+        self.frame_size = board_size * cell_size
+        self.tiles = self._build_tiles(cell_size) # (num_tiles, cell_size, cell_size, 3)
+
+    @staticmethod
+    def _build_tiles(cell_size):
+        tiles = np.zeros((BODY_TILE + SnakeGame.BODY_SHADES, cell_size, cell_size, 3), dtype=np.uint8)
+        y, x = np.mgrid[0:cell_size, 0:cell_size]
+        half = (cell_size - 1) / 2
+
+        tiles[FOOD_TILE] = (255, 0, 0)
+
+        # Diamond-shaped blue head with two white eyes.
+        tiles[HEAD_TILE][np.abs(x - half) + np.abs(y - half) <= half] = (100, 100, 255)
+        eye_offset = cell_size // 4
+        eye_radius = max(cell_size // 13, 1)
+        for eye_x in (eye_offset, cell_size - 1 - eye_offset):
+            tiles[HEAD_TILE][(x - eye_x) ** 2 + (y - eye_offset) ** 2 <= eye_radius ** 2] = (255, 255, 255)
+
+        # Body and tail tiles are squares with rounded (cut) corners.
+        radius = max(cell_size // 8, 1)
+        corner_x = np.minimum(x, cell_size - 1 - x)
+        corner_y = np.minimum(y, cell_size - 1 - y)
+        rounded = ~((corner_x < radius) & (corner_y < radius) & ((radius - corner_x) ** 2 + (radius - corner_y) ** 2 > radius ** 2))
+        tiles[TAIL_TILE][rounded] = (255, 100, 100)
+        color_list = np.linspace(255, 100, SnakeGame.BODY_SHADES, dtype=np.uint8)
+        for level, color in enumerate(color_list):
+            tiles[BODY_TILE + level][rounded] = (0, color, 0)
+
+        return tiles
+
+    def rasterize(self, grids):
+        # Turn a stack of (T, board_size, board_size) tile grids into (T, H, W, 3) RGB frames with one gather.
+        grids = np.asarray(grids)
+        num_frames = grids.shape[0]
+        frames = self.tiles[grids] # (T, board, board, cell, cell, 3)
+        frames = frames.transpose(0, 1, 3, 2, 4, 5)
+        return frames.reshape(num_frames, self.frame_size, self.frame_size, 3)
+
+def _png_bytes(frame, compress_level=1):
+    height, width, _ = frame.shape
+    raw = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = 0 # No per-row filter.
+    raw[:, 1:] = frame.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0) # 8-bit RGB.
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level)) + chunk(b"IEND", b"")
+
+class FrameWriter:
+    # Stream frames to a PNG sequence (a directory path), or to ffmpeg for .mp4/.gif files.
+    def __init__(self, path, frame_size, fps=FPS):
+        self.path = path
+        self.num_frames = 0
+        self.process = None
+
+        if os.path.splitext(path)[1].lower() in (".mp4", ".gif", ".webm", ".avi"):
+            command = [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{frame_size}x{frame_size}", "-r", str(fps), "-i", "-",
+            ]
+            if path.lower().endswith(".mp4"):
+                command += ["-pix_fmt", "yuv420p"]
+            self.process = subprocess.Popen(command + [path], stdin=subprocess.PIPE)
+        else:
+            os.makedirs(path, exist_ok=True)
+
+    def write(self, frames):
+        if self.process is not None:
+            self.process.stdin.write(np.ascontiguousarray(frames).tobytes())
+        else:
+            for i, frame in enumerate(frames):
+                with open(os.path.join(self.path, f"frame_{self.num_frames + i:06d}.png"), "wb") as image_file:
+                    image_file.write(_png_bytes(frame))
+        self.num_frames += len(frames)
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+
+def export_grids(grids, path, cell_size=CELL_SIZE, fps=FPS, chunk_size=256):
+    # Rasterize and stream an encoded episode chunk by chunk so long episodes never sit in memory as full frames.
+    rasterizer = FrameRasterizer(grids.shape[1], cell_size)
+    writer = FrameWriter(path, rasterizer.frame_size, fps)
+    for start in range(0, len(grids), chunk_size):
+        writer.write(rasterizer.rasterize(grids[start:start + chunk_size]))
+    writer.close()
+    return writer.num_frames
+
+def record_episode(env, predict, max_steps=100000):
+    # Play one episode on a SnakeEnv and return its (T, board_size, board_size) tile grids.
+    obs = env.reset()
+    grids = [encode_state(env.game)]
+    done = False
+    num_step = 0
+    while not done and num_step < max_steps:
+        action = predict(obs, env.get_action_mask())
+        obs, _, done, _ = env.step(action)
+        grids.append(encode_state(env.game))
+        num_step += 1
+    return np.stack(grids)
+
+def _make_predict(model_path, seed):
+    if model_path is None:
+        rng = random.Random(seed)
+        def predict(obs, mask): # Random valid action.
+            valid_actions = np.flatnonzero(mask[0])
+            return rng.choice(valid_actions) if len(valid_actions) > 0 else 0
+        return predict
+
+    from sb3_contrib import MaskablePPO # Only the workers exporting live policy episodes pay for this import.
+    model = MaskablePPO.load(model_path, device="cpu")
+    def predict(obs, mask):
+        action, _ = model.predict(obs, action_masks=mask, deterministic=True)
+        return int(action)
+    return predict
+
+def _export_job(job):
+    if job["type"] == "recorded":
+        grids = np.load(job["source"])
+    else:
+        if job["env"] == "mlp":
+            from snake_game_custom_wrapper_mlp import SnakeEnv
+        else:
+            from snake_game_custom_wrapper_cnn import SnakeEnv
+        env = SnakeEnv(seed=job["seed"], board_size=job["board_size"], limit_step=True)
+        grids = record_episode(env, _make_predict(job["model"], job["seed"]))
+        if job["save_grids"]:
+            np.save(os.path.splitext(job["output"])[0] + ".npy", grids)
+    return job["output"], export_grids(grids, job["output"], job["cell_size"], job["fps"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless export of snake episodes to videos, GIFs or PNG sequences.")
+    parser.add_argument("--model", default=None, help="MaskablePPO zip used to play live episodes (random valid actions if omitted).")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default="cnn", help="Observation wrapper matching the model.")
+    parser.add_argument("--episodes", type=int, default=None, help="Number of live episodes to play and export (default: 4, or 0 with --recorded).")
+    parser.add_argument("--recorded", nargs="*", default=[], help="Recorded .npy tile-grid episodes (globs allowed) to export.")
+    parser.add_argument("--board-size", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", default="png", choices=["png", "mp4", "gif"], help="png writes one frame directory per episode.")
+    parser.add_argument("--out", default="exported_episodes")
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE)
+    parser.add_argument("--fps", type=int, default=FPS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--save-grids", action="store_true", help="Also save live episodes as .npy tile grids for later re-export.")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    extension = "" if args.format == "png" else "." + args.format
+
+    recorded = sorted(path for pattern in args.recorded for path in glob.glob(pattern))
+    if args.recorded and not recorded:
+        parser.error(f"--recorded {' '.join(args.recorded)} matches no files.")
+    num_live = args.episodes if args.episodes is not None else (0 if args.recorded else 4)
+
+    jobs = []
+    for source in recorded:
+        name = os.path.splitext(os.path.basename(source))[0]
+        jobs.append({"type": "recorded", "source": source, "output": os.path.join(args.out, name + extension)})
+    for i in range(num_live): # Also with --recorded when --episodes is given: both are exported.
+        jobs.append({
+            "type": "live", "model": args.model, "env": args.env, "seed": args.seed + i,
+            "board_size": args.board_size, "save_grids": args.save_grids,
+            "output": os.path.join(args.out, f"episode_{args.seed + i:06d}" + extension),
+        })
+    if not jobs:
+        parser.error("Nothing to export: pass --episodes greater than 0 or --recorded files.")
+    for job in jobs:
+        job["cell_size"] = args.cell_size
+        job["fps"] = args.fps
+
+    start_time = time.perf_counter()
+    total_frames = 0
+    with multiprocessing.Pool(min(args.workers, len(jobs))) as pool:
+        for output, num_frames in pool.imap_unordered(_export_job, jobs):
+            total_frames += num_frames
+            print(f"{output}: {num_frames} frames")
+    elapsed = time.perf_counter() - start_time
+    print(f"Exported {len(jobs)} episodes, {total_frames} frames in {elapsed:.2f}s ({total_frames / elapsed:.0f} frames/s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import json
+import argparse
+
+import numpy as np
+import torch
+from sb3_contrib import MaskablePPO
+from stable_baselines3.common.preprocessing import is_image_space
+
+from evaluation import get_env_class, record_states
+
+class MaskedPolicy(torch.nn.Module):
+    # Self-contained actor of a MaskablePPO policy: preprocessing, forward pass and action masking in one graph.
+    def __init__(self, policy, transpose_image):
+        super().__init__()
+        self.policy = policy
+        self.transpose_image = transpose_image
+
+    def forward(self, obs, action_mask):
+        if self.transpose_image:
+            obs = obs.permute(0, 3, 1, 2) # HWC -> CHW, done by VecTransposeImage in Stable-Baselines3.
+        features = self.policy.extract_features(obs)
+        latent_pi = self.policy.mlp_extractor.forward_actor(features)
+        logits = self.policy.action_net(latent_pi)
+        logits = torch.where(action_mask, logits, torch.full_like(logits, -1e8)) # Same masking value as MaskableCategorical.
+        return torch.argmax(logits, dim=1), logits
+
+def infer_env(observation_space):
+    # Env type and constructor arguments of the env a saved model was trained on, from its observation space.
+    if is_image_space(observation_space):
+        return "cnn", {}
+    if len(observation_space.shape) == 1:
+        return "mlp", {"obs_mode": "features"}
+    return "mlp", {"board_size": observation_space.shape[0]}
+
+def load_actor(model_path):
+    # The model, the observation space of its env, the env type and kwargs, and whether the graph must transpose images.
+    # A loaded CNN model reports the channel-first space of VecTransposeImage, but the env returns channel-last images:
+    # exported graphs take the env observations, as the scripts and the runtime pass them.
+    model = MaskablePPO.load(model_path, device="cpu")
+    model.policy.eval()
+    env_type, env_kwargs = infer_env(model.observation_space)
+    env = get_env_class(env_type)(seed=0, **env_kwargs)
+    env_space = env.observation_space
+    env.close()
+    transpose_image = is_image_space(env_space) and env_space.shape != model.policy.observation_space.shape
+    return model, env_space, env_type, env_kwargs, transpose_image
+
+def save_actor(module, model, env_space, output_path, export_format="torchscript", extra_meta=None):
+    # Trace module on env observations and write it with the <file>.json sidecar read by PolicyRuntime.
+    example_obs = torch.as_tensor(np.stack([env_space.sample()] * 2))
+    example_mask = torch.ones((2, model.action_space.n), dtype=torch.bool)
+
+    with torch.no_grad():
+        if export_format == "onnx":
+            torch.onnx.export(
+                module, (example_obs, example_mask), output_path,
+                input_names=["obs", "action_mask"], output_names=["action", "logits"],
+                dynamic_axes={"obs": {0: "batch"}, "action_mask": {0: "batch"}, "action": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=13,
+            )
+        else:
+            traced = torch.jit.trace(module, (example_obs, example_mask))
+            traced = torch.jit.freeze(traced)
+            traced.save(output_path)
+
+    # Observation layout needed by the runtime to batch and cast inputs without Stable-Baselines3.
+    meta = {
+        "format": export_format,
+        "obs_shape": list(env_space.shape),
+        "obs_dtype": str(env_space.dtype),
+        "num_actions": int(model.action_space.n),
+        **(extra_meta or {}),
+    }
+    with open(output_path + ".json", "w") as meta_file:
+        json.dump(meta, meta_file, indent=4)
+
+def check_export(model, output_path, env_type, env_kwargs, num_states=256):
+    # Fraction of the states of real games where the exported file, run by PolicyRuntime one observation at a time
+    # like the test scripts do, picks the same action as model.predict.
+    from policy_runtime import PolicyRuntime
+
+    observations, masks = record_states(model.predict, env_type, [3 * 10 ** 6 + i for i in range(100)], env_kwargs, num_states)
+    runtime = PolicyRuntime(output_path)
+    expected, _ = model.predict(observations, action_masks=masks, deterministic=True)
+    actual = np.array([runtime.predict(obs, action_masks=mask, deterministic=True)[0] for obs, mask in zip(observations, masks)])
+    return float(np.mean(expected == actual))
+
+def export_policy(model_path, output_path, export_format="torchscript"):
+    model, env_space, env_type, env_kwargs, transpose_image = load_actor(model_path)
+    module = MaskedPolicy(model.policy, transpose_image).eval()
+    save_actor(module, model, env_space, output_path, export_format)
+    agreement = check_export(model, output_path, env_type, env_kwargs)
+    assert agreement == 1.0, f"Exported policy disagrees with model.predict on {1 - agreement:.1%} of real game states."
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a MaskablePPO snake policy to a standalone TorchScript or ONNX graph.")
+    parser.add_argument("model", help="Path of the MaskablePPO zip, e.g. trained_models_cnn/ppo_snake_final.zip")
+    parser.add_argument("--format", choices=["torchscript", "onnx"], default="torchscript")
+    parser.add_argument("--out", default=None, help="Output file (defaults to the model path with .pt or .onnx).")
+    args = parser.parse_args()
+
+    extension = ".onnx" if args.format == "onnx" else ".pt"
+    output_path = args.out or os.path.splitext(args.model)[0] + extension
+    export_policy(args.model, output_path, args.format)
+    print(f"Exported {args.model} to {output_path}")
+
+if __name__ == "__main__":
+    main()
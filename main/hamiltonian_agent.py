@@ -7,6 +7,8 @@ FRAME_DELAY = 0.01 # 0.01 fast, 0.05 slow
 ROUND_DELAY = 5
 
 BOARD_SIZE = 12
+SHORTCUTS = False # Cut across the cycle towards the food while the snake is short.
+SHORTCUT_MARGIN = 3 # Free cells kept between the head and the tail after a shortcut.
 
 def generate_hamiltonian_cycle(board_size):
     path = [(0, c) for c in range(board_size)]
@@ -39,30 +41,56 @@ def find_next_action(snake_head, next_position):
     else:
         return -1
 
+class HamiltonianAgent:
+    # Scripted agent: follows a Hamiltonian cycle, so it never dies and eventually fills the board.
+    # With shortcuts, it may jump ahead along the cycle towards the food. The jump stays inside the free part of the
+    # cycle between the head and the tail, so the body keeps lying between tail and head in cycle order.
+    def __init__(self, board_size, shortcuts=False):
+        self.board_size = board_size
+        self.cycle = generate_hamiltonian_cycle(board_size)
+        self.cycle_index = {cell: i for i, cell in enumerate(self.cycle)}
+        self.shortcuts = shortcuts
+
+    def act(self, game):
+        cycle_len = len(self.cycle)
+        snake_head = game.snake[0]
+        head_index = self.cycle_index[snake_head]
+        next_position = self.cycle[(head_index + 1) % cycle_len]
+
+        if self.shortcuts and len(game.snake) < cycle_len // 2 and self._body_in_cycle_order(game.snake):
+            food_distance = (self.cycle_index[game.food] - head_index) % cycle_len
+            tail_distance = (self.cycle_index[game.snake[-1]] - head_index) % cycle_len
+            best_distance = 1
+            row, col = snake_head
+            for neighbor in [(row - 1, col), (row, col - 1), (row, col + 1), (row + 1, col)]:
+                if neighbor not in self.cycle_index:
+                    continue
+                distance = (self.cycle_index[neighbor] - head_index) % cycle_len
+                if best_distance < distance <= food_distance and distance < tail_distance - SHORTCUT_MARGIN:
+                    best_distance, next_position = distance, neighbor
+
+        return find_next_action(snake_head, next_position)
+
+    def _body_in_cycle_order(self, snake):
+        # True when every body cell lies between the tail and the head going forward along the cycle.
+        cycle_len = len(self.cycle)
+        tail_index = self.cycle_index[snake[-1]]
+        head_distance = (self.cycle_index[snake[0]] - tail_index) % cycle_len
+        return all((self.cycle_index[cell] - tail_index) % cycle_len <= head_distance for cell in snake)
+
 def main():
     seed = random.randint(0, 1e9)
     print(f"Using seed = {seed} for testing.")
 
     env = SnakeEnv(silent_mode=False, seed=seed, board_size=BOARD_SIZE)
 
-    cycle = generate_hamiltonian_cycle(env.game.board_size)
-    cycle_len = len(cycle)
-    current_index = 0
+    agent = HamiltonianAgent(env.game.board_size, shortcuts=SHORTCUTS)
 
     num_step = 0
     done = False
 
     while not done:
-        action = env.action_space.sample()
-        snake_head = env.game.snake[0]
-        current_index = (current_index + 1) % cycle_len
-
-        while cycle[current_index] != snake_head:
-            current_index = (current_index + 1) % cycle_len
-
-        next_position = cycle[(current_index + 1) % cycle_len]
-        action = find_next_action(snake_head, next_position)
-
+        action = agent.act(env.game)
         _, _, done, _ = env.step(action)
         num_step += 1
         env.render()
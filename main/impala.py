@@ -0,0 +1,398 @@
+import io
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import subprocess
+import collections
+import socketserver
+
+import numpy as np
+
+from policy_server import _send_frame, _recv_frame, parse_address, ThreadingTCPServer
+
+# IMPALA-style actor-learner training (Espeholt et al., 2018). Actor processes run a few snake envs each with a local
+# copy of the policy and stream fixed-length trajectories over TCP to the learner. The learner trains on batches of
+# trajectories as they arrive and broadcasts its weights every few updates, so actors never wait for a gradient step
+# and the actors can run on other nodes. The lag between the behaviour policy of a trajectory and the learner policy
+# is corrected with V-trace, and trajectories that lag more than max_policy_lag updates are dropped.
+#
+# Protocol, all messages length-prefixed frames: on connect the learner sends the JSON config of the actor and a
+# weights message. Afterwards the actor sends one trajectory (an uncompressed .npz) per unroll, and the learner
+# replies with a weights message, whose body is empty while the actor already has the latest broadcast weights.
+VERSION_HEADER = struct.Struct("!I")
+
+def encode_weights(policy, version):
+    import torch
+    buffer = io.BytesIO()
+    torch.save(policy.state_dict(), buffer)
+    return VERSION_HEADER.pack(version) + buffer.getvalue()
+
+def decode_weights(message):
+    import torch
+    version, = VERSION_HEADER.unpack(message[:VERSION_HEADER.size])
+    if len(message) == VERSION_HEADER.size:
+        return version, None
+    return version, torch.load(io.BytesIO(message[VERSION_HEADER.size:]), map_location="cpu", weights_only=True)
+
+def encode_trajectory(trajectory):
+    buffer = io.BytesIO()
+    np.savez(buffer, **trajectory)
+    return buffer.getvalue()
+
+def decode_trajectory(message):
+    with np.load(io.BytesIO(message), allow_pickle=False) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+def vtrace(behaviour_log_probs, target_log_probs, rewards, dones, values, bootstrap_value, gamma, rho_clip=1.0, c_clip=1.0):
+    # V-trace targets vs and policy gradient advantages for [T, B] arrays, with values V(x_t) and V(x_T).
+    ratios = np.exp(target_log_probs - behaviour_log_probs)
+    rhos = np.minimum(ratios, rho_clip)
+    cs = np.minimum(ratios, c_clip)
+    discounts = gamma * (1.0 - dones)
+    next_values = np.concatenate([values[1:], bootstrap_value[None]], axis=0)
+    deltas = rhos * (rewards + discounts * next_values - values)
+
+    corrections = np.zeros_like(values)
+    correction = np.zeros_like(bootstrap_value)
+    for t in reversed(range(len(rewards))):
+        correction = deltas[t] + discounts[t] * cs[t] * correction
+        corrections[t] = correction
+    vs = values + corrections
+    next_vs = np.concatenate([vs[1:], bootstrap_value[None]], axis=0)
+    advantages = rhos * (rewards + discounts * next_vs - values)
+    return vs, advantages
+
+def make_env_kwargs(args):
+    cycle_detection = None if args.cycle_detection == "none" else args.cycle_detection
+    env_kwargs = {"cycle_detection": cycle_detection, "macro_steps": args.macro_steps}
+    if args.env == "mlp":
+        env_kwargs["obs_mode"] = args.obs_mode
+    return env_kwargs
+
+# Actor
+
+def run_actor(address, num_threads=1):
+    import torch
+    from stable_baselines3.common.vec_env import DummyVecEnv, VecTransposeImage
+
+    from env_worker import ActionMaskWrapper, EpisodeMonitor
+    from evaluation import get_env_class
+    from pretrain_bc import make_model
+
+    torch.set_num_threads(num_threads)
+    family, connect_address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(connect_address)
+    config = json.loads(_recv_frame(sock))
+    version, state_dict = decode_weights(_recv_frame(sock))
+
+    model, _ = make_model(config["env"], config["env_kwargs"], "cpu")
+    policy = model.policy
+    policy.load_state_dict(state_dict)
+    policy.set_training_mode(False)
+
+    SnakeEnv = get_env_class(config["env"])
+    def make_env(seed):
+        return lambda: EpisodeMonitor(ActionMaskWrapper(SnakeEnv(seed=seed, **config["env_kwargs"])))
+    env = DummyVecEnv([make_env(seed) for seed in config["seeds"]])
+    if config["env"] == "cnn":
+        env = VecTransposeImage(env) # Channels first, as MaskablePPO wraps image envs.
+
+    unroll_length = config["unroll_length"]
+    obs = env.reset()
+    masks = np.stack(env.env_method("action_masks")).reshape(env.num_envs, -1)
+    try:
+        while True:
+            trajectory = collections.defaultdict(list)
+            episode_rewards, episode_lengths = [], []
+            for _ in range(unroll_length):
+                with torch.no_grad():
+                    obs_tensor = torch.as_tensor(obs)
+                    actions, _, log_probs = policy(obs_tensor, action_masks=masks)
+                actions = actions.numpy()
+                trajectory["obs"].append(obs)
+                trajectory["masks"].append(masks)
+                trajectory["actions"].append(actions)
+                trajectory["log_probs"].append(log_probs.numpy())
+                obs, rewards, dones, infos = env.step(actions)
+                masks = np.stack(env.env_method("action_masks")).reshape(env.num_envs, -1)
+                trajectory["rewards"].append(rewards)
+                trajectory["dones"].append(dones)
+                for info in infos:
+                    if "episode" in info:
+                        episode_rewards.append(info["episode"]["r"])
+                        episode_lengths.append(info["episode"]["l"])
+            trajectory["obs"].append(obs) # Bootstrap observation.
+            trajectory["masks"].append(masks)
+            message = {name: np.stack(values) for name, values in trajectory.items()}
+            message.update({
+                "version": np.array(version),
+                "episode_rewards": np.array(episode_rewards, dtype=np.float32),
+                "episode_lengths": np.array(episode_lengths, dtype=np.int64),
+            })
+            _send_frame(sock, encode_trajectory(message))
+
+            new_version, state_dict = decode_weights(_recv_frame(sock))
+            if state_dict is not None:
+                policy.load_state_dict(state_dict)
+                version = new_version
+    except ConnectionError:
+        pass # The learner finished.
+    finally:
+        sock.close()
+        env.close()
+
+# Learner
+
+class _ActorHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        learner = self.server.learner
+        if self.request.family == socket.AF_INET:
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _send_frame(self.request, json.dumps(learner.actor_config()).encode())
+        version, weights = learner.latest_weights()
+        _send_frame(self.request, weights)
+        with learner.lock:
+            learner.num_connected += 1
+        try:
+            while not learner.stopped.is_set():
+                trajectory = decode_trajectory(_recv_frame(self.request))
+                learner.put(trajectory) # Blocks while the learner is behind: backpressure on the actors.
+                latest_version, weights = learner.latest_weights()
+                if latest_version > version:
+                    version = latest_version
+                    _send_frame(self.request, weights)
+                else:
+                    _send_frame(self.request, VERSION_HEADER.pack(version))
+        except ConnectionError:
+            pass
+        finally:
+            with learner.lock:
+                learner.num_connected -= 1
+
+class Learner:
+    def __init__(self, model, args):
+        self.model = model
+        self.args = args
+        self.trajectories = queue.Queue(maxsize=args.queue_size)
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.num_actors = 0 # Actors that ever connected.
+        self.num_connected = 0
+        self.local_actors = [] # Actor processes started by run_learner.
+        self.version = 0
+        self.weights = (0, encode_weights(model.policy, 0))
+
+    def actor_config(self):
+        with self.lock:
+            actor_id = self.num_actors
+            self.num_actors += 1
+        args = self.args
+        seeds = [args.seed * 10 ** 6 + actor_id * 1000 + i for i in range(args.envs_per_actor)]
+        return {"env": args.env, "env_kwargs": make_env_kwargs(args), "seeds": seeds, "unroll_length": args.unroll_length}
+
+    def actors_alive(self):
+        # False once every local actor process has exited and no actor is connected. Until the first actor connects,
+        # only the local processes count, so a learner without local actors waits for remote ones.
+        with self.lock:
+            if self.num_connected > 0:
+                return True
+            any_connected = self.num_actors > 0
+        running = any(actor.poll() is None for actor in self.local_actors)
+        return running or not (any_connected or self.local_actors)
+
+    def latest_weights(self):
+        with self.lock:
+            return self.weights
+
+    def put(self, trajectory):
+        while not self.stopped.is_set():
+            try:
+                self.trajectories.put(trajectory, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        raise ConnectionError("Learner stopped.")
+
+    def train_step(self, batch):
+        import torch
+
+        args = self.args
+        policy = self.model.policy
+        stacked = {name: np.concatenate([t[name] for t in batch], axis=1) for name in ["obs", "masks", "actions", "log_probs", "rewards", "dones"]}
+        num_steps, num_envs = stacked["actions"].shape
+        obs = torch.as_tensor(stacked["obs"][:-1].reshape((num_steps * num_envs,) + stacked["obs"].shape[2:]))
+        masks = stacked["masks"][:-1].reshape(num_steps * num_envs, -1)
+        actions = torch.as_tensor(stacked["actions"].reshape(-1))
+
+        policy.set_training_mode(True)
+        values, log_probs, entropy = policy.evaluate_actions(obs, actions, action_masks=masks)
+        with torch.no_grad():
+            bootstrap_value = policy.predict_values(torch.as_tensor(stacked["obs"][-1])).numpy().reshape(num_envs)
+        values = values.reshape(num_steps, num_envs)
+        log_probs = log_probs.reshape(num_steps, num_envs)
+
+        vs, advantages = vtrace(
+            stacked["log_probs"], log_probs.detach().numpy(), stacked["rewards"], stacked["dones"].astype(np.float32),
+            values.detach().numpy(), bootstrap_value, args.gamma, args.rho_clip, args.c_clip,
+        )
+        policy_loss = -(torch.as_tensor(advantages, dtype=torch.float32) * log_probs).mean()
+        value_loss = 0.5 * ((torch.as_tensor(vs, dtype=torch.float32) - values) ** 2).mean()
+        entropy_loss = -entropy.mean()
+        loss = policy_loss + args.vf_coef * value_loss + args.ent_coef * entropy_loss
+
+        policy.optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(policy.parameters(), args.max_grad_norm)
+        policy.optimizer.step()
+        return num_steps * num_envs, {"policy_loss": policy_loss.item(), "value_loss": value_loss.item(), "entropy": -entropy_loss.item()}
+
+    def run(self, save_dir):
+        args = self.args
+        for group in self.model.policy.optimizer.param_groups:
+            group["lr"] = args.learning_rate
+
+        num_timesteps, num_dropped, num_updates = 0, 0, 0
+        next_checkpoint = args.checkpoint_interval
+        episode_rewards = collections.deque(maxlen=100)
+        lags = collections.deque(maxlen=1000)
+        start_time = last_report = time.perf_counter()
+        while num_timesteps < args.total_timesteps:
+            batch = []
+            while len(batch) < args.batch_trajectories:
+                try:
+                    trajectory = self.trajectories.get(timeout=1.0)
+                except queue.Empty:
+                    if self.stopped.is_set() or not self.actors_alive():
+                        break
+                    continue
+                episode_rewards.extend(trajectory["episode_rewards"].tolist())
+                lag = self.version - int(trajectory["version"])
+                if lag > args.max_policy_lag:
+                    num_dropped += 1 # Too stale for V-trace to correct well.
+                    continue
+                lags.append(lag)
+                batch.append(trajectory)
+            if len(batch) < args.batch_trajectories:
+                print("Every actor has exited, stopping early.", flush=True)
+                break
+
+            steps, losses = self.train_step(batch)
+            num_timesteps += steps
+            num_updates += 1
+            self.version += 1
+            if num_updates % args.broadcast_interval == 0:
+                weights = (self.version, encode_weights(self.model.policy, self.version))
+                with self.lock:
+                    self.weights = weights
+
+            now = time.perf_counter()
+            if now - last_report >= args.report_interval:
+                last_report = now
+                mean_reward = np.mean(episode_rewards) if episode_rewards else float("nan")
+                print(
+                    f"steps: {num_timesteps}, updates: {num_updates}, fps: {num_timesteps / (now - start_time):.0f}, "
+                    f"mean episode reward: {mean_reward:.2f}, policy lag mean/max: {np.mean(lags):.1f}/{max(lags)}, "
+                    f"dropped: {num_dropped}, policy loss: {losses['policy_loss']:.4f}, "
+                    f"value loss: {losses['value_loss']:.4f}, entropy: {losses['entropy']:.3f}",
+                    flush=True,
+                )
+            if num_timesteps >= next_checkpoint:
+                next_checkpoint += args.checkpoint_interval
+                self.save(os.path.join(save_dir, f"ppo_snake_{num_timesteps}_steps.zip"), num_timesteps)
+        self.stopped.set()
+        self.save(os.path.join(save_dir, "ppo_snake_final.zip"), num_timesteps)
+        print(f"Trained on {num_timesteps} steps in {num_updates} updates, {time.perf_counter() - start_time:.1f}s, "
+              f"{num_dropped} stale trajectories dropped.", flush=True)
+
+    def save(self, path, num_timesteps):
+        # A regular MaskablePPO zip, loadable by the test scripts and evaluation tools.
+        self.model.num_timesteps = num_timesteps
+        self.model.save(path)
+
+def run_learner(args):
+    import torch
+    from pretrain_bc import make_model
+
+    torch.set_num_threads(args.learner_threads)
+    torch.manual_seed(args.seed)
+    model, _ = make_model(args.env, make_env_kwargs(args), "cpu")
+    model.gamma = args.gamma
+    if args.init_model:
+        model.set_parameters(args.init_model, exact_match=True)
+    learner = Learner(model, args)
+
+    family, bind_address = parse_address(args.address)
+    assert family == socket.AF_INET, "The learner listens on host:port."
+    server = ThreadingTCPServer(bind_address, _ActorHandler)
+    server.learner = learner
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Learner listening on {args.address}", flush=True)
+
+    # Local actors; actors on other nodes connect with `impala.py actor --address <learner host:port>`.
+    actors = [subprocess.Popen([sys.executable, __file__, "actor", "--address", args.address]) for _ in range(args.local_actors)]
+    learner.local_actors = actors
+    save_dir = args.save_dir or f"trained_models_{args.env}_impala"
+    os.makedirs(save_dir, exist_ok=True)
+    try:
+        learner.run(save_dir)
+    finally:
+        learner.stopped.set()
+        server.shutdown()
+        server.server_close()
+        for actor in actors:
+            try:
+                actor.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                actor.terminate()
+
+def main():
+    parser = argparse.ArgumentParser(description="IMPALA-style actor-learner training over TCP.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    learner_parser = subparsers.add_parser("learner")
+    learner_parser.add_argument("--env", choices=["cnn", "mlp"], default="mlp")
+    learner_parser.add_argument("--obs-mode", choices=["board", "features"], default="board", help="MLP observation mode.")
+    learner_parser.add_argument("--address", default="127.0.0.1:29500", help="host:port to listen on, use 0.0.0.0 for remote actors.")
+    learner_parser.add_argument("--local-actors", type=int, default=4, help="Actor processes started on this node.")
+    learner_parser.add_argument("--envs-per-actor", type=int, default=8)
+    learner_parser.add_argument("--unroll-length", type=int, default=64)
+    learner_parser.add_argument("--batch-trajectories", type=int, default=4, help="Trajectories per update.")
+    learner_parser.add_argument("--queue-size", type=int, default=16, help="Trajectories buffered before actors block.")
+    learner_parser.add_argument("--max-policy-lag", type=int, default=8, help="Drop trajectories more updates behind than this.")
+    learner_parser.add_argument("--broadcast-interval", type=int, default=1, help="Updates between weight broadcasts.")
+    learner_parser.add_argument("--total-timesteps", type=int, default=10 ** 7)
+    learner_parser.add_argument("--learning-rate", type=float, default=2.5e-4)
+    learner_parser.add_argument("--gamma", type=float, default=0.94)
+    learner_parser.add_argument("--vf-coef", type=float, default=0.5)
+    learner_parser.add_argument("--ent-coef", type=float, default=0.01)
+    learner_parser.add_argument("--max-grad-norm", type=float, default=0.5)
+    learner_parser.add_argument("--rho-clip", type=float, default=1.0)
+    learner_parser.add_argument("--c-clip", type=float, default=1.0)
+    learner_parser.add_argument("--cycle-detection", choices=["end", "penalize", "none"], default="end")
+    learner_parser.add_argument("--macro-steps", type=int, default=1)
+    learner_parser.add_argument("--init-model", default=None, help="Warm start, e.g. from pretrain_bc.py.")
+    learner_parser.add_argument("--learner-threads", type=int, default=4)
+    learner_parser.add_argument("--checkpoint-interval", type=int, default=500000)
+    learner_parser.add_argument("--report-interval", type=float, default=10.0)
+    learner_parser.add_argument("--save-dir", default=None)
+    learner_parser.add_argument("--seed", type=int, default=0)
+
+    actor_parser = subparsers.add_parser("actor")
+    actor_parser.add_argument("--address", default="127.0.0.1:29500", help="host:port of the learner.")
+    actor_parser.add_argument("--threads", type=int, default=1)
+
+    args = parser.parse_args()
+    if args.command == "actor":
+        run_actor(args.address, args.threads)
+    else:
+        run_learner(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# Macro actions: one policy decision moves the snake in the chosen direction for up to macro_steps game steps, and
+# stops early at the next decision point, where another direction may be worth choosing. Used by both SnakeEnvs.
+
+def at_decision_point(game):
+    # The food is in line with the head, or a wall or body cell is next to the head (the neck does not count).
+    head_row, head_col = game.snake[0]
+    food_row, food_col = game.food
+    if head_row == food_row or head_col == food_col:
+        return True
+    neck = game.snake[1] if len(game.snake) > 1 else None
+    for cell in [(head_row - 1, head_col), (head_row, head_col - 1), (head_row, head_col + 1), (head_row + 1, head_col)]:
+        if cell == neck:
+            continue
+        row, col = cell
+        if row < 0 or row >= game.board_size or col < 0 or col >= game.board_size or cell in game.snake:
+            return True
+    return False
+
+def macro_step(env, action, macro_steps, gamma=1.0):
+    # Rewards of the game steps are summed, discounted by gamma per step. The observation is only generated once,
+    # after the last step. info["macro_steps"] is the number of game steps taken.
+    total_reward = 0.0
+    discount = 1.0
+    for num_steps in range(1, macro_steps + 1):
+        _, reward, done, info = env.primitive_step(action, observe=False)
+        total_reward += discount * reward
+        discount *= gamma
+        if done or at_decision_point(env.game):
+            break
+    info["macro_steps"] = num_steps
+    return env._generate_observation(), total_reward, done, info
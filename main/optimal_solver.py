@@ -0,0 +1,253 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+from collections import deque
+
+# Exact optimal play of SnakeGame on tiny boards, as a ground-truth reference for the agents.
+#
+# Between two foods the game is deterministic, and the snake grows by one cell at every food, so the problem is an
+# acyclic MDP over "post-eat" bodies: the snake right after eating, before the next food is placed uniformly on a
+# free cell. For every food cell, a breadth-first search over bodies of the current length finds every body the snake
+# can have when it eats that food, with the fewest steps to get there; the best of them is then solved recursively.
+#   W(body)       = mean over free cells f of V(body, f), or a win once the body fills the board
+#   V(body, f)    = best over eat outcomes (k steps, new body) of k + W(new body), or a loss when f is unreachable
+# Outcomes are compared lexicographically: highest win probability, then highest expected final length, then fewest
+# expected steps. The step limit of the envs is not modelled: optimal play never circles.
+#
+# W is memoized on a canonical key: the body is mapped by each of the 8 symmetries of the square, encoded as its
+# length, head cell and one 2-bit move per segment in a single integer, and the smallest encoding is kept. The table
+# lives in a dict and spills to an SQLite file once it holds more than max_memory_entries results.
+
+MOVES = [(-1, 0), (0, -1), (0, 1), (1, 0)] # 0: UP, 1: LEFT, 2: RIGHT, 3: DOWN, as in SnakeGame.step.
+
+def cell_symmetries(board_size):
+    # Permutation of the flat cell indices for each of the 8 symmetries of the square board.
+    last = board_size - 1
+    maps = [
+        lambda r, c: (r, c), lambda r, c: (c, last - r), lambda r, c: (last - r, last - c), lambda r, c: (last - c, r),
+        lambda r, c: (r, last - c), lambda r, c: (last - r, c), lambda r, c: (c, r), lambda r, c: (last - c, last - r),
+    ]
+    permutations = []
+    for transform in maps:
+        permutation = []
+        for cell in range(board_size ** 2):
+            row, col = transform(*divmod(cell, board_size))
+            permutation.append(row * board_size + col)
+        permutations.append(permutation)
+    return permutations
+
+class SpillTable:
+    # Memo table that keeps up to max_memory_entries results in a dict and moves them to SQLite beyond that.
+    # An existing file is reopened, so an interrupted solve resumes from the results it had spilled.
+    def __init__(self, path=None, max_memory_entries=2000000):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.memory = {}
+        self.db = None
+        self.disk_entries = 0
+        self.temporary = path is None
+        if path is not None and os.path.exists(path):
+            self._connect()
+            self.disk_entries = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __len__(self):
+        return len(self.memory) + self.disk_entries
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.db is not None:
+            row = self.db.execute("SELECT win, length, steps FROM results WHERE key = ?", (self._blob(key),)).fetchone()
+            value = row
+        return value
+
+    def put(self, key, value):
+        self.memory[key] = value
+        if len(self.memory) > self.max_memory_entries:
+            self.spill()
+
+    def _connect(self):
+        if self.path is None:
+            handle, self.path = tempfile.mkstemp(suffix=".sqlite")
+            os.close(handle)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, win REAL, length REAL, steps REAL)")
+
+    def spill(self):
+        if self.db is None:
+            self._connect()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            ((self._blob(key), *value) for key, value in self.memory.items()),
+        )
+        self.db.commit()
+        self.disk_entries += len(self.memory)
+        self.memory.clear()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            if self.temporary:
+                os.remove(self.path)
+
+    @staticmethod
+    def _blob(key):
+        return key.to_bytes((key.bit_length() + 7) // 8, "little")
+
+class OptimalSolver:
+    def __init__(self, board_size, table=None):
+        self.board_size = board_size
+        self.grid_size = board_size ** 2
+        self.table = table if table is not None else SpillTable()
+        self.symmetries = cell_symmetries(board_size)
+        self.cell_bits = max(self.grid_size - 1, 1).bit_length()
+        self.neighbors = []
+        for cell in range(self.grid_size):
+            row, col = divmod(cell, board_size)
+            self.neighbors.append([
+                (row + dr) * board_size + col + dc for dr, dc in MOVES
+                if 0 <= row + dr < board_size and 0 <= col + dc < board_size
+            ])
+        # (from cell, to cell) -> 2-bit move code, for the compact encoding.
+        self.move_codes = {}
+        for cell in range(self.grid_size):
+            row, col = divmod(cell, board_size)
+            for code, (dr, dc) in enumerate(MOVES):
+                if 0 <= row + dr < board_size and 0 <= col + dc < board_size:
+                    self.move_codes[(cell, (row + dr) * board_size + col + dc)] = code
+        self.searches = 0
+
+    def initial_body(self):
+        # SnakeGame.reset: three cells in the middle column, head first, moving down.
+        middle = self.board_size // 2
+        return tuple((middle + i) * self.board_size + middle for i in range(1, -2, -1))
+
+    def encode(self, body):
+        key = body[0]
+        for previous, cell in zip(body, body[1:]):
+            key = (key << 2) | self.move_codes[(previous, cell)]
+        return (key << self.cell_bits + 1) | len(body) # The length keeps bodies of different sizes apart.
+
+    def canonical_key(self, body):
+        return min(self.encode(tuple(permutation[cell] for cell in body)) for permutation in self.symmetries)
+
+    def eat_outcomes(self, body, food):
+        # {body after eating food: fewest steps}, by breadth-first search over the bodies of the current length.
+        self.searches += 1
+        outcomes = {}
+        visited = {body}
+        frontier = deque([(body, 0)])
+        while frontier:
+            current, steps = frontier.popleft()
+            moving = current[:-1] # The tail leaves its cell unless the food is eaten.
+            for head in self.neighbors[current[0]]:
+                if head == food:
+                    if head not in current:
+                        eaten = (head,) + current
+                        if eaten not in outcomes:
+                            outcomes[eaten] = steps + 1
+                elif head not in moving:
+                    moved = (head,) + moving
+                    if moved not in visited:
+                        visited.add(moved)
+                        frontier.append((moved, steps + 1))
+        return outcomes
+
+    def solve(self, body):
+        # (win probability, expected final length, expected steps) of optimal play from a post-eat body.
+        if len(body) == self.grid_size:
+            return (1.0, float(self.grid_size), 0.0)
+        key = self.canonical_key(body)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+
+        occupied = set(body)
+        free_cells = [cell for cell in range(self.grid_size) if cell not in occupied]
+        win = length = steps = 0.0
+        for food in free_cells:
+            best = (0.0, float(len(body)), 0.0) # Loss: the food can never be reached.
+            best_rank = (best[0], best[1], -best[2])
+            for eaten, eat_steps in self.eat_outcomes(body, food).items():
+                outcome = self.solve(eaten)
+                candidate = (outcome[0], outcome[1], outcome[2] + eat_steps)
+                rank = (round(candidate[0], 12), round(candidate[1], 9), -candidate[2])
+                if rank > best_rank:
+                    best, best_rank = candidate, rank
+            win += best[0]
+            length += best[1]
+            steps += best[2]
+        value = (win / len(free_cells), length / len(free_cells), steps / len(free_cells))
+        self.table.put(key, value)
+        return value
+
+def solve_board(board_size, table_path=None, max_memory_entries=2000000):
+    table = SpillTable(table_path, max_memory_entries)
+    solver = OptimalSolver(board_size, table)
+    start_time = time.perf_counter()
+    win, length, steps = solver.solve(solver.initial_body())
+    result = {
+        "board_size": board_size,
+        "win_rate": win,
+        "mean_score": (length - 3) * 10, # 10 points per food, as SnakeGame.score.
+        "mean_length": length,
+        "mean_steps": steps,
+        "solved_states": len(table),
+        "searches": solver.searches,
+        "seconds": time.perf_counter() - start_time,
+    }
+    table.close()
+    return result
+
+def benchmark_model(model_path, env_type, board_size, num_episodes, env_kwargs=None):
+    # The agent's results on the same board size, to compare with the reference row.
+    from evaluation import load_predict, evaluate_seeds, summarize
+
+    seeds = [10 ** 6 + i for i in range(num_episodes)]
+    results = evaluate_seeds(load_predict(model_path), env_type, seeds, board_size=board_size, limit_step=True, env_kwargs=env_kwargs)
+    summary = summarize(results)
+    wins = [r["steps"] for r in results if r["win"]]
+    summary["mean_steps_to_win"] = sum(wins) / len(wins) if wins else float("nan")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact optimal play of Snake on tiny boards: reference win rate, score and steps.")
+    parser.add_argument("--board-sizes", type=int, nargs="+", default=[4], help="5 and up take hours; use --table-dir to resume.")
+    parser.add_argument("--out", default="optimal_reference.csv", help="Reference table, one row per board size (also written as .json).")
+    parser.add_argument("--table-dir", default=None, help="Directory of the SQLite spill files (default: temporary files).")
+    parser.add_argument("--max-memory-entries", type=int, default=2000000, help="Memoized results kept in RAM before spilling to disk.")
+    parser.add_argument("--model", default=None, help="Also evaluate this model (zip, .pt or .onnx) on every board size.")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default="cnn")
+    parser.add_argument("--obs-mode", choices=["board", "features"], default="board", help="MLP observation mode.")
+    parser.add_argument("--episodes", type=int, default=100)
+    args = parser.parse_args()
+
+    rows = []
+    for board_size in args.board_sizes:
+        table_path = os.path.join(args.table_dir, f"optimal_{board_size}x{board_size}.sqlite") if args.table_dir else None
+        rows.append(solve_board(board_size, table_path, args.max_memory_entries))
+        row = rows[-1]
+        print(f"{board_size}x{board_size}: win rate {row['win_rate']:.4f}, mean score {row['mean_score']:.2f}, "
+              f"mean steps {row['mean_steps']:.2f} ({row['solved_states']} canonical states, {row['seconds']:.1f}s)", flush=True)
+
+    with open(args.out, "w", newline="") as table_file:
+        writer = csv.DictWriter(table_file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.splitext(args.out)[0] + ".json", "w") as json_file:
+        json.dump(rows, json_file, indent=2)
+    print(f"Reference table: {args.out}")
+
+    if args.model:
+        env_kwargs = {"obs_mode": args.obs_mode} if args.env == "mlp" else {}
+        print(f"{'board':>5} {'win_rate':>9} {'optimal':>8} {'score':>7} {'optimal':>8} {'steps_to_win':>13} {'optimal':>8}")
+        for row in rows:
+            summary = benchmark_model(args.model, args.env, row["board_size"], args.episodes, env_kwargs)
+            print(f"{row['board_size']:>5} {summary['win_rate']:>9.3f} {row['win_rate']:>8.3f} {summary['mean_score']:>7.1f} "
+                  f"{row['mean_score']:>8.1f} {summary['mean_steps_to_win']:>13.1f} {row['mean_steps']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import json
+
+import numpy as np
+
+# Lean inference runtime for policies exported by export_policy.py.
+# Only needs NumPy plus either torch (TorchScript) or onnxruntime (ONNX), no Stable-Baselines3.
+class PolicyRuntime:
+    def __init__(self, path, num_threads=1, seed=None):
+        self.rng = np.random.default_rng(seed)
+        with open(path + ".json") as meta_file:
+            meta = json.load(meta_file)
+        self.obs_shape = tuple(meta["obs_shape"])
+        self.obs_dtype = np.dtype(meta["obs_dtype"])
+        self.num_actions = meta["num_actions"]
+
+        if meta["format"] == "onnx":
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = num_threads
+            self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self._run = self._run_onnx
+        else:
+            import torch
+            torch.set_num_threads(num_threads)
+            self.torch = torch
+            self.module = torch.jit.load(path, map_location="cpu")
+            self._run = self._run_torchscript
+
+    def _run_onnx(self, obs, action_masks):
+        action, logits = self.session.run(None, {"obs": obs, "action_mask": action_masks})
+        return action, logits
+
+    def _run_torchscript(self, obs, action_masks):
+        with self.torch.no_grad():
+            action, logits = self.module(self.torch.from_numpy(obs), self.torch.from_numpy(action_masks))
+        return action.numpy(), logits.numpy()
+
+    # Same call signature as MaskablePPO.predict, so the test scripts can use either.
+    def predict(self, obs, action_masks=None, deterministic=False):
+        obs = np.asarray(obs, dtype=self.obs_dtype)
+        single = obs.shape == self.obs_shape
+        if single:
+            obs = obs[None]
+        if action_masks is None:
+            action_masks = np.ones((len(obs), self.num_actions), dtype=bool)
+        action_masks = np.asarray(action_masks, dtype=bool).reshape(len(obs), self.num_actions)
+
+        action, logits = self._run(np.ascontiguousarray(obs), action_masks)
+        if not deterministic: # Sample from the masked action distribution.
+            probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+            action = (probs.cumsum(axis=1) > self.rng.random((len(probs), 1))).argmax(axis=1)
+        if single:
+            action = action[0]
+        return action, None
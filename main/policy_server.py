@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import collections
+import socketserver
+import multiprocessing
+
+import numpy as np
+
+# Wire protocol: on connect the server sends one frame with the JSON model spec. Afterwards every
+# request is a (type, payload_len) header plus payload and every reply is a length-prefixed frame.
+REQUEST_HEADER = struct.Struct("!BI")
+FRAME_HEADER = struct.Struct("!I")
+PREDICT_REQUEST = 0 # payload: action mask (one byte per action) followed by the raw observation bytes.
+                    # reply: the action as one byte, or a longer UTF-8 error message.
+STATS_REQUEST = 1 # payload: empty, reply: JSON metrics.
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        num_bytes = sock.recv_into(view[received:])
+        if num_bytes == 0:
+            raise ConnectionError("Connection closed.")
+        received += num_bytes
+    return bytes(buffer)
+
+def _send_frame(sock, payload):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+def _recv_frame(sock):
+    size, = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    return _recv_exact(sock, size)
+
+def load_predictor(model_path, deterministic=True):
+    # Returns (spec, predict) where predict maps a batch of observations and masks to a batch of actions.
+    # The spec describes the env observation (channel-last images for the CNN), which clients send as is.
+    if model_path.endswith((".pt", ".onnx")):
+        from policy_runtime import PolicyRuntime
+        model = PolicyRuntime(model_path)
+        spec = {"obs_shape": list(model.obs_shape), "obs_dtype": str(model.obs_dtype), "num_actions": model.num_actions}
+    else:
+        import torch
+        from export_policy import load_actor
+        torch.set_num_threads(1)
+        model, env_space, _, _, _ = load_actor(model_path) # MaskablePPO.predict transposes the images itself.
+        spec = {
+            "obs_shape": list(env_space.shape),
+            "obs_dtype": str(env_space.dtype),
+            "num_actions": int(model.action_space.n),
+        }
+
+    def predict(obs, action_masks):
+        actions, _ = model.predict(obs, action_masks=action_masks, deterministic=deterministic)
+        return actions
+
+    return spec, predict
+
+class _PendingRequest:
+    __slots__ = ("obs", "mask", "start_time", "action", "error", "done")
+
+    def __init__(self, obs, mask):
+        self.obs = obs
+        self.mask = mask
+        self.start_time = time.perf_counter()
+        self.action = None
+        self.error = None
+        self.done = threading.Event()
+
+class ServerMetrics:
+    def __init__(self, window=100000):
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.num_requests = 0
+        self.num_batches = 0
+        self.latencies = collections.deque(maxlen=window) # Seconds from request arrival to reply.
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.last_report = (self.start_time, 0)
+
+    def record_batch(self, latencies):
+        with self.lock:
+            self.num_requests += len(latencies)
+            self.num_batches += 1
+            self.latencies.extend(latencies)
+            self.batch_sizes.append(len(latencies))
+
+    def snapshot(self):
+        with self.lock:
+            now = time.perf_counter()
+            latencies = np.array(self.latencies) * 1000
+            last_time, last_requests = self.last_report
+            self.last_report = (now, self.num_requests)
+            return {
+                "requests": self.num_requests,
+                "batches": self.num_batches,
+                "throughput_total": self.num_requests / (now - self.start_time),
+                "throughput_recent": (self.num_requests - last_requests) / max(now - last_time, 1e-9),
+                "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+                "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                "latency_ms_p95": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+                "latency_ms_p99": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            }
+
+class MicroBatcher:
+    # Collects concurrent requests into batches of at most max_batch, waiting at most max_wait seconds after the first one.
+    def __init__(self, predict, max_batch=64, max_wait=0.002):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.metrics = ServerMetrics()
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+
+    def submit(self, obs, mask):
+        request = _PendingRequest(obs, mask)
+        self.queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.action
+
+    def _batch_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                actions = self.predict(np.stack([r.obs for r in batch]), np.stack([r.mask for r in batch]))
+            except Exception as error:
+                # Fail this batch only: its clients get an error reply and the loop keeps serving.
+                for request in batch:
+                    request.error = f"{type(error).__name__}: {error}"
+                    request.done.set()
+                continue
+            end_time = time.perf_counter()
+            for request, action in zip(batch, actions):
+                request.action = int(action)
+                request.done.set()
+            self.metrics.record_batch([end_time - r.start_time for r in batch])
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        spec = server.spec
+        obs_dtype = np.dtype(spec["obs_dtype"])
+        obs_shape = tuple(spec["obs_shape"])
+        num_actions = spec["num_actions"]
+        payload_size = num_actions + int(np.prod(obs_shape)) * obs_dtype.itemsize
+
+        if self.request.family == socket.AF_INET:
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Replies are tiny, don't delay them.
+        _send_frame(self.request, json.dumps(spec).encode())
+        try:
+            while True:
+                request_type, size = REQUEST_HEADER.unpack(_recv_exact(self.request, REQUEST_HEADER.size))
+                payload = _recv_exact(self.request, size)
+                if request_type == STATS_REQUEST:
+                    _send_frame(self.request, json.dumps(server.batcher.metrics.snapshot()).encode())
+                    continue
+                # Malformed requests are rejected here, so they never fail the micro-batch of other clients.
+                if len(payload) != payload_size:
+                    _send_frame(self.request, f"error: payload of {len(payload)} bytes, expected {payload_size}".encode())
+                    continue
+                mask = np.frombuffer(payload[:num_actions], dtype=np.uint8).astype(bool)
+                if not mask.any():
+                    _send_frame(self.request, b"error: action mask allows no action")
+                    continue
+                obs = np.frombuffer(payload[num_actions:], dtype=obs_dtype).reshape(obs_shape)
+                try:
+                    action = server.batcher.submit(obs, mask)
+                except RuntimeError as error:
+                    _send_frame(self.request, f"error: {error}".encode())
+                    continue
+                _send_frame(self.request, bytes([action]))
+        except ConnectionError:
+            pass
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def parse_address(address):
+    # "host:port" for TCP, anything else is a Unix socket path.
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+def serve(model_path, address, max_batch=64, max_wait=0.002, deterministic=True, report_interval=10.0):
+    spec, predict = load_predictor(model_path, deterministic)
+    family, bind_address = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(bind_address):
+            os.remove(bind_address)
+        server = ThreadingUnixServer(bind_address, _RequestHandler)
+    else:
+        server = ThreadingTCPServer(bind_address, _RequestHandler)
+    server.spec = spec
+    server.batcher = MicroBatcher(predict, max_batch, max_wait)
+
+    def report():
+        while True:
+            time.sleep(report_interval)
+            stats = server.batcher.metrics.snapshot()
+            print(
+                f"requests: {stats['requests']}, throughput: {stats['throughput_recent']:.0f} req/s, "
+                f"mean batch: {stats['mean_batch_size']:.1f}, latency p50/p95/p99: "
+                f"{stats['latency_ms_p50']:.2f}/{stats['latency_ms_p95']:.2f}/{stats['latency_ms_p99']:.2f} ms",
+                flush=True,
+            )
+    if report_interval > 0:
+        threading.Thread(target=report, daemon=True).start()
+
+    print(f"Serving {model_path} on {address} (max_batch={max_batch}, max_wait={max_wait * 1000:.1f}ms)", flush=True)
+    server.serve_forever()
+
+class PolicyClient:
+    # Same predict interface as MaskablePPO for a single observation, answered by a policy server.
+    def __init__(self, address, timeout=None):
+        family, connect_address = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.sock.connect(connect_address)
+        spec = json.loads(_recv_frame(self.sock))
+        self.obs_shape = tuple(spec["obs_shape"])
+        self.obs_dtype = np.dtype(spec["obs_dtype"])
+        self.num_actions = spec["num_actions"]
+
+    def predict(self, obs, action_masks=None, deterministic=True):
+        if action_masks is None:
+            action_masks = np.ones(self.num_actions, dtype=bool)
+        mask_bytes = np.asarray(action_masks, dtype=np.uint8).reshape(self.num_actions).tobytes()
+        payload = mask_bytes + np.ascontiguousarray(obs, dtype=self.obs_dtype).tobytes()
+        self.sock.sendall(REQUEST_HEADER.pack(PREDICT_REQUEST, len(payload)) + payload)
+        reply = _recv_frame(self.sock)
+        if len(reply) != 1:
+            raise RuntimeError(f"Policy server {reply.decode()}")
+        return reply[0], None
+
+    def stats(self):
+        self.sock.sendall(REQUEST_HEADER.pack(STATS_REQUEST, 0))
+        return json.loads(_recv_frame(self.sock))
+
+    def close(self):
+        self.sock.close()
+
+def _bench_client(args):
+    address, num_requests, seed = args
+    client = PolicyClient(address)
+    rng = np.random.default_rng(seed)
+    # Random observations in the model's layout, a real client would send its env observation here.
+    observations = rng.integers(0, 255, (num_requests,) + client.obs_shape).astype(client.obs_dtype)
+    latencies = []
+    for obs in observations:
+        start_time = time.perf_counter()
+        client.predict(obs)
+        latencies.append(time.perf_counter() - start_time)
+    client.close()
+    return latencies
+
+def bench(address, num_clients=16, num_requests=500):
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(num_clients) as pool:
+        results = pool.map(_bench_client, [(address, num_requests, seed) for seed in range(num_clients)])
+    elapsed = time.perf_counter() - start_time
+
+    latencies = np.concatenate(results) * 1000
+    print(f"{num_clients} clients x {num_requests} requests in {elapsed:.2f}s: {len(latencies) / elapsed:.0f} req/s")
+    print(f"client latency p50/p95/p99: {np.percentile(latencies, 50):.2f}/{np.percentile(latencies, 95):.2f}/{np.percentile(latencies, 99):.2f} ms")
+    client = PolicyClient(address)
+    print(f"server stats: {client.stats()}")
+    client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local micro-batching inference server for trained snake policies.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("model", help="MaskablePPO zip in trained_models_*, or an exported .pt/.onnx policy.")
+    serve_parser.add_argument("--address", default="/tmp/snake_policy.sock", help="Unix socket path or host:port.")
+    serve_parser.add_argument("--max-batch", type=int, default=64)
+    serve_parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    serve_parser.add_argument("--stochastic", action="store_true", help="Sample actions instead of taking the argmax.")
+    serve_parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between metric reports, 0 to disable.")
+
+    bench_parser = subparsers.add_parser("bench")
+    bench_parser.add_argument("--address", default="/tmp/snake_policy.sock")
+    bench_parser.add_argument("--clients", type=int, default=16)
+    bench_parser.add_argument("--requests", type=int, default=500)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.model, args.address, args.max_batch, args.max_wait_ms / 1000, not args.stochastic, args.report_interval)
+    else:
+        bench(args.address, args.clients, args.requests)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from demonstrations import DemonstrationDataset
+
+# Behavior-cloning warm start. A fresh MaskablePPO with the training hyperparameters of train_cnn.py / train_mlp.py is
+# fitted to a demonstration dataset written by demonstrations.py: the actor by masked cross-entropy on the
+# demonstrated actions, the critic by regression on the demonstrated discounted returns. The saved model is
+# fine-tuned by setting INIT_MODEL_PATH in the training script.
+
+def make_model(env_type, env_kwargs, device):
+    from sb3_contrib import MaskablePPO
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from env_worker import ActionMaskWrapper
+    from evaluation import get_env_class
+
+    SnakeEnv = get_env_class(env_type)
+    env = DummyVecEnv([lambda: ActionMaskWrapper(SnakeEnv(seed=0, **env_kwargs))])
+    if env_type == "cnn":
+        return MaskablePPO("CnnPolicy", env, device=device, gamma=0.94), env
+    features = env_kwargs.get("obs_mode") == "features"
+    policy_kwargs = dict(net_arch=dict(pi=[32, 32], vf=[32, 32])) if features else None # Same as train_mlp.py.
+    return MaskablePPO("MlpPolicy", env, device=device, gamma=0.94, policy_kwargs=policy_kwargs), env
+
+def pretrain(model, dataset, epochs, batch_size, learning_rate, vf_coef=0.5, seed=0):
+    import torch
+
+    policy = model.policy
+    policy.set_training_mode(True)
+    optimizer = torch.optim.Adam(policy.parameters(), lr=learning_rate)
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        start_time = time.perf_counter()
+        total_loss, correct, seen = 0.0, 0, 0
+        for batch in dataset.iterate_minibatches(batch_size, rng):
+            obs, _ = policy.obs_to_tensor(batch["obs"])
+            actions = torch.as_tensor(batch["action"], dtype=torch.long, device=model.device)
+            returns = torch.as_tensor(batch["return"], device=model.device)
+            values, log_prob, _ = policy.evaluate_actions(obs, actions, action_masks=batch["mask"])
+            loss = -log_prob.mean() + vf_coef * torch.nn.functional.mse_loss(values.flatten(), returns)
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(policy.parameters(), model.max_grad_norm)
+            optimizer.step()
+
+            with torch.no_grad():
+                predicted = policy.get_distribution(obs, action_masks=batch["mask"]).distribution.probs.argmax(dim=1)
+            correct += int((predicted == actions).sum())
+            total_loss += float(loss) * len(actions)
+            seen += len(actions)
+        print(f"Epoch {epoch + 1}/{epochs}: loss {total_loss / seen:.4f}, action accuracy {correct / seen:.3f}, "
+              f"{seen / (time.perf_counter() - start_time):.0f} samples/s", flush=True)
+    policy.set_training_mode(False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Behavior-cloning pretraining of a MaskablePPO policy.")
+    parser.add_argument("dataset")
+    parser.add_argument("--out", default=None, help="Default: <dataset>/bc_pretrained.zip")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--vf-coef", type=float, default=0.5)
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--eval-episodes", type=int, default=10)
+    args = parser.parse_args()
+
+    from evaluation import evaluate_seeds, summarize
+
+    dataset = DemonstrationDataset(args.dataset)
+    env_type = dataset.index["env"]
+    print(f"{len(dataset)} transitions of {dataset.index['agent']} on {env_type} ({dataset.index['obs_shape']}).")
+
+    model, env = make_model(env_type, dataset.index["env_kwargs"], args.device)
+    pretrain(model, dataset, args.epochs, args.batch_size, args.lr, args.vf_coef, args.seed)
+    env.close()
+
+    out_path = args.out or os.path.join(args.dataset, "bc_pretrained.zip")
+    model.save(out_path)
+    print(f"Saved {out_path}")
+
+    if args.eval_episodes:
+        seeds = [10 ** 6 + i for i in range(args.eval_episodes)]
+        summary = summarize(evaluate_seeds(model.predict, env_type, seeds, env_kwargs=dataset.index["env_kwargs"]))
+        print(f"Cloned policy: mean score {summary['mean_score']:.1f}, win rate {summary['win_rate']:.2f}, "
+              f"mean steps {summary['mean_steps']:.0f} over {summary['episodes']} episodes.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+import argparse
+
+import numpy as np
+import torch
+from torch import nn
+from sb3_contrib import MaskablePPO
+from stable_baselines3.common.preprocessing import is_image_space
+
+from evaluation import evaluate_seeds, record_states, summarize
+from export_policy import load_actor, save_actor
+
+# Int8 CPU inference for MaskablePPO policies. The actor of a trained_models_* zip is rebuilt as one nn.Sequential
+# between quant/dequant stubs and exported as TorchScript with the export_policy.py interface, so PolicyRuntime and
+# every script that loads .pt policies run it unchanged.
+#   dynamic: Linear weights in int8, activations quantized on the fly per batch. No calibration needed.
+#   static:  Conv and Linear layers (fused with their ReLU) fully in int8, with activation ranges observed on states
+#            recorded from games played by the float policy.
+
+QUANTIZATION_MODES = ["float", "dynamic", "static"]
+
+class QuantizableActor(nn.Module):
+    def __init__(self, policy, transpose_image):
+        super().__init__()
+        extractor = getattr(policy, "pi_features_extractor", policy.features_extractor)
+        layers = list(extractor.cnn) + list(extractor.linear) if hasattr(extractor, "cnn") else [nn.Flatten()]
+        layers += list(policy.mlp_extractor.policy_net) + [policy.action_net]
+        self.body = nn.Sequential(*layers)
+        self.transpose_image = transpose_image
+        self.normalize_images = is_image_space(policy.observation_space) and policy.normalize_images
+        self.quant = torch.ao.quantization.QuantStub()
+        self.dequant = torch.ao.quantization.DeQuantStub()
+
+    def fuse(self):
+        # Conv2d/Linear + ReLU pairs run as single quantized kernels.
+        modules = list(self.body)
+        pairs = [
+            [str(i), str(i + 1)] for i in range(len(modules) - 1)
+            if isinstance(modules[i], (nn.Conv2d, nn.Linear)) and isinstance(modules[i + 1], nn.ReLU)
+        ]
+        if pairs:
+            torch.ao.quantization.fuse_modules(self.body, pairs, inplace=True)
+
+    def forward(self, obs, action_mask):
+        obs = obs.float()
+        if self.transpose_image:
+            obs = obs.permute(0, 3, 1, 2) # HWC -> CHW, done by VecTransposeImage in Stable-Baselines3.
+        if self.normalize_images:
+            obs = obs / 255.0
+        logits = self.dequant(self.body(self.quant(obs)))
+        logits = torch.where(action_mask, logits, torch.full_like(logits, -1e8)) # Same masking value as MaskableCategorical.
+        return torch.argmax(logits, dim=1), logits
+
+def quantize_policy(model_path, output_path, mode, calibration_obs=None, calibration_masks=None, batch_size=256):
+    model, env_space, _, _, transpose_image = load_actor(model_path)
+    module = QuantizableActor(model.policy, transpose_image).eval()
+
+    if mode == "dynamic":
+        module = torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+    elif mode == "static":
+        engine = torch.backends.quantized.engine
+        module.fuse()
+        module.qconfig = torch.ao.quantization.get_default_qconfig(engine)
+        torch.ao.quantization.prepare(module, inplace=True)
+        with torch.no_grad():
+            for start in range(0, len(calibration_obs), batch_size):
+                module(torch.as_tensor(calibration_obs[start:start + batch_size]), torch.as_tensor(calibration_masks[start:start + batch_size]))
+        torch.ao.quantization.convert(module, inplace=True)
+
+    # Same layout handling and sidecar as export_policy.py: the graph takes channel-last env observations.
+    save_actor(module, model, env_space, output_path, "torchscript", {
+        "quantization": mode,
+        "quantized_engine": torch.backends.quantized.engine,
+    })
+
+def main():
+    from policy_runtime import PolicyRuntime
+    from benchmark_policy_runtime import run_backend
+
+    parser = argparse.ArgumentParser(description="Int8 quantized CPU export of a MaskablePPO snake policy, with a report against the float model.")
+    parser.add_argument("model", help="Path of the MaskablePPO zip, e.g. trained_models_cnn/ppo_snake_final.zip")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default="cnn")
+    parser.add_argument("--obs-mode", choices=["board", "features"], default="board", help="MLP observation mode.")
+    parser.add_argument("--modes", nargs="+", choices=["dynamic", "static"], default=["dynamic", "static"])
+    parser.add_argument("--calibration-episodes", type=int, default=20)
+    parser.add_argument("--calibration-states", type=int, default=5000)
+    parser.add_argument("--eval-episodes", type=int, default=20)
+    parser.add_argument("--decisions", type=int, default=2000)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    env_kwargs = {"obs_mode": args.obs_mode} if args.env == "mlp" else {}
+    base_path = os.path.splitext(args.model)[0]
+    float_model = MaskablePPO.load(args.model, device="cpu")
+
+    # Calibration games and evaluation games use disjoint seed sets.
+    calibration_obs, calibration_masks = record_states(
+        float_model.predict, args.env, [2 * 10 ** 6 + i for i in range(args.calibration_episodes)], env_kwargs, args.calibration_states,
+    )
+    print(f"{len(calibration_obs)} calibration states from {args.calibration_episodes} games of the float policy.")
+
+    # The float policy goes through the same export, so the comparison isolates quantization.
+    paths = {}
+    for mode in ["float"] + args.modes:
+        paths[mode] = f"{base_path}_{mode}.pt" if mode != "float" else f"{base_path}_fp32.pt"
+        quantize_policy(args.model, paths[mode], mode, calibration_obs, calibration_masks)
+
+    # Agreement is measured against model.predict, so the float row also checks the export itself.
+    float_actions, _ = float_model.predict(calibration_obs, action_masks=calibration_masks, deterministic=True)
+    eval_seeds = [10 ** 6 + i for i in range(args.eval_episodes)]
+    print(f"{'model':<9} {'size_kb':>8} {'mean_us':>8} {'p99_us':>8} {'max_rss_mb':>11} {'agreement':>10} {'mean_score':>11} {'win_rate':>9}")
+    for mode, path in paths.items():
+        runtime = PolicyRuntime(path)
+        actions, _ = runtime.predict(calibration_obs, action_masks=calibration_masks, deterministic=True)
+        timing = run_backend("runtime", path, calibration_obs[:256], calibration_masks[:256], args.decisions) # Fresh interpreter: memory includes every import.
+        summary = summarize(evaluate_seeds(runtime.predict, args.env, eval_seeds, env_kwargs=env_kwargs))
+        print(f"{mode:<9} {os.path.getsize(path) / 1024:>8.0f} {timing['latency_us_mean']:>8.1f} {timing['latency_us_p99']:>8.1f} "
+              f"{timing['max_rss_mb']:>11.1f} {np.mean(actions == float_actions):>10.3f} {summary['mean_score']:>11.1f} {summary['win_rate']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import math
+import time
+import argparse
+import multiprocessing as mp
+
+from evaluation import load_predict, evaluate_seeds
+
+# Sequential evaluation: seeded episodes run in parallel and are consumed in seed order, and the run stops as soon
+# as the result is decisive instead of after a fixed episode count.
+#
+# The intervals are predictable plug-in empirical-Bernstein confidence sequences for bounded values (Waudby-Smith and
+# Ramdas, 2023, "Estimating means of bounded random variables by betting"): they hold at every episode count
+# simultaneously, so checking them after every episode and stopping early does not inflate the error rate like
+# repeated t-tests would. They only assume known bounds, which every quantity has: scores lie in
+# [0, 10 * (board_size^2 - 3)], paired score differences in +/- that range, and wins in [0, 1]. The variance is
+# estimated from past episodes only, which keeps the guarantee while adapting the width to the actual spread.
+
+class ConfidenceSequence:
+    # Running mean of values in [low, high] with its (1 - alpha) confidence sequence, intersected over time.
+    def __init__(self, low, high, alpha):
+        self.low = low
+        self.scale = high - low
+        self.log_term = math.log(2 / alpha)
+        self.n = 0
+        self.total = 0.0
+        # The statistics below are of the values rescaled to [0, 1].
+        self.rescaled_total = 0.0
+        self.mean_estimate = 0.5 # Regularized running mean, starts at 1/2.
+        self.variance_total = 0.25 # Regularized sum of squared deviations, starts at 1/4.
+        self.lambda_total = 0.0
+        self.weighted_total = 0.0
+        self.penalty = 0.0
+        self.lower, self.upper = 0.0, 1.0
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else 0.0
+
+    def add(self, value):
+        x = (value - self.low) / self.scale
+        t = self.n + 1
+        # Bet size from the variance of the previous values only (predictable), capped at 1/2.
+        variance = self.variance_total / t
+        lam = min(math.sqrt(2 * self.log_term / (variance * t * math.log(1 + t))), 0.5)
+        self.lambda_total += lam
+        self.weighted_total += lam * x
+        self.penalty += (x - self.mean_estimate) ** 2 * (-math.log(1 - lam) - lam)
+
+        self.n = t
+        self.total += value
+        self.rescaled_total += x
+        self.mean_estimate = (0.5 + self.rescaled_total) / (t + 1)
+        self.variance_total += (x - self.mean_estimate) ** 2
+
+        center = self.weighted_total / self.lambda_total
+        radius = (self.log_term + self.penalty) / self.lambda_total
+        self.lower = max(self.lower, center - radius)
+        self.upper = min(self.upper, center + radius)
+
+    def interval(self):
+        return self.low + self.lower * self.scale, self.low + self.upper * self.scale
+
+_worker_predicts = None
+
+def _init_worker(model_paths):
+    global _worker_predicts
+    _worker_predicts = [load_predict(path) for path in model_paths]
+
+def _evaluate_seed(job):
+    # One seed for every model, so comparisons are paired on identical games.
+    seed, env_type, board_size, env_kwargs = job
+    start_time = time.perf_counter()
+    results = [evaluate_seeds(predict, env_type, [seed], board_size=board_size, env_kwargs=env_kwargs)[0] for predict in _worker_predicts]
+    return results, time.perf_counter() - start_time
+
+class SequentialEvaluation:
+    def __init__(self, num_models, alpha, precision, win_precision, margin, min_episodes, board_size=12):
+        self.alpha = alpha
+        self.precision = precision
+        self.win_precision = win_precision
+        self.margin = margin
+        self.min_episodes = min_episodes
+        max_score = 10 * (board_size ** 2 - 3) # 10 points per food, from 3 cells to the full board.
+        self.scores = [ConfidenceSequence(0, max_score, alpha) for _ in range(num_models)]
+        self.wins = [ConfidenceSequence(0, 1, alpha) for _ in range(num_models)]
+        self.difference = ConfidenceSequence(-max_score, max_score, alpha) if num_models == 2 else None
+        self.decision = None
+
+    def add(self, results):
+        for result, scores, wins in zip(results, self.scores, self.wins):
+            scores.add(result["score"])
+            wins.add(float(result["win"]))
+        if self.difference is not None:
+            self.difference.add(results[0]["score"] - results[1]["score"])
+
+    def score_interval(self, index):
+        return self.scores[index].interval()
+
+    def win_interval(self, index):
+        return self.wins[index].interval()
+
+    def difference_interval(self):
+        return self.difference.interval()
+
+    def check(self):
+        # Sets and returns the decision once the run can stop.
+        if self.scores[0].n < self.min_episodes:
+            return None
+        if self.difference is not None:
+            low, high = self.difference_interval()
+            if low > 0:
+                self.decision = "model A scores higher"
+            elif high < 0:
+                self.decision = "model B scores higher"
+            elif self.margin > 0 and -self.margin <= low and high <= self.margin:
+                self.decision = f"equivalent within +/-{self.margin:g} score"
+            return self.decision
+        low, high = self.score_interval(0)
+        win_low, win_high = self.win_interval(0)
+        if (high - low) / 2 <= self.precision and (self.win_precision is None or (win_high - win_low) / 2 <= self.win_precision):
+            self.decision = "precision reached"
+        return self.decision
+
+def run(model_paths, env_type, env_kwargs, alpha, precision, win_precision, margin, min_episodes, max_episodes, num_workers, seed, board_size=12):
+    evaluation = SequentialEvaluation(len(model_paths), alpha, precision, win_precision, margin, min_episodes, board_size)
+    seeds = [10 ** 6 + seed * 10 ** 5 + i for i in range(max_episodes)]
+    episode_time = 0.0
+    start_time = time.perf_counter()
+    # imap yields in seed order even though episodes finish out of order. Stopping on completion order instead would
+    # favour short episodes, and bias the estimate towards low scores.
+    with mp.Pool(num_workers, initializer=_init_worker, initargs=(model_paths,)) as pool:
+        for results, seconds in pool.imap(_evaluate_seed, [(s, env_type, board_size, env_kwargs) for s in seeds]):
+            evaluation.add(results)
+            episode_time += seconds
+            if evaluation.check():
+                break
+    elapsed = time.perf_counter() - start_time
+    return evaluation, elapsed, episode_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate one model to a target precision, or compare two models, with early stopping.")
+    parser.add_argument("model")
+    parser.add_argument("baseline", nargs="?", help="Second model: run a paired sequential comparison instead.")
+    parser.add_argument("--env", choices=["cnn", "mlp"], default="cnn")
+    parser.add_argument("--obs-mode", choices=["board", "features"], default="board", help="MLP observation mode.")
+    parser.add_argument("--board-size", type=int, default=12, help="Also sets the score bounds of the intervals.")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Error rate of the intervals and of the comparison.")
+    parser.add_argument("--precision", type=float, default=5.0, help="Target half-width of the mean score interval.")
+    parser.add_argument("--win-precision", type=float, default=None, help="Target half-width of the win rate interval.")
+    parser.add_argument("--margin", type=float, default=0.0, help="Comparison: stop as equivalent when the difference is within +/-margin.")
+    parser.add_argument("--min-episodes", type=int, default=20)
+    parser.add_argument("--max-episodes", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    model_paths = [args.model] + ([args.baseline] if args.baseline else [])
+    env_kwargs = {"obs_mode": args.obs_mode} if args.env == "mlp" else {}
+    evaluation, elapsed, episode_time = run(
+        model_paths, args.env, env_kwargs, args.alpha, args.precision, args.win_precision, args.margin,
+        args.min_episodes, args.max_episodes, args.workers, args.seed, args.board_size,
+    )
+
+    used = evaluation.scores[0].n
+    confidence = 100 * (1 - args.alpha)
+    for index, (name, path) in enumerate(zip("AB", model_paths)):
+        low, high = evaluation.score_interval(index)
+        win_low, win_high = evaluation.win_interval(index)
+        print(f"Model {name} ({path}): mean score {evaluation.scores[index].mean:.1f} [{low:.1f}, {high:.1f}], "
+              f"win rate {evaluation.wins[index].mean:.3f} [{win_low:.3f}, {win_high:.3f}] ({confidence:g}% confidence sequences)")
+    if evaluation.difference is not None:
+        low, high = evaluation.difference_interval()
+        print(f"Score difference A - B: {evaluation.difference.mean:.1f} [{low:.1f}, {high:.1f}]")
+    print(f"Decision: {evaluation.decision or 'undecided, episode budget exhausted'}")
+
+    saved = args.max_episodes - used
+    print(f"Episodes used: {used} of {args.max_episodes} ({len(model_paths)} model(s) each), {elapsed:.1f}s wall clock, "
+          f"{episode_time:.1f}s of episodes.")
+    if saved > 0:
+        print(f"Saved {saved} episodes per model against the fixed budget, about {elapsed / used * saved:.0f}s at this rate.")
+
+if __name__ == "__main__":
+    main()
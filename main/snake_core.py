@@ -0,0 +1,283 @@
+import random
+import warnings
+import importlib.util
+from types import SimpleNamespace
+
+import numpy as np
+
+from snake_game import SnakeGame
+
+# Optional JIT-compiled game core. The game state lives in flat arrays, and the step, action mask and observation
+# kernels are compiled with Numba. Food is sampled in Python with the same random calls as SnakeGame, so both cores
+# produce identical episodes for identical seeds and actions. Without Numba, make_game() falls back to SnakeGame.
+# Numba is only imported when a compiled game is created, so env workers of the pure-Python core stay lean.
+
+BACKENDS = ["python", "numba"]
+DIRECTIONS = ["UP", "LEFT", "RIGHT", "DOWN"] # Direction codes are the action codes; the opposite of d is 3 - d.
+
+# Layout of the int64 state array.
+HEAD = 0 # Index of the head in the body ring buffer.
+LENGTH = 1
+DIRECTION = 2
+FOOD = 3 # Flat cell index of the food.
+BOARD_SIZE = 4
+STATE_SIZE = 5
+
+def core_step(state, body, occupancy, action):
+    # Same rules as SnakeGame.step. body is a ring buffer of flat cell indices, head first; occupancy marks body cells.
+    board_size = state[BOARD_SIZE]
+    capacity = body.shape[0]
+    direction = state[DIRECTION]
+    if 0 <= action <= 3 and action != 3 - direction:
+        direction = action
+    state[DIRECTION] = direction
+
+    head = body[state[HEAD]]
+    row = head // board_size
+    col = head % board_size
+    if direction == 0:
+        row -= 1
+    elif direction == 3:
+        row += 1
+    elif direction == 1:
+        col -= 1
+    else:
+        col += 1
+    inside = 0 <= row < board_size and 0 <= col < board_size
+    cell = row * board_size + col
+
+    length = state[LENGTH]
+    food_obtained = inside and cell == state[FOOD]
+    if not food_obtained: # The tail moves away before the collision check.
+        occupancy[body[(state[HEAD] + length - 1) % capacity]] = 0
+        length -= 1
+
+    done = not inside or occupancy[cell] != 0
+    if not done:
+        head_index = (state[HEAD] - 1) % capacity
+        body[head_index] = cell
+        occupancy[cell] = 1
+        state[HEAD] = head_index
+        length += 1
+    state[LENGTH] = length
+    # The head and the cell behind it, as in the info of SnakeGame.step.
+    return done, food_obtained, length, body[state[HEAD]], body[(state[HEAD] + 1) % capacity]
+
+def core_action_mask(state, body, occupancy):
+    # Same rules as SnakeEnv._check_action_validity.
+    board_size = state[BOARD_SIZE]
+    capacity = body.shape[0]
+    head = body[state[HEAD]]
+    tail = body[(state[HEAD] + state[LENGTH] - 1) % capacity]
+    mask = np.zeros((1, 4), dtype=np.bool_)
+    for action in range(4):
+        if action == 3 - state[DIRECTION]:
+            continue
+        row = head // board_size
+        col = head % board_size
+        if action == 0:
+            row -= 1
+        elif action == 3:
+            row += 1
+        elif action == 1:
+            col -= 1
+        else:
+            col += 1
+        if not (0 <= row < board_size and 0 <= col < board_size):
+            continue
+        cell = row * board_size + col
+        if cell == state[FOOD]: # The snake won't pop the last cell if it ate food.
+            mask[0, action] = occupancy[cell] == 0
+        else:
+            mask[0, action] = occupancy[cell] == 0 or cell == tail
+    return mask
+
+def core_mlp_board(state, body):
+    # SnakeEnv._generate_snake_board of the MLP env: np.linspace(0.8, 0.2) from head to tail, head 1.0.
+    board_size = state[BOARD_SIZE]
+    capacity = body.shape[0]
+    length = state[LENGTH]
+    obs = np.zeros((board_size, board_size), dtype=np.float32)
+    step = (0.2 - 0.8) / (length - 1) if length > 1 else 0.0
+    for i in range(length):
+        cell = body[(state[HEAD] + i) % capacity]
+        value = 0.2 if i == length - 1 and length > 1 else i * step + 0.8
+        obs[cell // board_size, cell % board_size] = np.float32(value)
+    head = body[state[HEAD]]
+    obs[head // board_size, head % board_size] = 1.0
+    return obs
+
+def core_cnn_board(state, body):
+    # SnakeEnv._generate_snake_board of the CNN env: gray np.linspace(200, 50) from head to tail, green head, red tail.
+    board_size = state[BOARD_SIZE]
+    capacity = body.shape[0]
+    length = state[LENGTH]
+    obs = np.zeros((board_size, board_size, 3), dtype=np.uint8)
+    step = (50.0 - 200.0) / (length - 1) if length > 1 else 0.0
+    for i in range(length):
+        cell = body[(state[HEAD] + i) % capacity]
+        value = np.uint8(50.0 if i == length - 1 and length > 1 else i * step + 200.0)
+        for channel in range(3):
+            obs[cell // board_size, cell % board_size, channel] = value
+    head = body[state[HEAD]]
+    tail = body[(state[HEAD] + length - 1) % capacity]
+    obs[head // board_size, head % board_size, 0] = 0
+    obs[head // board_size, head % board_size, 1] = 255
+    obs[head // board_size, head % board_size, 2] = 0
+    obs[tail // board_size, tail % board_size, 0] = 255
+    obs[tail // board_size, tail % board_size, 1] = 0
+    obs[tail // board_size, tail % board_size, 2] = 0
+    return obs
+
+_compiled_kernels = None
+
+def numba_available():
+    return importlib.util.find_spec("numba") is not None
+
+def get_kernels(jit=True):
+    # The kernels compiled with Numba (cached on disk), or the plain Python functions with jit=False.
+    global _compiled_kernels
+    kernels = SimpleNamespace(step=core_step, action_mask=core_action_mask, mlp_board=core_mlp_board, cnn_board=core_cnn_board)
+    if not jit:
+        return kernels
+    if _compiled_kernels is None:
+        import numba
+        compile_kernel = numba.njit(cache=True, nogil=True)
+        _compiled_kernels = SimpleNamespace(**{name: compile_kernel(kernel) for name, kernel in vars(kernels).items()})
+    return _compiled_kernels
+
+class BodyView:
+    # Read-only sequence of (row, col) cells, head first, over the body ring buffer; stands in for SnakeGame.snake.
+    def __init__(self, game):
+        self.game = game
+
+    def __len__(self):
+        return int(self.game.state[LENGTH])
+
+    def __getitem__(self, index):
+        state, length = self.game.state, int(self.game.state[LENGTH])
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(length))]
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("snake index out of range")
+        return divmod(int(self.game.body[(state[HEAD] + index) % len(self.game.body)]), self.game.board_size)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __contains__(self, cell):
+        row, col = cell
+        return 0 <= row < self.game.board_size and 0 <= col < self.game.board_size and self.game.occupancy[row * self.game.board_size + col] != 0
+
+class FlatSnakeGame(SnakeGame):
+    # SnakeGame on the compiled core. snake, non_snake, direction and food keep their SnakeGame meaning for rendering,
+    # agents and tools; the env wrappers use action_mask() and the board kernels directly.
+    backend = "numba"
+
+    def __init__(self, seed=0, board_size=12, silent_mode=True, jit=True):
+        self.kernels = get_kernels(jit)
+        self.state = np.zeros(STATE_SIZE, dtype=np.int64)
+        self.state[BOARD_SIZE] = board_size
+        self.state[FOOD] = -1
+        self.body = np.zeros(board_size ** 2, dtype=np.int64)
+        self.occupancy = np.zeros(board_size ** 2, dtype=np.uint8)
+        super().__init__(seed=seed, board_size=board_size, silent_mode=silent_mode)
+
+    @property
+    def snake(self):
+        return BodyView(self)
+
+    @snake.setter
+    def snake(self, cells):
+        cells = np.array(cells if cells is not None else [], dtype=np.int64).reshape(-1, 2)
+        self.body[:len(cells)] = cells[:, 0] * self.board_size + cells[:, 1]
+        self.occupancy[:] = 0
+        self.occupancy[self.body[:len(cells)]] = 1
+        self.state[HEAD] = 0
+        self.state[LENGTH] = len(cells)
+
+    @property
+    def non_snake(self):
+        free_cells = np.flatnonzero(self.occupancy == 0)
+        return set(zip(*np.divmod(free_cells, self.board_size)))
+
+    @non_snake.setter
+    def non_snake(self, cells):
+        pass # Always the complement of the snake.
+
+    @property
+    def direction(self):
+        return DIRECTIONS[self.state[DIRECTION]]
+
+    @direction.setter
+    def direction(self, direction):
+        self.state[DIRECTION] = DIRECTIONS.index(direction) if direction is not None else 3
+
+    @property
+    def food(self):
+        return self._food
+
+    @food.setter
+    def food(self, cell):
+        self._food = cell
+        self.state[FOOD] = cell[0] * self.board_size + cell[1] if cell is not None else -1
+
+    def reset(self):
+        initial_snake, _ = self._get_reset_template(self.board_size)
+        self.snake = initial_snake
+        self.direction = "DOWN"
+        self.food = self._generate_food()
+        self.score = 0
+        self.drawn_cell_keys = None
+
+    def set_state(self, snake, direction, food, score):
+        self.snake = snake # Fills the body and the occupancy grid; non_snake is always its complement.
+        self.direction = direction
+        self.food = food
+        self.score = score
+        self.drawn_cell_keys = None
+
+    def step(self, action):
+        done, food_obtained, length, head, prev_head = self.kernels.step(self.state, self.body, self.occupancy, int(action))
+        if food_obtained:
+            self.score += 10
+            if not self.silent_mode:
+                self.sound_eat.play()
+        if done and not self.silent_mode:
+            if length < self.grid_size:
+                self.sound_game_over.play()
+            else:
+                self.sound_victory.play()
+        if food_obtained:
+            self.food = self._generate_food()
+
+        info = {
+            "snake_size": int(length),
+            "snake_head_pos": np.array(divmod(int(head), self.board_size)),
+            "prev_snake_head_pos": np.array(divmod(int(prev_head), self.board_size)),
+            "food_pos": np.array(self.food),
+            "food_obtained": bool(food_obtained),
+        }
+        return bool(done), info
+
+    def _generate_food(self):
+        # Same random calls as SnakeGame._generate_food.
+        if self.state[LENGTH] < self.grid_size:
+            while True:
+                cell = random.randrange(self.grid_size)
+                if self.occupancy[cell] == 0:
+                    return divmod(cell, self.board_size)
+        return (0, 0)
+
+    def action_mask(self):
+        return self.kernels.action_mask(self.state, self.body, self.occupancy)
+
+def make_game(backend="python", seed=0, board_size=12, silent_mode=True):
+    assert backend in BACKENDS, f"Unknown game backend: {backend}"
+    if backend == "numba":
+        if numba_available():
+            return FlatSnakeGame(seed=seed, board_size=board_size, silent_mode=silent_mode)
+        warnings.warn("Numba is not installed, falling back to the pure-Python game core.")
+    return SnakeGame(seed=seed, board_size=board_size, silent_mode=silent_mode)
@@ -4,11 +4,23 @@ import random
 
 import numpy as np
 
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
-import pygame
-from pygame import mixer
+# pygame is imported on demand, so headless games (silent_mode=True) and env workers never load it.
+pygame = None
+mixer = None
+
+def import_pygame():
+    global pygame, mixer
+    if pygame is None:
+        os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+        import pygame
+        from pygame import mixer
 
 class SnakeGame:
+    backend = "python" # Game core, see snake_core.make_game.
+    BODY_SHADES = 32 # Number of cached body colors in the head-to-tail gradient.
+    reset_templates = {} # board_size -> (initial snake, initial non-snake cells), shared by all games.
+    board_cells = {} # board_size -> frozenset of every cell, shared by all games.
+
     def __init__(self, seed=0, board_size=12, silent_mode=True): # 初始化游戏
         self.board_size = board_size # 设置board_size
         self.grid_size = self.board_size ** 2 # 设置grid_size
@@ -21,6 +33,7 @@ class SnakeGame:
 
         self.silent_mode = silent_mode # 设置silent_mode
         if not silent_mode: # 如果silent_mode为False
+            import_pygame() # 导入pygame
             pygame.init() # 初始化pygame
             pygame.display.set_caption("Snake Game") # 设置游戏标题
             self.screen = pygame.display.set_mode((self.display_width, self.display_height)) # 设置屏幕
@@ -35,6 +48,13 @@ class SnakeGame:
             self.screen = None
             self.font = None
 
+        # Render cache: pre-rendered cell sprites and the sprite key of every cell on screen.
+        self.cell_sprites = None
+        self.score_glyphs = None
+        self.score_rect = None
+        self.drawn_cell_keys = None
+        self.drawn_score = None
+
         self.snake = None
         self.non_snake = None
 
@@ -48,11 +68,38 @@ class SnakeGame:
         self.reset()
 
     def reset(self): # 重置游戏
-        self.snake = [(self.board_size // 2 + i, self.board_size // 2) for i in range(1, -2, -1)] # Initialize the snake with three cells in (row, column) format.
-        self.non_snake = set([(row, col) for row in range(self.board_size) for col in range(self.board_size) if (row, col) not in self.snake]) # Initialize the non-snake cells.
+        # Restore the initial snake and non-snake cells by bulk-copying the per-board-size template.
+        initial_snake, initial_non_snake = self._get_reset_template(self.board_size)
+        self.snake = list(initial_snake)
+        self.non_snake = initial_non_snake.copy()
         self.direction = "DOWN" # 蛇向下开始
         self.food = self._generate_food()
         self.score = 0
+        self.drawn_cell_keys = None # Next render redraws the whole screen.
+
+    @classmethod
+    def _get_reset_template(cls, board_size):
+        # The initial state only depends on the board size, so it is built once and shared by all games.
+        template = cls.reset_templates.get(board_size)
+        if template is None:
+            snake = [(board_size // 2 + i, board_size // 2) for i in range(1, -2, -1)] # Initialize the snake with three cells in (row, column) format.
+            non_snake = set([(row, col) for row in range(board_size) for col in range(board_size) if (row, col) not in snake]) # Initialize the non-snake cells.
+            template = (tuple(snake), non_snake)
+            cls.reset_templates[board_size] = template
+        return template
+
+    def set_state(self, snake, direction, food, score):
+        # Restore a saved mid-game state, e.g. from a start-state pool. snake is a list of (row, col) cells, head first.
+        cells = self.board_cells.get(self.board_size)
+        if cells is None:
+            cells = frozenset((row, col) for row in range(self.board_size) for col in range(self.board_size))
+            self.board_cells[self.board_size] = cells
+        self.snake = list(snake)
+        self.non_snake = set(cells.difference(self.snake))
+        self.direction = direction
+        self.food = food
+        self.score = score
+        self.drawn_cell_keys = None # Next render redraws the whole screen.
 
     def step(self, action): # 执行动作
         self._update_direction(action) # 更新方向
@@ -130,19 +177,30 @@ class SnakeGame:
 
     def _generate_food(self):
         if len(self.non_snake) > 0: # 如果非蛇集合不为空
-            food = random.sample(self.non_snake, 1)[0] # 从非蛇集合中随机选择一个位置作为食物
+            # Rejection sampling over the whole board: uniform over the free cells, independent of the set's iteration
+            # order, and the same random calls as the compiled core in snake_core.py.
+            while True:
+                food = divmod(random.randrange(self.grid_size), self.board_size) # 随机选择一个格子
+                if food in self.non_snake: # 如果该格子不在蛇身上
+                    break
         else: # 如果蛇占据了整个棋盘，则不需要生成新的食物，直接默认返回(0, 0)
             food = (0, 0)
         return food
     
     def draw_score(self):
-        score_text = self.font.render(f"Score: {self.score}", True, (255, 255, 255)) # 渲染得分文本
-        self.screen.blit(score_text, (self.border_size, self.height + 2 * self.border_size)) # 在屏幕上绘制得分文本
+        self.screen.fill((0, 0, 0), self.score_rect) # 清空得分区域
+        x = self.border_size
+        for char in f"Score: {self.score}": # 用缓存的字形拼出得分文本
+            glyph = self.score_glyphs[char]
+            self.screen.blit(glyph, (x, self.height + 2 * self.border_size)) # 在屏幕上绘制得分文本
+            x += glyph.get_width()
+        return self.score_rect
     
     def draw_welcome_screen(self):
         title_text = self.font.render("SNAKE GAME", True, (255, 255, 255)) # 渲染标题文本
         start_button_text = "START" # 渲染开始按钮文本
 
+        self.drawn_cell_keys = None # Next render redraws the whole screen.
         self.screen.fill((0, 0, 0)) # 填充屏幕
         self.screen.blit(title_text, (self.display_width // 2 - title_text.get_width() // 2, self.display_height // 4)) # 在屏幕上绘制标题文本
         self.draw_button_text(start_button_text, (self.display_width // 2, self.display_height // 2)) # 在屏幕上绘制开始按钮文本
@@ -153,6 +211,7 @@ class SnakeGame:
         final_score_text = self.font.render(f"SCORE: {self.score}", True, (255, 255, 255)) # 渲染最终得分文本
         retry_button_text = "RETRY" # 渲染重试按钮文本
 
+        self.drawn_cell_keys = None # Next render redraws the whole screen.
         self.screen.fill((0, 0, 0)) # 填充屏幕
         self.screen.blit(game_over_text, (self.display_width // 2 - game_over_text.get_width() // 2, self.display_height // 4)) # 在屏幕上绘制游戏结束文本
         self.screen.blit(final_score_text, (self.display_width // 2 - final_score_text.get_width() // 2, self.display_height // 4 + final_score_text.get_height() + 10)) # 在屏幕上绘制最终得分文本
@@ -172,6 +231,7 @@ class SnakeGame:
         self.screen.blit(colored_text, text_rect) # 在屏幕上绘制文本
     
     def draw_countdown(self, number):
+        self.drawn_cell_keys = None # Next render redraws the whole screen.
         countdown_text = self.font.render(str(number), True, (255, 255, 255)) # 渲染倒计时文本
         self.screen.blit(countdown_text, (self.display_width // 2 - countdown_text.get_width() // 2, self.display_height // 2 - countdown_text.get_height() // 2)) # 在屏幕上绘制倒计时文本
         pygame.display.flip() # 刷新屏幕
@@ -186,139 +246,190 @@ class SnakeGame:
         )
         return text_rect.collidepoint(mouse_pos)
 
-    def render(self):
-        self.screen.fill((0, 0, 0)) # 填充屏幕
+    def render(self, handle_events=True):
+        if self.cell_sprites is None: # 首次渲染时创建缓存的格子贴图
+            self._build_render_cache()
+
+        # Sprite key of every occupied cell in the current frame.
+        cell_keys = self._get_cell_sprite_keys() # 当前帧每个格子的贴图
+
+        if self.drawn_cell_keys is None: # Full redraw after reset or a menu screen.
+            self.screen.fill((0, 0, 0)) # 填充屏幕
+            # Draw border
+            pygame.draw.rect(self.screen, (255, 255, 255), (self.border_size - 2, self.border_size - 2, self.width + 4, self.height + 4), 2) # 绘制边框
+            for cell, key in cell_keys.items():
+                self.screen.blit(self.cell_sprites[key], self._cell_rect(cell))
+            self.draw_score()
+            self.drawn_score = self.score
+            pygame.display.flip() # 刷新屏幕
+        else:
+            # Only redraw the cells whose sprite changed since the last frame.
+            dirty_rects = []
+            for cell in self.drawn_cell_keys.keys() - cell_keys.keys(): # 被清空的格子
+                dirty_rects.append(self.screen.blit(self.cell_sprites["empty"], self._cell_rect(cell)))
+            for cell, key in cell_keys.items(): # 贴图发生变化的格子
+                if self.drawn_cell_keys.get(cell) != key:
+                    dirty_rects.append(self.screen.blit(self.cell_sprites[key], self._cell_rect(cell)))
+            if self.score != self.drawn_score: # 得分变化时才重绘得分
+                dirty_rects.append(self.draw_score())
+                self.drawn_score = self.score
+            pygame.display.update(dirty_rects) # 只刷新变化的区域
+
+        self.drawn_cell_keys = cell_keys
+
+        if not handle_events: # The interactive loop reads the event queue itself.
+            return
+        for event in pygame.event.get(): # 获取事件
+            if event.type == pygame.QUIT: # 如果事件类型为退出
+                pygame.quit() # 退出pygame
+                sys.exit() # 退出程序
 
-        # Draw border
-        pygame.draw.rect(self.screen, (255, 255, 255), (self.border_size - 2, self.border_size - 2, self.width + 4, self.height + 4), 2) # 绘制边框
+    def _cell_rect(self, cell):
+        r, c = cell
+        return (c * self.cell_size + self.border_size, r * self.cell_size + self.border_size, self.cell_size, self.cell_size)
 
-        # Draw snake
-        self.draw_snake() # 绘制蛇
-        
-        # Draw food
-        if len(self.snake) < self.grid_size: # If the snake occupies the entire board, don't draw food.
-            r, c = self.food
-            pygame.draw.rect(self.screen, (255, 0, 0), (c * self.cell_size + self.border_size, r * self.cell_size + self.border_size, self.cell_size, self.cell_size)) # 绘制食物
+    def _get_cell_sprite_keys(self):
+        cell_keys = {}
 
-        # Draw score
-        self.draw_score() # 绘制得分
+        # The body color fades from head to tail. It is quantized into BODY_SHADES levels so that
+        # a body cell only needs to be redrawn when its shade level actually changes.
+        num_body = len(self.snake) - 1
+        for i in range(1, num_body):
+            cell_keys[self.snake[i]] = ("body", i * (self.BODY_SHADES - 1) // num_body) # 蛇身颜色等级
+        if num_body > 0:
+            cell_keys[self.snake[-1]] = "tail" # 蛇尾
+        cell_keys[self.snake[0]] = "head" # 蛇头
 
-        pygame.display.flip() # 刷新屏幕
+        if len(self.snake) < self.grid_size: # If the snake occupies the entire board, don't draw food.
+            cell_keys[self.food] = "food" # 食物
 
-        for event in pygame.event.get(): # 获取事件
-            if event.type == pygame.QUIT: # 如果事件类型为退出
-                pygame.quit() # 退出pygame
-                sys.exit() # 退出程序
+        return cell_keys
+
+    def _build_render_cache(self):
+        cell = self.cell_size
+        self.cell_sprites = {}
 
-    def draw_snake(self):
-        # Draw the head
-        head_r, head_c = self.snake[0] # 获取蛇头位置
-        head_x = head_c * self.cell_size + self.border_size # 计算蛇头x坐标
-        head_y = head_r * self.cell_size + self.border_size # 计算蛇头y坐标
+        self.cell_sprites["empty"] = pygame.Surface((cell, cell)) # 空格子
 
         # Draw the head (Blue)
-        pygame.draw.polygon(self.screen, (100, 100, 255), [ 
-            (head_x + self.cell_size // 2, head_y), # 绘制蛇头
-            (head_x + self.cell_size, head_y + self.cell_size // 2), # 绘制蛇头
-            (head_x + self.cell_size // 2, head_y + self.cell_size), # 绘制蛇头
-            (head_x, head_y + self.cell_size // 2) # 绘制蛇头
+        head = pygame.Surface((cell, cell))
+        pygame.draw.polygon(head, (100, 100, 255), [
+            (cell // 2, 0),
+            (cell, cell // 2),
+            (cell // 2, cell),
+            (0, cell // 2)
         ])
-
         eye_size = 3 # 眼睛大小
-        eye_offset = self.cell_size // 4 # 眼睛偏移量
-        pygame.draw.circle(self.screen, (255, 255, 255), (head_x + eye_offset, head_y + eye_offset), eye_size) # 绘制眼睛
-        pygame.draw.circle(self.screen, (255, 255, 255), (head_x + self.cell_size - eye_offset, head_y + eye_offset), eye_size) # 绘制眼睛
+        eye_offset = cell // 4 # 眼睛偏移量
+        pygame.draw.circle(head, (255, 255, 255), (eye_offset, eye_offset), eye_size) # 绘制眼睛
+        pygame.draw.circle(head, (255, 255, 255), (cell - eye_offset, eye_offset), eye_size) # 绘制眼睛
+        self.cell_sprites["head"] = head
 
         # Draw the body (color gradient)
-        color_list = np.linspace(255, 100, len(self.snake), dtype=np.uint8) # 颜色列表
-        i = 1 # 初始化i
-        for r, c in self.snake[1:]: # 遍历蛇身
-            body_x = c * self.cell_size + self.border_size # 计算蛇身x坐标
-            body_y = r * self.cell_size + self.border_size # 计算蛇身y坐标
-            body_width = self.cell_size # 蛇身宽度
-            body_height = self.cell_size # 蛇身高度
-            body_radius = 5 # 蛇身半径
-            pygame.draw.rect(self.screen, (0, color_list[i], 0), # 绘制蛇身
-                            (body_x, body_y, body_width, body_height), border_radius=body_radius) # 绘制蛇身
-            i += 1
-        pygame.draw.rect(self.screen, (255, 100, 100), # 绘制蛇身
-                            (body_x, body_y, body_width, body_height), border_radius=body_radius) # 绘制蛇身
-        
+        body_radius = 5 # 蛇身半径
+        color_list = np.linspace(255, 100, self.BODY_SHADES, dtype=np.uint8) # 颜色列表
+        for level, color in enumerate(color_list):
+            body = pygame.Surface((cell, cell))
+            pygame.draw.rect(body, (0, int(color), 0), (0, 0, cell, cell), border_radius=body_radius) # 绘制蛇身
+            self.cell_sprites[("body", level)] = body
 
-if __name__ == "__main__":
-    import time
+        tail = pygame.Surface((cell, cell))
+        pygame.draw.rect(tail, (255, 100, 100), (0, 0, cell, cell), border_radius=body_radius) # 绘制蛇尾
+        self.cell_sprites["tail"] = tail
+
+        food = pygame.Surface((cell, cell))
+        food.fill((255, 0, 0)) # 绘制食物
+        self.cell_sprites["food"] = food
+
+        # Pre-render the score glyphs once, the score line is then composed by blitting them.
+        self.score_glyphs = {char: self.font.render(char, True, (255, 255, 255)) for char in set("Score: 0123456789")} # 得分字形缓存
+        self.score_rect = pygame.Rect(0, self.height + 2 * self.border_size, self.display_width, self.display_height - self.height - 2 * self.border_size)
 
+if __name__ == "__main__":
+    import_pygame()
     seed = random.randint(0, 1e9) # 随机种子
     game = SnakeGame(seed=seed, silent_mode=False) # 初始化游戏
     pygame.init() # 初始化pygame
     game.screen = pygame.display.set_mode((game.display_width, game.display_height)) # 设置屏幕
     pygame.display.set_caption("Snake Game") # 设置游戏标题
     game.font = pygame.font.Font(None, 36) # 设置字体
-    
-
-    game_state = "welcome" # 游戏状态
 
     # Two hidden button for start and retry click detection
     start_button = game.font.render("START", True, (0, 0, 0)) # 渲染开始按钮文本
     retry_button = game.font.render("RETRY", True, (0, 0, 0)) # 渲染重试按钮文本
 
-    update_interval = 0.15 # 更新间隔
-    start_time = time.time() # 开始时间
+    # Menus block in pygame.event.wait() and are only redrawn when the button hover state changes. While running,
+    # the loop wakes up at most MAX_FPS times per second to read input, and the game advances once every
+    # TICK_MS milliseconds of accumulated clock time. Key presses between two ticks are queued, so a quick
+    # turn sequence (e.g. up then left) is played over the next ticks instead of only keeping the last key.
+    TICK_MS = 150 # 游戏更新间隔(毫秒)
+    MAX_FPS = 60 # 运行时每秒最多处理输入的次数
+    MAX_QUEUED_ACTIONS = 3 # 最多缓存的按键动作
+    KEY_ACTIONS = {pygame.K_UP: 0, pygame.K_LEFT: 1, pygame.K_RIGHT: 2, pygame.K_DOWN: 3} # 按键 -> 动作
+
+    clock = pygame.time.Clock() # 帧率限制时钟
+    game_state = "welcome" # 游戏状态
+    hovered = None # Hover state of the drawn menu button, None to force a redraw.
+    queued_actions = [] # 待执行的动作
     action = -1 # 动作
+    elapsed_ms = 0 # 距上次游戏更新的累计时间
+
+    def start_countdown():
+        for i in range(3, 0, -1): # 倒计时
+            game.screen.fill((0, 0, 0)) # 填充屏幕
+            game.draw_countdown(i) # 绘制倒计时
+            game.sound_eat.play() # 播放吃食物的声音
+            pygame.time.wait(1000) # 等待1秒
+        pygame.event.clear((pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION)) # 丢弃倒计时期间的输入
 
     while True:
-        
-        for event in pygame.event.get(): # 获取事件
+        if game_state in ("welcome", "game_over"):
+            is_hovered = game.is_mouse_on_button(start_button if game_state == "welcome" else retry_button)
+            if is_hovered != hovered: # 只在按钮高亮状态变化时重绘
+                if game_state == "welcome":
+                    game.draw_welcome_screen() # 绘制欢迎界面
+                else:
+                    game.draw_game_over_screen() # 绘制游戏结束界面
+                hovered = is_hovered
 
-            if game_state == "running": # 如果游戏状态为运行中
-                if event.type == pygame.KEYDOWN: # 如果事件类型为按键按下
-                    if event.key == pygame.K_UP: # 如果按键为向上
-                        action = 0 # 动作
-                    elif event.key == pygame.K_DOWN: # 如果按键为向下
-                        action = 3 # 动作
-                    elif event.key == pygame.K_LEFT: # 如果按键为向左
-                        action = 1 # 动作
-                    elif event.key == pygame.K_RIGHT: # 如果按键为向右
-                        action = 2 # 动作
+        if game_state == "running":
+            events = pygame.event.get() # 获取事件
+        else:
+            events = [pygame.event.wait()] # 菜单界面: 等待下一个事件, 不占用CPU
 
+        for event in events:
             if event.type == pygame.QUIT: # 如果事件类型为退出
                 pygame.quit() # 退出pygame
                 sys.exit() # 退出程序
 
-            if game_state == "welcome" and event.type == pygame.MOUSEBUTTONDOWN: # 如果游戏状态为欢迎界面且事件类型为鼠标按下
-                if game.is_mouse_on_button(start_button): # 如果鼠标在开始按钮上
-                    for i in range(3, 0, -1): # 倒计时
-                        game.screen.fill((0, 0, 0)) # 填充屏幕
-                        game.draw_countdown(i) # 绘制倒计时
-                        game.sound_eat.play() # 播放吃食物的声音
-                        pygame.time.wait(1000) # 等待1秒
-                    action = -1  # 重置动作变量
-                    game_state = "running" # 游戏状态为运行中
+            if event.type == pygame.VIDEOEXPOSE: # 窗口需要重绘
+                hovered = None
+
+            if game_state == "running" and event.type == pygame.KEYDOWN and event.key in KEY_ACTIONS: # 如果按下方向键
+                if len(queued_actions) < MAX_QUEUED_ACTIONS and (queued_actions or [action])[-1] != KEY_ACTIONS[event.key]:
+                    queued_actions.append(KEY_ACTIONS[event.key]) # 缓存动作, 忽略重复按键
 
-            if game_state == "game_over" and event.type == pygame.MOUSEBUTTONDOWN: # 如果游戏状态为游戏结束且事件类型为鼠标按下
-                if game.is_mouse_on_button(retry_button): # 如果鼠标在重试按钮上
-                    for i in range(3, 0, -1): # 倒计时
-                        game.screen.fill((0, 0, 0)) # 填充屏幕
-                        game.draw_countdown(i) # 绘制倒计时
-                        game.sound_eat.play() # 播放吃食物的声音
-                        pygame.time.wait(1000) # 等待1秒
-                    game.reset() # 重置游戏
+            if game_state in ("welcome", "game_over") and event.type == pygame.MOUSEBUTTONDOWN: # 如果在菜单界面且鼠标按下
+                if game.is_mouse_on_button(start_button if game_state == "welcome" else retry_button): # 如果鼠标在按钮上
+                    start_countdown()
+                    if game_state == "game_over":
+                        game.reset() # 重置游戏
                     action = -1  # 重置动作变量
+                    queued_actions = []
+                    elapsed_ms = 0
                     game_state = "running" # 游戏状态为运行中
-        
-        if game_state == "welcome": # 如果游戏状态为欢迎界面
-            game.draw_welcome_screen() # 绘制欢迎界面
-
-        if game_state == "game_over": # 如果游戏状态为游戏结束
-            game.draw_game_over_screen() # 绘制游戏结束界面
+                    game.render(handle_events=False) # 绘制初始局面
+                    clock.tick() # 倒计时不计入游戏时间
 
         if game_state == "running": # 如果游戏状态为运行中
-            if time.time() - start_time >= update_interval: # 如果时间间隔大于等于更新间隔
+            elapsed_ms += clock.tick(MAX_FPS) # 限制帧率, 两帧之间休眠
+            if elapsed_ms >= TICK_MS: # 如果累计时间达到更新间隔
+                elapsed_ms = min(elapsed_ms - TICK_MS, TICK_MS) # 卡顿后不连续追赶多步
+                if queued_actions:
+                    action = queued_actions.pop(0) # 执行最早的缓存动作
                 done, _ = game.step(action) # 执行动作
-                game.render() # 渲染游戏
-                start_time = time.time() # 更新开始时间
+                game.render(handle_events=False) # 渲染游戏
 
                 if done:
                     game_state = "game_over"
-        
-        pygame.time.wait(1)
+                    hovered = None # 下一轮循环绘制游戏结束界面
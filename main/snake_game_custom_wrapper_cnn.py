@@ -3,12 +3,17 @@ import math
 import gym
 import numpy as np
 
-from snake_game import SnakeGame
+from snake_core import make_game
+from cycle_detector import CycleDetector
+from macro_actions import macro_step
+
+OBS_SIZE = 84 # Fixed observation resolution expected by the CNN policy.
+CYCLE_PENALTY = 0.1 # Larger than any heading-towards-food reward, see cycle_detection.
 
 class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
-    def __init__(self, seed=0, board_size=12, silent_mode=True, limit_step=True):
+    def __init__(self, seed=0, board_size=12, silent_mode=True, limit_step=True, cycle_detection=None, backend="python", macro_steps=1, macro_gamma=1.0, start_state_pool=None):
         super().__init__() # 调用父类gym.Env的初始化方法
-        self.game = SnakeGame(seed=seed, board_size=board_size, silent_mode=silent_mode) # 创建一个SnakeGame实例
+        self.game = make_game(backend, seed=seed, board_size=board_size, silent_mode=silent_mode) # "python" or "numba", see snake_core.py
         self.game.reset() # 重置游戏
 
         self.silent_mode = silent_mode # 设置silent_mode
@@ -17,7 +22,7 @@ class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
         
         self.observation_space = gym.spaces.Box(
             low=0, high=255, # 设置observation_space
-            shape=(84, 84, 3), # 设置observation_space的形状
+            shape=(OBS_SIZE, OBS_SIZE, 3), # 设置observation_space的形状
             dtype=np.uint8 # 设置observation_space的数据类型
         )
 
@@ -26,6 +31,17 @@ class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
         self.init_snake_size = len(self.game.snake)
         self.max_growth = self.grid_size - self.init_snake_size
 
+        # Precompute the gather index map from each observation pixel to its board cell (flattened),
+        # so that any board size is scaled to OBS_SIZE x OBS_SIZE with a single fancy-indexing operation.
+        assert board_size <= OBS_SIZE, f"board_size must not exceed {OBS_SIZE}."
+        pixel_to_cell = np.arange(OBS_SIZE) * board_size // OBS_SIZE # 每个像素对应的格子坐标
+        self.obs_index_map = pixel_to_cell[:, None] * board_size + pixel_to_cell[None, :] # (OBS_SIZE, OBS_SIZE)
+
+        # Every episode starts with the same snake, so its part of the first observation is built once and copied on reset.
+        # Each board cell covers a contiguous block of pixels, whose bounds are kept to paint the food into the copy.
+        self.cell_pixel_bounds = np.searchsorted(pixel_to_cell, np.arange(board_size + 1)) # 每个格子的像素边界
+        self.initial_obs = self._generate_snake_board().reshape(-1, 3)[self.obs_index_map] # 初始蛇的图像模板
+
         self.done = False # 设置done
 
         if limit_step: # 如果limit_step为True
@@ -34,18 +50,50 @@ class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
             self.step_limit = 1e9 # Basically no limit.
         self.reward_step_counter = 0
 
+        # Repeating an exact state since the last food means the snake is circling. "end": the episode ends as if the
+        # step limit was reached, "penalize": CYCLE_PENALTY is subtracted from the reward of every repeated state.
+        assert cycle_detection in (None, "end", "penalize"), f"Unknown cycle_detection: {cycle_detection}"
+        self.cycle_detection = cycle_detection
+        self.cycle_detector = CycleDetector(board_size) if cycle_detection else None
+
+        # With macro_steps > 1, an action keeps the snake moving in its direction until the next decision point
+        # (see macro_actions.py), for at most macro_steps game steps, and returns the summed rewards.
+        self.macro_steps = macro_steps
+        self.macro_gamma = macro_gamma
+
+        # Optional StartStatePool (see start_state_pool.py): resets may restore a saved mid-game or late-game state.
+        self.start_state_pool = start_state_pool
+
     def reset(self):
         self.game.reset() # 重置游戏
+        restored = self.start_state_pool is not None and self.start_state_pool.restore_start(self.game)
 
         self.done = False # 设置done
         self.reward_step_counter = 0 # 设置reward_step_counter
+        if self.cycle_detector is not None:
+            self.cycle_detector.reset(self.game.snake, self.game.food)
+        if restored:
+            return self._generate_observation()
 
-        obs = self._generate_observation() # 生成observation
+        obs = self.initial_obs.copy() # 复制初始图像模板
+        row, col = self.game.food
+        bounds = self.cell_pixel_bounds
+        obs[bounds[row]:bounds[row + 1], bounds[col]:bounds[col + 1]] = [0, 0, 255] # 设置食物颜色
         return obs
     
     def step(self, action):
+        if self.macro_steps > 1:
+            obs, reward, done, info = macro_step(self, action, self.macro_steps, self.macro_gamma)
+        else:
+            obs, reward, done, info = self.primitive_step(action)
+        if self.start_state_pool is not None:
+            self.start_state_pool.observe(self.game, done, info)
+        return obs, reward, done, info
+
+    def primitive_step(self, action, observe=True):
+        tail = self.game.snake[-1]
         self.done, info = self.game.step(action) # info = {"snake_size": int, "snake_head_pos": np.array, "prev_snake_head_pos": np.array, "food_pos": np.array, "food_obtained": bool}
-        obs = self._generate_observation() # 生成observation
+        obs = self._generate_observation() if observe else None # 生成observation
 
         reward = 0.0 # 设置reward
         self.reward_step_counter += 1 # 增加reward_step_counter
@@ -55,8 +103,13 @@ class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
             self.done = True # 设置done
             if not self.silent_mode: # 如果silent_mode为False
                 self.game.sound_victory.play() # 播放胜利音效
+            info["repeated_state"] = False # Same info keys as every other step, and as the MLP env.
             return obs, reward, self.done, info
         
+        info["repeated_state"] = self._repeats_state(tail, info)
+        if info["repeated_state"] and self.cycle_detection == "end":
+            self.done = True
+
         if self.reward_step_counter > self.step_limit: # Step limit reached, game over.
             self.reward_step_counter = 0 # 重置reward_step_counter
             self.done = True # 设置done
@@ -83,12 +136,21 @@ class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
         # max_score: 72 + 14.1 = 86.1
         # min_score: -14.1
 
+        if info["repeated_state"]:
+            reward -= CYCLE_PENALTY
         return obs, reward, self.done, info
+
+    def _repeats_state(self, tail, info):
+        if self.cycle_detector is None or self.done:
+            return False
+        return self.cycle_detector.update(self.game.snake[0], tail, info["food_obtained"], self.game.food)
     
     def render(self):
         self.game.render() # 渲染游戏
 
     def get_action_mask(self): # 获取动作掩码
+        if self.game.backend == "numba":
+            return self.game.action_mask()
         return np.array([[self._check_action_validity(a) for a in range(self.action_space.n)]])
     
     # Check if the action is against the current direction of the snake or is ending the game.
@@ -145,6 +207,20 @@ class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
 
     # EMPTY: BLACK; SnakeBODY: GRAY; SnakeHEAD: GREEN; FOOD: RED;
     def _generate_observation(self): # 生成observation
+        obs = self._generate_snake_board() # 生成蛇的图像
+
+        # Set the food to red
+        obs[self.game.food] = [0, 0, 255] # 设置食物颜色
+
+        # Enlarge the observation to OBS_SIZE x OBS_SIZE by gathering board cells through the precomputed index map.
+        obs = obs.reshape(-1, 3)[self.obs_index_map] # 按索引表放大图像
+
+        return obs
+
+    def _generate_snake_board(self): # 生成蛇的图像
+        if self.game.backend == "numba":
+            return self.game.kernels.cnn_board(self.game.state, self.game.body)
+
         obs = np.zeros((self.game.board_size, self.game.board_size), dtype=np.uint8) # 创建一个全0的矩阵
 
         # Set the snake body to gray with linearly decreasing intensity from head to tail.
@@ -157,12 +233,6 @@ class SnakeEnv(gym.Env): # 创建一个SnakeEnv类，继承自gym.Env
         obs[tuple(self.game.snake[0])] = [0, 255, 0] # 设置蛇头颜色
         obs[tuple(self.game.snake[-1])] = [255, 0, 0] # 设置蛇尾颜色
 
-        # Set the food to red
-        obs[self.game.food] = [0, 0, 255] # 设置食物颜色
-
-        # Enlarge the observation to 84x84
-        obs = np.repeat(np.repeat(obs, 7, axis=0), 7, axis=1) # 将图像重复7次
-
         return obs
 
 # Test the environment using random actions
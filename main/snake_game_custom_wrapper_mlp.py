@@ -4,27 +4,49 @@ import time # For debugging.
 import gym
 import numpy as np
 
-from snake_game import SnakeGame
+from snake_core import make_game
+from cycle_detector import CycleDetector
+from macro_actions import macro_step
+
+# Ray directions as (row, col) offsets: the four actions UP, LEFT, RIGHT, DOWN followed by the four diagonals.
+RAY_DIRECTIONS = [(-1, 0), (0, -1), (0, 1), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+DIRECTIONS = ["UP", "LEFT", "RIGHT", "DOWN"]
+# 8 ray distances, food offset (2), tail offset (2), free cells above/left/right/below the head (4), direction (4), length (1).
+NUM_FEATURES = len(RAY_DIRECTIONS) + 2 + 2 + 4 + len(DIRECTIONS) + 1
+CYCLE_PENALTY = 0.1 # Larger than any heading-towards-food reward, see cycle_detection.
 
 class SnakeEnv(gym.Env):
-    def __init__(self, seed=0, board_size=12, silent_mode=True, limit_step=True):
+    def __init__(self, seed=0, board_size=12, silent_mode=True, limit_step=True, obs_mode="board", cycle_detection=None, backend="python", macro_steps=1, macro_gamma=1.0, start_state_pool=None):
         super().__init__()
-        self.game = SnakeGame(seed=seed, board_size=board_size, silent_mode=silent_mode)
+        self.game = make_game(backend, seed=seed, board_size=board_size, silent_mode=silent_mode) # "python" or "numba", see snake_core.py
         self.game.reset()
 
         self.action_space = gym.spaces.Discrete(4) # 0: UP, 1: LEFT, 2: RIGHT, 3: DOWN
-        
-        self.observation_space = gym.spaces.Box(
-            low=-1, high=1,
-            shape=(self.game.board_size, self.game.board_size),
-            dtype=np.float32
-        ) # 0: empty, 0.5: snake body, 1: snake head, -1: food
+
+        self.obs_mode = obs_mode
+        if obs_mode == "features":
+            # Fixed-size engineered feature vector, independent of the board size.
+            self.observation_space = gym.spaces.Box(
+                low=-1, high=1,
+                shape=(NUM_FEATURES,),
+                dtype=np.float32
+            )
+            self._init_feature_tables(board_size)
+        else:
+            self.observation_space = gym.spaces.Box(
+                low=-1, high=1,
+                shape=(self.game.board_size, self.game.board_size),
+                dtype=np.float32
+            ) # 0: empty, 0.5: snake body, 1: snake head, -1: food
 
         self.board_size = board_size
         self.grid_size = board_size ** 2 # Max length of snake is board_size^2
         self.init_snake_size = len(self.game.snake)
         self.max_growth = self.grid_size - self.init_snake_size
 
+        # Every episode starts with the same snake, so its part of the first observation is built once and copied on reset.
+        self.initial_board = self._generate_snake_board()
+
         self.done = False
 
         if limit_step:
@@ -33,22 +55,57 @@ class SnakeEnv(gym.Env):
             self.step_limit = 1e9 # Basically no limit.
         self.reward_step_counter = 0
 
+        # Repeating an exact state since the last food means the snake is circling. "end": the episode ends as if the
+        # step limit was reached, "penalize": CYCLE_PENALTY is subtracted from the reward of every repeated state.
+        assert cycle_detection in (None, "end", "penalize"), f"Unknown cycle_detection: {cycle_detection}"
+        self.cycle_detection = cycle_detection
+        self.cycle_detector = CycleDetector(board_size) if cycle_detection else None
+
+        # With macro_steps > 1, an action keeps the snake moving in its direction until the next decision point
+        # (see macro_actions.py), for at most macro_steps game steps, and returns the summed rewards.
+        self.macro_steps = macro_steps
+        self.macro_gamma = macro_gamma
+
+        # Optional StartStatePool (see start_state_pool.py): resets may restore a saved mid-game or late-game state.
+        self.start_state_pool = start_state_pool
+
     def reset(self):
         self.game.reset()
+        restored = self.start_state_pool is not None and self.start_state_pool.restore_start(self.game)
 
         self.done = False
         self.reward_step_counter = 0
+        if self.cycle_detector is not None:
+            self.cycle_detector.reset(self.game.snake, self.game.food)
+
+        if self.obs_mode == "features" or restored:
+            return self._generate_observation()
 
-        obs = self._generate_observation()
+        obs = self.initial_board.copy()
+        obs[tuple(self.game.food)] = -1.0
         return obs
     
     def step(self, action):
+        if self.macro_steps > 1:
+            obs, reward, done, info = macro_step(self, action, self.macro_steps, self.macro_gamma)
+        else:
+            obs, reward, done, info = self.primitive_step(action)
+        if self.start_state_pool is not None:
+            self.start_state_pool.observe(self.game, done, info)
+        return obs, reward, done, info
+
+    def primitive_step(self, action, observe=True):
+        tail = self.game.snake[-1]
         self.done, info = self.game.step(action) # info = {"snake_size": int, "snake_head_pos": np.array, "prev_snake_head_pos": np.array, "food_pos": np.array, "food_obtained": bool}
-        obs = self._generate_observation()
+        obs = self._generate_observation() if observe else None
 
         reward = 0.0
         self.reward_step_counter += 1
 
+        info["repeated_state"] = self._repeats_state(tail, info)
+        if info["repeated_state"] and self.cycle_detection == "end":
+            self.done = True
+
         if self.reward_step_counter > self.step_limit: # Step limit reached, game over.
             self.reward_step_counter = 0
             self.done = True
@@ -83,12 +140,21 @@ class SnakeEnv(gym.Env):
         # min_score: -141
 
         reward = reward * 0.1 # Scale reward
+        if info["repeated_state"]:
+            reward -= CYCLE_PENALTY
         return obs, reward, self.done, info
+
+    def _repeats_state(self, tail, info):
+        if self.cycle_detector is None or self.done:
+            return False
+        return self.cycle_detector.update(self.game.snake[0], tail, info["food_obtained"], self.game.food)
     
     def render(self):
         self.game.render()
 
     def get_action_mask(self):
+        if self.game.backend == "numba":
+            return self.game.action_mask()
         return np.array([[self._check_action_validity(a) for a in range(self.action_space.n)]])
     
     # Check if the action is against the current direction of the snake or is ending the game.
@@ -145,12 +211,71 @@ class SnakeEnv(gym.Env):
 
     # EMPTY: 0; SnakeBODY: 0.5; SnakeHEAD: 1; FOOD: -1;
     def _generate_observation(self):
+        if self.obs_mode == "features":
+            return self._generate_features()
+
+        obs = self._generate_snake_board()
+        obs[tuple(self.game.food)] = -1.0
+        return obs
+
+    def _generate_snake_board(self):
+        if self.game.backend == "numba":
+            return self.game.kernels.mlp_board(self.game.state, self.game.body)
         obs = np.zeros((self.game.board_size, self.game.board_size), dtype=np.float32)
         obs[tuple(np.transpose(self.game.snake))] = np.linspace(0.8, 0.2, len(self.game.snake), dtype=np.float32)
-        obs[tuple(self.game.snake[0])] = 1.0            
-        obs[tuple(self.game.food)] = -1.0
+        obs[tuple(self.game.snake[0])] = 1.0
         return obs
 
+    def _init_feature_tables(self, board_size):
+        # Occupancy grid padded with a border of walls, so every ray ends on an obstacle.
+        padded_size = board_size + 2
+        self.occupancy = np.ones((padded_size, padded_size), dtype=bool)
+
+        # ray_index[cell, direction, k - 1] is the padded flat index of the k-th cell along the ray from the cell.
+        # Rays are clamped at the border, so the first obstacle is always found within board_size steps.
+        rows, cols = np.divmod(np.arange(board_size ** 2), board_size)
+        steps = np.arange(1, board_size + 1)
+        offsets = np.array(RAY_DIRECTIONS)
+        ray_rows = np.clip(rows[:, None, None] + 1 + offsets[None, :, 0, None] * steps, 0, padded_size - 1)
+        ray_cols = np.clip(cols[:, None, None] + 1 + offsets[None, :, 1, None] * steps, 0, padded_size - 1)
+        self.ray_index = ray_rows * padded_size + ray_cols # (grid_size, 8, board_size)
+
+    # Ray distances to obstacles, food and tail offsets, free-cell counts, direction and length, all in [-1, 1].
+    def _generate_features(self):
+        board_size = self.game.board_size
+        snake = np.array(self.game.snake)
+        head_row, head_col = snake[0]
+
+        # The body without the tail is the set of obstacles for the next move.
+        interior = self.occupancy[1:-1, 1:-1]
+        interior[:] = False
+        interior[snake[:-1, 0], snake[:-1, 1]] = True
+
+        features = np.empty(NUM_FEATURES, dtype=np.float32)
+        if 0 <= head_row < board_size and 0 <= head_col < board_size:
+            rays = self.occupancy.ravel()[self.ray_index[head_row * board_size + head_col]] # (8, board_size)
+            features[0:8] = (rays.argmax(axis=1) + 1) / board_size
+        else:
+            features[0:8] = 0.0
+
+        features[8:10] = (np.array(self.game.food) - snake[0]) / board_size
+        features[10:12] = (snake[-1] - snake[0]) / board_size
+
+        # Free cells in the half-planes above, left of, right of and below the head.
+        free = ~interior
+        free_rows = free.sum(axis=1)
+        free_cols = free.sum(axis=0)
+        features[12] = free_rows[:head_row].sum()
+        features[13] = free_cols[:head_col].sum()
+        features[14] = free_cols[head_col + 1:].sum()
+        features[15] = free_rows[head_row + 1:].sum()
+        features[12:16] /= self.grid_size
+
+        features[16:20] = 0.0
+        features[16 + DIRECTIONS.index(self.game.direction)] = 1.0
+        features[20] = len(snake) / self.grid_size
+        return features
+
 # Test the environment using random actions
 # NUM_EPISODES = 100
 # RENDER_DELAY = 0.001
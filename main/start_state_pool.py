@@ -0,0 +1,187 @@
+import argparse
+from collections import deque
+
+import numpy as np
+
+from snake_core import DIRECTIONS
+
+# Start-state pool for endgame-focused training. With probability reset_prob, an env reset restores a saved mid-game
+# or late-game state instead of the 3-cell start. States are recorded from the env's own episodes, and the ones that
+# preceded a failure get the highest scores. Sampling follows prioritized level replay: rank-based priorities on the
+# scores, mixed with a staleness term so that every state is revisited and its score refreshed.
+#
+# The pool has a fixed capacity and stores every state as a flat int16 body (head first), direction, food and score,
+# so memory is capacity * (board_size^2 + 3) * 2 bytes whatever the states. When full, a new state replaces the one
+# with the lowest score if it scores higher. Each env owns its pool: in SubprocVecEnv every worker keeps its own.
+
+class StartStatePool:
+    def __init__(self, board_size=12, capacity=1024, reset_prob=0.5, min_length=None, record_interval=16,
+                 failure_window=64, temperature=0.1, staleness_coef=0.1, score_rate=0.5, path=None, seed=0):
+        self.board_size = board_size
+        self.grid_size = board_size ** 2
+        self.capacity = capacity
+        self.reset_prob = reset_prob
+        self.min_length = min_length if min_length is not None else self.grid_size // 4 # Only mid-game and later.
+        self.record_interval = record_interval
+        self.failure_window = failure_window # Steps before a failure whose states are scored as failed from.
+        self.temperature = temperature
+        self.staleness_coef = staleness_coef
+        self.score_rate = score_rate
+        self.rng = np.random.default_rng(seed)
+
+        self.bodies = np.zeros((capacity, self.grid_size), dtype=np.int16)
+        self.lengths = np.zeros(capacity, dtype=np.int16)
+        self.directions = np.zeros(capacity, dtype=np.int16)
+        self.foods = np.zeros(capacity, dtype=np.int16)
+        self.game_scores = np.zeros(capacity, dtype=np.int16)
+        self.scores = np.zeros(capacity, dtype=np.float32)
+        self.last_sampled = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.num_samples = 0
+
+        # Current episode of the env that owns the pool.
+        self.start_index = None
+        self.episode_steps = 0
+        self.pending = deque(maxlen=failure_window // record_interval + 1) # (step, snapshot), most recent last.
+        if path is not None:
+            self.load(path)
+
+    def __len__(self):
+        return self.size
+
+    def snapshot(self, game):
+        snake = np.array(game.snake, dtype=np.int16).reshape(-1, 2)
+        body = snake[:, 0] * self.board_size + snake[:, 1]
+        food_row, food_col = game.food
+        return body, DIRECTIONS.index(game.direction), food_row * self.board_size + food_col, game.score
+
+    def add(self, snapshot, score):
+        if self.size < self.capacity:
+            index = self.size
+            self.size += 1
+        else:
+            index = int(self.scores.argmin())
+            if score <= self.scores[index]:
+                return
+        self._put(index, snapshot, score)
+
+    def _put(self, index, snapshot, score):
+        body, direction, food, game_score = snapshot
+        self.bodies[index, :len(body)] = body
+        self.lengths[index] = len(body)
+        self.directions[index] = direction
+        self.foods[index] = food
+        self.game_scores[index] = game_score
+        self.scores[index] = score
+        self.last_sampled[index] = self.num_samples # New states are not stale.
+
+    def sample(self):
+        # P = (1 - staleness_coef) * P_score + staleness_coef * P_staleness, with P_score ~ (1 / rank) ^ (1 / temperature).
+        ranks = np.empty(self.size)
+        ranks[np.argsort(-self.scores[:self.size], kind="stable")] = np.arange(1, self.size + 1)
+        weights = (1 / ranks) ** (1 / self.temperature)
+        probs = (1 - self.staleness_coef) * weights / weights.sum()
+        staleness = (self.num_samples - self.last_sampled[:self.size]).astype(np.float64)
+        probs += self.staleness_coef * (staleness / staleness.sum() if staleness.sum() > 0 else 1 / self.size)
+        index = int(self.rng.choice(self.size, p=probs / probs.sum()))
+        self.num_samples += 1
+        self.last_sampled[index] = self.num_samples
+        return index
+
+    def restore_start(self, game):
+        # Called right after game.reset(). Returns True if the game now starts from a pool state.
+        self.start_index = None
+        self.episode_steps = 0
+        self.pending.clear()
+        if self.size == 0 or self.rng.random() >= self.reset_prob:
+            return False
+        index = self.sample()
+        body = self.bodies[index, :self.lengths[index]].astype(np.int64)
+        rows, cols = np.divmod(body, self.board_size)
+        game.set_state(
+            list(zip(rows.tolist(), cols.tolist())), DIRECTIONS[self.directions[index]],
+            divmod(int(self.foods[index]), self.board_size), int(self.game_scores[index]),
+        )
+        self.start_index = index
+        return True
+
+    def observe(self, game, done, info):
+        # Called after every env step: records candidate states and scores them once the episode ends.
+        self.episode_steps += 1
+        if not done:
+            if len(game.snake) >= self.min_length and self.episode_steps % self.record_interval == 0:
+                self.pending.append((self.episode_steps, self.snapshot(game)))
+            return
+
+        failed = info["snake_size"] < self.grid_size
+        if self.start_index is not None:
+            score = self.scores[self.start_index]
+            self.scores[self.start_index] = score + self.score_rate * (float(failed) - score)
+        for step, snapshot in self.pending:
+            # 1 for the state right before the failure, down to 0 failure_window steps earlier, and 0 without failure.
+            score = max(0.0, 1 - (self.episode_steps - step) / self.failure_window) if failed else 0.0
+            self.add(snapshot, score)
+        self.pending.clear()
+
+    def save(self, path):
+        np.savez_compressed(
+            path, board_size=self.board_size, bodies=self.bodies[:self.size], lengths=self.lengths[:self.size],
+            directions=self.directions[:self.size], foods=self.foods[:self.size],
+            game_scores=self.game_scores[:self.size], scores=self.scores[:self.size],
+        )
+
+    def load(self, path):
+        data = np.load(path)
+        assert int(data["board_size"]) == self.board_size, f"{path} holds states of a different board size."
+        for i in range(len(data["lengths"])):
+            length = data["lengths"][i]
+            snapshot = (data["bodies"][i, :length], data["directions"][i], data["foods"][i], data["game_scores"][i])
+            self.add(snapshot, float(data["scores"][i]))
+
+def fill_from_agent(pool, agent_name, num_episodes, seed=0, score=0.5):
+    # Mid-game and late-game states of scripted-agent games, reservoir-sampled so that they spread over all episodes.
+    from demonstrations import make_agent
+    from snake_game import SnakeGame
+
+    agent = make_agent(agent_name, pool.board_size)
+    rng = np.random.default_rng(seed)
+    seen = 0
+    for episode in range(num_episodes):
+        game = SnakeGame(seed=seed * 10 ** 6 + episode, board_size=pool.board_size)
+        done = False
+        step = 0
+        while not done and len(game.snake) < pool.grid_size:
+            done, _ = game.step(agent.act(game))
+            step += 1
+            if done or len(game.snake) < pool.min_length or len(game.snake) == pool.grid_size or step % pool.record_interval:
+                continue
+            seen += 1
+            if pool.size < pool.capacity:
+                pool.add(pool.snapshot(game), score)
+            else:
+                index = rng.integers(seen)
+                if index < pool.capacity:
+                    pool._put(index, pool.snapshot(game), score)
+    return seen
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a start-state pool file with scripted-agent game states.")
+    parser.add_argument("out", help="Output .npz, passed to the envs through START_POOL_PATH in the training scripts.")
+    parser.add_argument("--agent", choices=["hamiltonian", "shortcut"], default="shortcut")
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--capacity", type=int, default=1024)
+    parser.add_argument("--board-size", type=int, default=12)
+    parser.add_argument("--min-length", type=int, default=None, help="Default: a quarter of the board.")
+    parser.add_argument("--record-interval", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pool = StartStatePool(args.board_size, args.capacity, min_length=args.min_length, record_interval=args.record_interval)
+    seen = fill_from_agent(pool, args.agent, args.episodes, args.seed)
+    pool.save(args.out)
+    lengths = pool.lengths[:pool.size]
+    print(f"{pool.size} of {seen} recorded states saved to {args.out}, snake length {lengths.min()}-{lengths.max()} "
+          f"(mean {lengths.mean():.0f}).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import argparse
+import subprocess
+
+# Successive-halving hyperparameter sweep. Every trial rung runs in its own process, pinned to a fixed set of
+# cores. After each rung, only the best 1/eta trials are trained further with eta times the budget.
+
+SEARCH_SPACE = {
+    "lr_initial": [1e-4, 2.5e-4, 5e-4, 1e-3],
+    "lr_final": [2.5e-6, 2.5e-5],
+    "clip_initial": [0.1, 0.15, 0.2, 0.3],
+    "clip_final": [0.025, 0.05],
+    "gamma": [0.9, 0.94, 0.97, 0.99],
+    "n_steps": [256, 512, 1024, 2048],
+    "batch_size": [128, 256, 512],
+    "n_epochs": [2, 4, 8],
+}
+
+def sample_configs(num_trials, seed):
+    # Distinct configurations, so there can be no more trials than points in the grid.
+    grid_size = math.prod(len(values) for values in SEARCH_SPACE.values())
+    if num_trials > grid_size:
+        raise ValueError(f"{num_trials} trials requested but SEARCH_SPACE only has {grid_size} distinct configurations.")
+    rng = random.Random(seed)
+    configs = []
+    while len(configs) < num_trials:
+        config = {name: rng.choice(values) for name, values in SEARCH_SPACE.items()}
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+def scaled_schedule(schedule, end_timesteps, total_timesteps):
+    # SB3 computes progress relative to the end of the current learn() call. Rescale it so that the
+    # schedules of a resumed trial follow the horizon of the whole sweep instead of the current rung.
+    def scheduler(progress):
+        return schedule(1 - (1 - progress) * end_timesteps / total_timesteps)
+    return scheduler
+
+def run_trial(spec):
+    # Train one trial up to spec["end_timesteps"] (resuming its checkpoint) and evaluate it.
+    if spec["cores"] and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, spec["cores"])
+    num_threads = max(len(spec["cores"]), 1)
+
+    import torch
+    from sb3_contrib import MaskablePPO
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from lean_vec_env import LeanSubprocVecEnv
+    from evaluation import evaluate_seeds, summarize
+    if spec["env"] == "mlp":
+        from train_mlp import make_env, linear_schedule
+    else:
+        from train_cnn import make_env, linear_schedule
+
+    torch.set_num_threads(num_threads)
+    config = spec["config"]
+    env_fns = [make_env(seed=spec["seed"] * 1000 + i) for i in range(spec["num_envs"])]
+    env = LeanSubprocVecEnv(env_fns) if num_threads > 1 else DummyVecEnv(env_fns)
+
+    lr_schedule = scaled_schedule(linear_schedule(config["lr_initial"], config["lr_final"]), spec["end_timesteps"], spec["total_timesteps"])
+    clip_range_schedule = scaled_schedule(linear_schedule(config["clip_initial"], config["clip_final"]), spec["end_timesteps"], spec["total_timesteps"])
+
+    checkpoint_path = os.path.join(spec["trial_dir"], "model.zip")
+    start_time = time.perf_counter()
+    if os.path.exists(checkpoint_path):
+        model = MaskablePPO.load(
+            checkpoint_path, env=env, device="cpu",
+            custom_objects={"learning_rate": lr_schedule, "lr_schedule": lr_schedule, "clip_range": clip_range_schedule},
+        )
+    else:
+        model = MaskablePPO(
+            "CnnPolicy" if spec["env"] == "cnn" else "MlpPolicy",
+            env,
+            device="cpu",
+            n_steps=config["n_steps"],
+            batch_size=config["batch_size"],
+            n_epochs=config["n_epochs"],
+            gamma=config["gamma"],
+            learning_rate=lr_schedule,
+            clip_range=clip_range_schedule,
+            seed=spec["seed"],
+        )
+    model.learn(total_timesteps=spec["end_timesteps"] - model.num_timesteps, reset_num_timesteps=False)
+    train_time = time.perf_counter() - start_time
+    model.save(checkpoint_path)
+    env.close()
+
+    summary = summarize(evaluate_seeds(model.predict, spec["env"], spec["eval_seeds"]))
+    summary.update({"timesteps": int(model.num_timesteps), "train_time": train_time})
+    return summary
+
+def _core_slots(cores_per_trial, max_parallel):
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    slots = [available[i:i + cores_per_trial] for i in range(0, len(available) - cores_per_trial + 1, cores_per_trial)]
+    return slots[:max_parallel] or [available[:cores_per_trial]]
+
+def run_rung(specs, slots):
+    # Launch trial processes, at most one per core slot, and collect their results.
+    pending = list(specs)
+    running = {} # slot index -> (process, spec, log_file)
+    results = {}
+    while pending or running:
+        for slot_index, cores in enumerate(slots):
+            if slot_index not in running and pending:
+                spec = pending.pop(0)
+                spec["cores"] = cores
+                result_path = os.path.join(spec["trial_dir"], "result.json")
+                if os.path.exists(result_path): # Left over from the previous rung.
+                    os.remove(result_path)
+                spec_path = os.path.join(spec["trial_dir"], "spec.json")
+                with open(spec_path, "w") as spec_file:
+                    json.dump(spec, spec_file)
+                log_file = open(os.path.join(spec["trial_dir"], "trial_log.txt"), "a")
+                process = subprocess.Popen([sys.executable, __file__, "trial", spec_path], stdout=log_file, stderr=subprocess.STDOUT)
+                running[slot_index] = (process, spec, log_file)
+        time.sleep(0.5)
+        for slot_index, (process, spec, log_file) in list(running.items()):
+            if process.poll() is not None:
+                log_file.close()
+                del running[slot_index]
+                result_path = os.path.join(spec["trial_dir"], "result.json")
+                if process.returncode == 0 and os.path.exists(result_path):
+                    with open(result_path) as result_file:
+                        results[spec["trial"]] = json.load(result_file)
+                else:
+                    print(f"Trial {spec['trial']} failed, see {spec['trial_dir']}/trial_log.txt")
+                    results[spec["trial"]] = None
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel successive-halving sweep over PPO hyperparameters.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sweep_parser = subparsers.add_parser("run")
+    sweep_parser.add_argument("--env", choices=["cnn", "mlp"], default="mlp")
+    sweep_parser.add_argument("--trials", type=int, default=27)
+    sweep_parser.add_argument("--min-timesteps", type=int, default=100000, help="Budget of every trial in the first rung.")
+    sweep_parser.add_argument("--eta", type=int, default=3, help="Keep the best 1/eta trials and multiply their budget by eta.")
+    sweep_parser.add_argument("--rungs", type=int, default=3)
+    sweep_parser.add_argument("--parallel", type=int, default=os.cpu_count(), help="Maximum trials running at once.")
+    sweep_parser.add_argument("--cores-per-trial", type=int, default=1)
+    sweep_parser.add_argument("--num-envs", type=int, default=8, help="Envs per trial.")
+    sweep_parser.add_argument("--eval-episodes", type=int, default=20)
+    sweep_parser.add_argument("--seed", type=int, default=0)
+    sweep_parser.add_argument("--out", default="sweeps/sweep")
+
+    trial_parser = subparsers.add_parser("trial") # Internal: one trial rung in a separate process.
+    trial_parser.add_argument("spec")
+
+    args = parser.parse_args()
+    if args.command == "trial":
+        with open(args.spec) as spec_file:
+            spec = json.load(spec_file)
+        result = run_trial(spec)
+        with open(os.path.join(spec["trial_dir"], "result.json"), "w") as result_file:
+            json.dump(result, result_file)
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    configs = sample_configs(args.trials, args.seed)
+    eval_seeds = [10 ** 6 + args.seed * 1000 + i for i in range(args.eval_episodes)] # Shared by every trial.
+    total_timesteps = args.min_timesteps * args.eta ** (args.rungs - 1)
+    slots = _core_slots(args.cores_per_trial, args.parallel)
+    print(f"{args.trials} trials, {args.rungs} rungs, {len(slots)} parallel slots of {args.cores_per_trial} core(s).")
+
+    table_path = os.path.join(args.out, "results.csv")
+    fieldnames = ["trial", "rung", "timesteps", "episodes", "mean_score", "std_score", "win_rate", "mean_steps", "train_time"] + list(SEARCH_SPACE)
+    with open(table_path, "w", newline="") as table_file:
+        csv.DictWriter(table_file, fieldnames=fieldnames).writeheader()
+
+    survivors = list(range(len(configs)))
+    final_results = {}
+    for rung in range(args.rungs):
+        end_timesteps = args.min_timesteps * args.eta ** rung
+        specs = []
+        for trial in survivors:
+            trial_dir = os.path.join(args.out, f"trial_{trial:03d}")
+            os.makedirs(trial_dir, exist_ok=True)
+            specs.append({
+                "trial": trial, "trial_dir": trial_dir, "config": configs[trial], "env": args.env,
+                "seed": args.seed * 1000 + trial, "num_envs": args.num_envs, "eval_seeds": eval_seeds,
+                "end_timesteps": end_timesteps, "total_timesteps": total_timesteps,
+            })
+
+        start_time = time.perf_counter()
+        results = run_rung(specs, slots)
+        print(f"Rung {rung}: {len(specs)} trials at {end_timesteps} steps in {time.perf_counter() - start_time:.1f}s")
+
+        with open(table_path, "a", newline="") as table_file:
+            writer = csv.DictWriter(table_file, fieldnames=fieldnames)
+            for trial, result in results.items():
+                if result is not None:
+                    writer.writerow({"trial": trial, "rung": rung, **result, **configs[trial]})
+                    final_results[trial] = (rung, result)
+
+        # Promote the best 1/eta trials to the next rung.
+        scored = sorted((t for t in survivors if results.get(t) is not None), key=lambda t: results[t]["mean_score"], reverse=True)
+        survivors = scored[:max(1, math.ceil(len(scored) / args.eta))]
+
+    print(f"{'trial':>5} {'rung':>4} {'timesteps':>10} {'mean_score':>10} {'win_rate':>8}  config")
+    ranked = sorted(final_results.items(), key=lambda item: (item[1][0], item[1][1]["mean_score"]), reverse=True)
+    for trial, (rung, result) in ranked:
+        print(f"{trial:>5} {rung:>4} {result['timesteps']:>10} {result['mean_score']:>10.1f} {result['win_rate']:>8.2f}  {configs[trial]}")
+    print(f"Full table: {table_path}")
+
+if __name__ == "__main__":
+    main()
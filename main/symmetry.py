@@ -0,0 +1,77 @@
+import numpy as np
+
+# The 8 symmetries of the square board (the dihedral group D4), applied to batches of observations, action
+# masks and actions. Actions are 0: UP, 1: LEFT, 2: RIGHT, 3: DOWN, as in SnakeGame.step.
+# Numpy only, so it can be used by env workers and evaluation scripts without importing torch.
+
+SYMMETRY_NAMES = ["identity", "rot90", "rot180", "rot270", "flip_lr", "flip_ud", "transpose", "anti_transpose"]
+NUM_SYMMETRIES = len(SYMMETRY_NAMES)
+
+# (row, col) offset of every action.
+ACTION_OFFSETS = [(-1, 0), (0, -1), (0, 1), (1, 0)]
+
+def transform_board(boards, symmetry, axes=(-2, -1)):
+    # Apply symmetry to the two spatial axes of a batch. Returns a view whenever numpy can.
+    row_axis, col_axis = axes
+    if symmetry == 0:
+        return boards
+    if symmetry == 1:
+        return np.rot90(boards, 1, axes=axes)
+    if symmetry == 2:
+        return np.rot90(boards, 2, axes=axes)
+    if symmetry == 3:
+        return np.rot90(boards, 3, axes=axes)
+    if symmetry == 4:
+        return np.flip(boards, axis=col_axis)
+    if symmetry == 5:
+        return np.flip(boards, axis=row_axis)
+    if symmetry == 6:
+        return np.swapaxes(boards, row_axis, col_axis)
+    return np.rot90(np.swapaxes(boards, row_axis, col_axis), 2, axes=axes)
+
+def _action_permutations():
+    # Move a marker one cell away from the centre of a 3x3 board and see where each symmetry puts it.
+    permutations = np.zeros((NUM_SYMMETRIES, len(ACTION_OFFSETS)), dtype=np.int64)
+    for symmetry in range(NUM_SYMMETRIES):
+        for action, (row, col) in enumerate(ACTION_OFFSETS):
+            board = np.zeros((3, 3))
+            board[1 + row, 1 + col] = 1
+            new_row, new_col = np.argwhere(transform_board(board, symmetry))[0] - 1
+            permutations[symmetry, action] = ACTION_OFFSETS.index((new_row, new_col))
+    return permutations
+
+# ACTION_PERMUTATIONS[s, a]: the action that plays the role of a on the board transformed by s.
+ACTION_PERMUTATIONS = _action_permutations()
+# INVERSE_PERMUTATIONS[s, a]: the original action behind action a on the transformed board.
+INVERSE_PERMUTATIONS = np.argsort(ACTION_PERMUTATIONS, axis=1)
+
+def spatial_axes(obs_shape):
+    # Spatial axes of a snake observation: (H, W) boards, (H, W, C) CNN frames or (C, H, W) transposed frames.
+    if len(obs_shape) == 2:
+        return (-2, -1)
+    if len(obs_shape) == 3:
+        return (-3, -2) if obs_shape[-1] in (1, 3) and obs_shape[0] not in (1, 3) else (-2, -1)
+    raise ValueError(f"Observations of shape {obs_shape} are not boards and have no board symmetries.")
+
+def transform_actions(actions, symmetry):
+    return ACTION_PERMUTATIONS[symmetry][np.asarray(actions, dtype=np.int64)]
+
+def transform_masks(masks, symmetry):
+    # Column a of the result is the mask of the original action INVERSE_PERMUTATIONS[s, a].
+    return np.asarray(masks)[..., INVERSE_PERMUTATIONS[symmetry]]
+
+def transform_batch(obs, masks, actions, symmetry, axes=None):
+    # One symmetry applied consistently to a batch of (obs, mask, action) samples.
+    if axes is None:
+        axes = spatial_axes(obs.shape[1:])
+    return (
+        np.ascontiguousarray(transform_board(obs, symmetry, axes)),
+        transform_masks(masks, symmetry),
+        transform_actions(actions, symmetry),
+    )
+
+def all_symmetries(obs, axes=None):
+    # (8, *obs.shape): every symmetric copy of a single observation or of a batch.
+    if axes is None:
+        axes = spatial_axes(obs.shape)
+    return np.stack([transform_board(obs, symmetry, axes) for symmetry in range(NUM_SYMMETRIES)])
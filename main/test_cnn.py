@@ -2,7 +2,6 @@ import time
 import random
 
 import torch
-from sb3_contrib import MaskablePPO
 
 from snake_game_custom_wrapper_cnn import SnakeEnv
 
@@ -12,6 +11,7 @@ else:
     MODEL_PATH = r"trained_models_cnn/ppo_snake_final"
 
 NUM_EPISODE = 10
+SYMMETRIC_INFERENCE = False # Average the policy over the 8 board symmetries (Stable-Baselines3 models only).
 
 RENDER = True
 FRAME_DELAY = 0.05 # 0.01 fast, 0.05 slow
@@ -25,8 +25,16 @@ if RENDER:
 else:
     env = SnakeEnv(seed=seed, limit_step=False, silent_mode=True)
 
-# Load the trained model
-model = MaskablePPO.load(MODEL_PATH)
+# Load the trained model. Policies exported by export_policy.py (.pt/.onnx) run without Stable-Baselines3.
+if MODEL_PATH.endswith((".pt", ".onnx")):
+    from policy_runtime import PolicyRuntime
+    model = PolicyRuntime(MODEL_PATH)
+else:
+    from sb3_contrib import MaskablePPO
+    model = MaskablePPO.load(MODEL_PATH)
+    if SYMMETRIC_INFERENCE:
+        from augmented_ppo import SymmetricPredictor
+        model = SymmetricPredictor(model)
 
 total_reward = 0
 total_score = 0
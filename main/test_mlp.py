@@ -1,11 +1,13 @@
 import time
 import random
 
-from sb3_contrib import MaskablePPO
-
 from snake_game_custom_wrapper_mlp import SnakeEnv
 
-MODEL_PATH = r"trained_models_mlp/ppo_snake_final"
+OBS_MODE = "board" # Must match the OBS_MODE the model was trained with in train_mlp.py.
+if OBS_MODE == "features":
+    MODEL_PATH = r"trained_models_mlp_features/ppo_snake_final"
+else:
+    MODEL_PATH = r"trained_models_mlp/ppo_snake_final"
 
 NUM_EPISODE = 10
 
@@ -18,12 +20,17 @@ print(f"Using seed = {seed} for testing.")
 
 
 if RENDER:
-    env = SnakeEnv(seed=seed, limit_step=False, silent_mode=False)
+    env = SnakeEnv(seed=seed, limit_step=False, silent_mode=False, obs_mode=OBS_MODE)
 else:
-    env = SnakeEnv(seed=seed, limit_step=False, silent_mode=True)
+    env = SnakeEnv(seed=seed, limit_step=False, silent_mode=True, obs_mode=OBS_MODE)
 
-# Load the trained model
-model = MaskablePPO.load(MODEL_PATH)
+# Load the trained model. Policies exported by export_policy.py (.pt/.onnx) run without Stable-Baselines3.
+if MODEL_PATH.endswith((".pt", ".onnx")):
+    from policy_runtime import PolicyRuntime
+    model = PolicyRuntime(MODEL_PATH)
+else:
+    from sb3_contrib import MaskablePPO
+    model = MaskablePPO.load(MODEL_PATH)
 
 total_reward = 0
 total_score = 0
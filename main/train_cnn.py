@@ -2,21 +2,21 @@ import os
 import sys
 import random
 
-import torch
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.vec_env import SubprocVecEnv
-from stable_baselines3.common.callbacks import CheckpointCallback
-
-from sb3_contrib import MaskablePPO
-from sb3_contrib.common.wrappers import ActionMasker
-
+# Only lightweight imports at module level: SubprocVecEnv workers started with forkserver/spawn re-import this
+# module, so torch and Stable-Baselines3 are imported inside main() and the env wrappers come from env_worker.
+from env_worker import ActionMaskWrapper, EpisodeMonitor
+from start_state_pool import StartStatePool
 from snake_game_custom_wrapper_cnn import SnakeEnv
 
-if torch.backends.mps.is_available(): # 如果MPS可用
-    NUM_ENV = 32 * 2 # 设置环境数量
-else:
-    NUM_ENV = 32 # 设置环境数量
 LOG_DIR = "logs" # 设置日志文件夹
+NUM_AUGMENT = 0 # Symmetric copies of every rollout to train on as well (0 to 7), see augmented_ppo.py.
+INIT_MODEL_PATH = None # Warm start from a behavior-cloning model saved by pretrain_bc.py.
+CYCLE_DETECTION = "end" # End training episodes as soon as the snake repeats a state (None to disable).
+MACRO_STEPS = 1 # > 1: an action moves the snake up to this many steps, until the next decision point.
+START_POOL_PROB = 0.0 # > 0: fraction of resets that restore a mid/late-game state from a start-state pool.
+START_POOL_PATH = None # States to seed the pool with, written by start_state_pool.py (None: only the env's own rollouts).
+AUTOTUNE_PATH = "autotune_cnn.json" # Written by `autotune.py --apply`: overrides NUM_ENV, n_steps and batch_size.
+NUM_LEARNERS = 1 # > 1: data-parallel updates on this many CPU processes, see distributed_ppo.py.
 
 os.makedirs(LOG_DIR, exist_ok=True) # 创建日志文件夹
 
@@ -35,14 +35,38 @@ def linear_schedule(initial_value, final_value=0.0):
 
 def make_env(seed=0): # 创建一个环境
     def _init(): # 初始化环境
-        env = SnakeEnv(seed=seed) # 创建一个SnakeEnv环境
-        env = ActionMasker(env, SnakeEnv.get_action_mask) # 使用ActionMasker包装环境
-        env = Monitor(env) # 使用Monitor包装环境
+        pool = StartStatePool(reset_prob=START_POOL_PROB, path=START_POOL_PATH, seed=seed) if START_POOL_PROB > 0 else None
+        env = SnakeEnv(seed=seed, cycle_detection=CYCLE_DETECTION, macro_steps=MACRO_STEPS, start_state_pool=pool) # 创建一个SnakeEnv环境
+        env = ActionMaskWrapper(env) # 使用ActionMaskWrapper包装环境
+        env = EpisodeMonitor(env) # 使用EpisodeMonitor包装环境
         env.seed(seed) # 设置环境种子
         return env
     return _init
 
 def main(): # 主函数
+    import torch
+    from stable_baselines3.common.callbacks import CheckpointCallback
+    from sb3_contrib import MaskablePPO
+
+    from lean_vec_env import LeanSubprocVecEnv
+    from autotune import load_tuned_config
+
+    algorithm, algorithm_kwargs = MaskablePPO, {}
+    if NUM_AUGMENT > 0:
+        from augmented_ppo import AugmentedMaskablePPO
+        algorithm, algorithm_kwargs = AugmentedMaskablePPO, {"num_augment": NUM_AUGMENT}
+    if NUM_LEARNERS > 1:
+        assert NUM_AUGMENT == 0, "Augmented rollouts are not sharded across learner processes."
+        from distributed_ppo import DistributedMaskablePPO
+        algorithm, algorithm_kwargs = DistributedMaskablePPO, {"num_learners": NUM_LEARNERS}
+
+    if torch.backends.mps.is_available(): # 如果MPS可用
+        NUM_ENV = 32 * 2 # 设置环境数量
+    else:
+        NUM_ENV = 32 # 设置环境数量
+    device = "cpu" if NUM_LEARNERS > 1 else ("mps" if torch.backends.mps.is_available() else "cuda") # CPU for data-parallel updates (gloo backend).
+    tuned = load_tuned_config(AUTOTUNE_PATH, device)
+    NUM_ENV = tuned.get("num_envs", NUM_ENV)
 
     # Generate a list of random seeds for each environment.
     seed_set = set() # 创建一个集合
@@ -50,43 +74,48 @@ def main(): # 主函数
         seed_set.add(random.randint(0, 1e9)) # 添加一个随机种子
 
     # Create the Snake environment.
-    env = SubprocVecEnv([make_env(seed=s) for s in seed_set]) # 创建一个SubprocVecEnv环境
+    env = LeanSubprocVecEnv([make_env(seed=s) for s in seed_set]) # 创建一个SubprocVecEnv环境
 
     if torch.backends.mps.is_available(): # 如果MPS可用
         lr_schedule = linear_schedule(5e-4, 2.5e-6) # 设置学习率调度器
         clip_range_schedule = linear_schedule(0.150, 0.025) # 设置clip范围调度器
         # Instantiate a PPO agent using MPS (Metal Performance Shaders).
-        model = MaskablePPO(
+        model = algorithm(
             "CnnPolicy", # 使用CnnPolicy策略
             env, # 使用env环境
-            device="mps", # 使用MPS设备
+            device=device, # 使用MPS设备
             verbose=1, # 设置verbose
-            n_steps=2048, # 设置n_steps
-            batch_size=512*8, # 设置batch_size
+            n_steps=tuned.get("n_steps", 2048), # 设置n_steps
+            batch_size=tuned.get("batch_size", 512*8), # 设置batch_size
             n_epochs=4, # 设置n_epochs
             gamma=0.94, # 设置gamma
             learning_rate=lr_schedule, # 设置学习率
             clip_range=clip_range_schedule, # 设置clip范围
-            tensorboard_log=LOG_DIR # 设置tensorboard日志
+            tensorboard_log=LOG_DIR, # 设置tensorboard日志
+            **algorithm_kwargs
         )
     else:
         lr_schedule = linear_schedule(2.5e-4, 2.5e-6) # 设置学习率调度器
         clip_range_schedule = linear_schedule(0.150, 0.025) # 设置clip范围调度器
-        # Instantiate a PPO agent using CUDA.
-        model = MaskablePPO(
+        # Instantiate a PPO agent using CUDA, or the CPU for data-parallel updates (gloo backend).
+        model = algorithm(
             "CnnPolicy", # 使用CnnPolicy策略
             env, # 使用env环境
-            device="cuda", # 使用CUDA设备
+            device=device, # 使用CUDA设备
             verbose=1, # 设置verbose
-            n_steps=2048, # 设置n_steps
-            batch_size=512, # 设置batch_size
+            n_steps=tuned.get("n_steps", 2048), # 设置n_steps
+            batch_size=tuned.get("batch_size", 512), # 设置batch_size
             n_epochs=4, # 设置n_epochs
             gamma=0.94, # 设置gamma
             learning_rate=lr_schedule, # 设置学习率
             clip_range=clip_range_schedule, # 设置clip范围
-            tensorboard_log=LOG_DIR # 设置tensorboard日志
+            tensorboard_log=LOG_DIR, # 设置tensorboard日志
+            **algorithm_kwargs
         )
 
+    if INIT_MODEL_PATH is not None:
+        model.set_parameters(INIT_MODEL_PATH, exact_match=True) # Policy and value weights from pretraining.
+
     # Set the save directory
     if torch.backends.mps.is_available():
         save_dir = "trained_models_cnn_mps" # 设置保存目录
@@ -103,11 +132,15 @@ def main(): # 主函数
     with open(log_file_path, 'w') as log_file: # 打开日志文件
         sys.stdout = log_file # 将stdout重定向到日志文件
 
-        model.learn(
-            total_timesteps=int(100000000), # 设置总时间步
-            callback=[checkpoint_callback] # 设置回调函数
-        )
-        env.close() # 关闭环境
+        try:
+            model.learn(
+                total_timesteps=int(100000000), # 设置总时间步
+                callback=[checkpoint_callback] # 设置回调函数
+            )
+        finally: # Also on errors and Ctrl+C: no leaked learner processes or /dev/shm blocks.
+            env.close() # 关闭环境
+            if NUM_LEARNERS > 1:
+                model.close_learners() # Stop the learner processes and free the shared rollout buffer.
 
     # Restore stdout
     sys.stdout = original_stdout # 恢复原始stdout
@@ -2,15 +2,20 @@ import os
 import sys
 import random
 
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.vec_env import SubprocVecEnv
-from stable_baselines3.common.callbacks import CheckpointCallback
-from sb3_contrib import MaskablePPO
-from sb3_contrib.common.wrappers import ActionMasker
-
+# Only lightweight imports at module level: SubprocVecEnv workers started with forkserver/spawn re-import this
+# module, so torch and Stable-Baselines3 are imported inside main() and the env wrappers come from env_worker.
+from env_worker import ActionMaskWrapper, EpisodeMonitor
+from start_state_pool import StartStatePool
 from snake_game_custom_wrapper_mlp import SnakeEnv
 
 NUM_ENV = 32
+OBS_MODE = "board" # "board": full board grid, "features": compact engineered feature vector.
+INIT_MODEL_PATH = None # Warm start from a behavior-cloning model saved by pretrain_bc.py.
+CYCLE_DETECTION = "end" # End training episodes as soon as the snake repeats a state (None to disable).
+MACRO_STEPS = 1 # > 1: an action moves the snake up to this many steps, until the next decision point.
+START_POOL_PROB = 0.0 # > 0: fraction of resets that restore a mid/late-game state from a start-state pool.
+START_POOL_PATH = None # States to seed the pool with, written by start_state_pool.py (None: only the env's own rollouts).
+AUTOTUNE_PATH = "autotune_mlp.json" # Written by `autotune.py --apply`: overrides NUM_ENV, n_steps and batch_size.
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
@@ -29,22 +34,32 @@ def linear_schedule(initial_value, final_value=0.0):
 
 def make_env(seed=0):
     def _init():
-        env = SnakeEnv(seed=seed)
-        env = ActionMasker(env, SnakeEnv.get_action_mask)
-        env = Monitor(env)
+        pool = StartStatePool(reset_prob=START_POOL_PROB, path=START_POOL_PATH, seed=seed) if START_POOL_PROB > 0 else None
+        env = SnakeEnv(seed=seed, obs_mode=OBS_MODE, cycle_detection=CYCLE_DETECTION, macro_steps=MACRO_STEPS, start_state_pool=pool)
+        env = ActionMaskWrapper(env)
+        env = EpisodeMonitor(env)
         env.seed(seed)
         return env
     return _init
 
 def main():
+    from stable_baselines3.common.callbacks import CheckpointCallback
+    from sb3_contrib import MaskablePPO
+
+    from lean_vec_env import LeanSubprocVecEnv
+    from autotune import load_tuned_config
+
+    device = "cuda"
+    tuned = load_tuned_config(AUTOTUNE_PATH, device)
+    num_envs = tuned.get("num_envs", NUM_ENV)
 
     # Generate a list of random seeds for each environment.
     seed_set = set()
-    while len(seed_set) < NUM_ENV:
+    while len(seed_set) < num_envs:
         seed_set.add(random.randint(0, 1e9))
 
     # Create the Snake environment.
-    env = SubprocVecEnv([make_env(seed=s) for s in seed_set])
+    env = LeanSubprocVecEnv([make_env(seed=s) for s in seed_set])
 
     lr_schedule = linear_schedule(2.5e-4, 2.5e-6)
     clip_range_schedule = linear_schedule(0.15, 0.025)
@@ -53,19 +68,24 @@ def main():
     model = MaskablePPO(
         "MlpPolicy",
         env,
-        device="cuda",
+        device=device,
         verbose=1,
-        n_steps=2048,
-        batch_size=512,
+        n_steps=tuned.get("n_steps", 2048),
+        batch_size=tuned.get("batch_size", 512),
         n_epochs=4,
         gamma=0.94,
         learning_rate=lr_schedule,
         clip_range=clip_range_schedule,
-        tensorboard_log=LOG_DIR
+        tensorboard_log=LOG_DIR,
+        # The feature vector has only a few inputs, so a much smaller network is enough.
+        policy_kwargs=dict(net_arch=dict(pi=[32, 32], vf=[32, 32])) if OBS_MODE == "features" else None
     )
 
+    if INIT_MODEL_PATH is not None:
+        model.set_parameters(INIT_MODEL_PATH, exact_match=True) # Policy and value weights from pretraining.
+
     # Set the save directory
-    save_dir = "trained_models_mlp"
+    save_dir = "trained_models_mlp" if OBS_MODE == "board" else "trained_models_mlp_features"
     os.makedirs(save_dir, exist_ok=True)
 
     checkpoint_interval = 15625 # checkpoint_interval * num_envs = total_steps_per_checkpoint